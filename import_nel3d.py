@@ -37,8 +37,10 @@
 #   - alot
 #-------------------------------------------------------------------------------
 #  Notes: 
-#   - gStreamIDMap this variable holds the cached nodes during
-#     loading; it is reset for every load_NEL_file call
+#   - the binary parsing (NelLoadContext, the parse_* functions and
+#     load_NEL_file) is in nel3d_parse.py which does not need blender;
+#     this file converts the parsed data into blender objects and has
+#     to be installed together with nel3d_parse.py
 #-------------------------------------------------------------------------------
 #  Changelog:
 #   0.3.4: changes to be compatible with blender 2.63
@@ -65,1418 +67,87 @@ gFileRootPath = "./"
 
 import bpy
 import os
-import struct
+import sys
+import array
+import time
 import mathutils
 import operator
-from bpy_extras.io_utils import unpack_list, unpack_face_list
-from bpy_extras.image_utils import load_image
+import collections
+import hashlib
 
+from nel3d_parse import *
+from nel3d_anim import NelTrackEvaluator
 
+try:
+    import numpy
+except ImportError:
+    numpy = None; # the conversion helpers fall back to the array module
 
-def error(message):
-    raise Exception(message);
-
-   
-
-def r_uint64(f):
-    return struct.unpack('<Q', f.read(8))[0];
-
-def r_uint32(f):
-    return struct.unpack('<I', f.read(4))[0];
-
-def r_uint16(f):
-    return struct.unpack('<H', f.read(2))[0];
-
-def r_uint8(f):
-    return struct.unpack('<B', f.read(1))[0];
-
-def r_int64(f):
-    return struct.unpack('<q', f.read(8))[0];
-
-def r_int32(f):
-    return struct.unpack('<i', f.read(4))[0];
-
-def r_int16(f):
-    return struct.unpack('<h', f.read(2))[0];
-
-def r_int8(f):
-    return struct.unpack('<b', f.read(1))[0];
-
-def r_double(f):
-    return struct.unpack('<d', f.read(8))[0];
-
-def r_float(f):
-    return struct.unpack('<f', f.read(4))[0];
-
-def r_bool(f):
-    return r_uint8(f) != 0;
-
-def r_version(f):
-    ver = r_uint8(f);
-    if (ver == 0xFF):
-        return r_uint32(f);
-    else:
-        return ver;
-
-def r_lstring(f): # reading a length-encoded string
-    len = r_uint32(f);
-    val = f.read(len)
-    try:
-        val = val.decode();
-    except:
-        print("WARNING: could not decode string: " + str(val));
-        val = str(val);
-        #error("break");
-    return val;
-
-def r_Vec2f(f): 
-    return (r_float(f), r_float(f));
-
-def r_Vec3f(f): 
-    return (r_float(f), r_float(f), r_float(f));
-
-def r_Vec4f(f): 
-    return (r_float(f), r_float(f), r_float(f), r_float(f));
-
-def r_RGBA(f):
-    return (r_uint8(f), r_uint8(f), r_uint8(f), r_uint8(f));
-
-# reads a versioned type of a (i.e. versioned(r_RGBA, f)) used for CTrackDefaultBlendable
-def versioned(a, f):
-    r_version(f);
-    return a(f);
-
-
-enum_TCameraCollisionGenerate = ("AutoCameraCol", "NoCameraCol", "ForceCameraCol", );
-
-enum_TShader = ("Normal", "Bump", "UserColor", "LightMap", "Specular", "Caustics", "PerPixelLighting", "PerPixelLightingNoSpec", "Cloud", "Water",);
-enum_TBlend = ("one", "zero", "srcalpha", "invsrcalpha", "srccolor", "invsrccolor", "blendConstantColor", "blendConstantInvColor", "blendConstantAlpha", "blendConstantInvAlpha",);
-enum_ZFunc = ("always", "never", "equal", "notequal", "less", "lessequal", "greater", "greaterequal",);
-
-enum_TUploadFormat = ("Auto", "RGBA8888", "RGBA4444", "RGBA5551", "RGB888", "RGB565", "DXTC1", "DXTC1Alpha", "DXTC3", "DXTC5", "Luminance", "Alpha", "AlphaLuminance", "DsDt", );
-
-enum_TMinFilter = ("NearestMipMapOff", "NearestMipMapNearest", "NearestMipMapLinear", "LinearMipMapOff", "LinearMipMapNearest", "LinearMipMapLinear", );
-enum_TMagFilter = ("Nearest", "Linear", );
-enum_TWrapMode = ("Repeat", "Clamp", );
-
-enum_CPointLight_TType = ("PointLight", "SpotLight", "AmbientLight");
-
-IDRV_MAT_MAXTEXTURES = 4;
-
-IDRV_MAT_TEX_ADDR = 0x00000400;
-IDRV_MAT_USER_TEX_0_MAT = 0x00100000;
-
-NL3D_MESH_MRM_SKINNED_MAX_MATRIX = 4;
-
-NL3D_MESH_SKINNING_MAX_MATRIX = 4;
-
-NL3D_MESH_MRM_SKINNED_WEIGHT_FACTOR = 255.0;
-NL3D_MESH_MRM_SKINNED_UV_FACTOR	= 8192.0;
-NL3D_MESH_MRM_SKINNED_NORMAL_FACTOR = 32767.0;
-NL3D_MESH_MRM_SKINNED_DEFAULT_POS_SCALE = 8.0/32767.0;
-
-NL3D_OO32767 = 1.0/32767;
-
-
-# we use the 32bit float max here:
-FLT_MAX = 3.402823466e+38;
-
-def r_enum(enum, f):
-    return enum[r_int32(f)];
-
-
-def parse_CTrackDefaultVector(f):
-    return versioned(r_Vec3f, f);
-
-def parse_CTrackDefaultQuat(f):
-    return versioned(r_Vec4f, f);
-
-
-def parse_ITexture(f):
-    data = {};
-    ver = r_version(f);
-    data['_UploadFormat'] = r_enum(enum_TUploadFormat, f);
-    data['_WrapS'] = r_enum(enum_TWrapMode, f);
-    data['_WrapT'] = r_enum(enum_TWrapMode, f);
-    data['_MinFilter'] = r_enum(enum_TMinFilter, f);
-    data['_Magfilter'] = r_enum(enum_TMagFilter, f);
-    data['_LoadGraysacleAsAlpha'] = r_bool(f) if (ver >= 1) else False;
-
-    return data;
-    
-
-
-def parse_CTextureFile(f):
-    ver = r_version(f);
-    data = parse_ITexture(f);
-    data['_FileName'] = r_lstring(f);
-    data['_AllowDegradation'] = r_bool(f) if (ver >= 1) else True;
-
-    data['NelType'] = 'CTextureFile';
-    return data;
-
-def parse_TexEnv(f, ver):
-    data = {};
-    #!!TODO: currently only skipping the packed data here; see nel/include/nel/3d/material.h line 586
-    if (ver > 0):
-        f.read(14);
-    else:
-        f.read(10);
-    data['ConstantColor'] = r_RGBA(f);
-    return data;
-
-def parse_CTextureCube(f):
-    ver = r_version(f);
-    data = parse_ITexture(f);
-    data['_Textures'] = [parse_PolyPtr(f) for i in range(6)];
-    if (ver == 1): r_bool(f);
-        
-    data['NelType'] = 'CTextureCube';
-    return data;
-
-
-# State Bits
-MAT_TRANS = 1;
-MAT_ROT = 2;
-MAT_SCALEUNI = 4;
-MAT_SCALEANY = 8;
-MAT_PROJ = 16;
-
-def parse_CMatrix(f):
-    data = {};
-    ver = r_version(f);
-    mat = mathutils.Matrix.Identity(4);
-    data['StateBit'] = r_uint32(f);
-    data['Scale33'] = r_float(f);
-
-    if (data['StateBit'] & (MAT_ROT|MAT_SCALEUNI|MAT_SCALEANY) !=0): #hasRot()
-        mat[0][0] = r_float(f);
-        mat[0][1] = r_float(f);
-        mat[0][2] = r_float(f);
-        mat[1][0] = r_float(f);
-        mat[1][1] = r_float(f);
-        mat[1][2] = r_float(f);
-        mat[2][0] = r_float(f);
-        mat[2][1] = r_float(f);
-        mat[2][2] = r_float(f);
-    if (data['StateBit'] & MAT_TRANS != 0): #hasTrans()
-        mat[0][3] = r_float(f);
-        mat[1][3] = r_float(f);
-        mat[2][3] = r_float(f);
-    if (data['StateBit'] & MAT_PROJ != 0):
-        mat[3][0] = r_float(f);
-        mat[3][1] = r_float(f);
-        mat[3][2] = r_float(f);
-        mat[3][3] = r_float(f);
-        
-    data['M'] = mat;
-
-    data['NelType'] = 'CMatrix';
-    return data;
-
-    
-    
-# implements the serial2 from CLightMap
-def parse_CLightMap_2(f):
-    data = {};
-    ver = r_version(f);
-    data['Factor'] = r_RGBA(f);
-    data['LMCDiffuse'] = r_RGBA(f);
-    data['LMCAmbient'] = r_RGBA(f) if (ver >= 1) else (0,0,0,0);
-    data['Texture'] = parse_PolyPtr(f);
-
-    data['NelType'] = 'CLightMap';
-    return data;
-
-def parse_CLightMap(f):
-    data = {};
-    data['Factor'] = r_RGBA(f);
-    data['Texture'] = parse_PolyPtr(f);
-
-    data['NelType'] = 'CLightMap';
-    return data;
-    
-
-def parse_CMaterial(f):
-    cMat = {}
-    ver = r_version(f);
-    cMat['_ShaderType'] = enum_TShader[r_int32(f)];
-    cMat['_Flags'] = r_uint32(f);
-    cMat['_SrcBlend'] = enum_TBlend[r_int32(f)];
-    cMat['_DstBlend'] = enum_TBlend[r_int32(f)];
-    cMat['_ZFunction'] = enum_ZFunc[r_int32(f)];
-    cMat['_ZBias'] = r_float(f);
-    cMat['_Color'] = r_RGBA(f);
-    cMat['_Emissive'] = r_RGBA(f);
-    cMat['_Ambient'] = r_RGBA(f);
-    cMat['_Diffuse'] = r_RGBA(f);
-    cMat['_Specular'] = r_RGBA(f);
-    cMat['_Shininess'] = r_float(f) if (ver >= 2) else 0.0;
-    cMat['_AlphaTestThreshold'] = r_float(f) if (ver >= 5) else 0.0;
-    cMat['_TexCoordGenMode'] = r_uint16(f) if (ver >= 8) else 0;
-
-    cMat['_Textures'] = [];
-    cMat['_TexEnvs'] = [];
-
-    # next we need to read the textures
-    for i in range(0, IDRV_MAT_MAXTEXTURES):
-        tex = parse_PolyPtr(f);
-        cMat['_Textures'].append(tex);
-        if (ver >= 1):
-            cMat['_TexEnvs'].append(parse_TexEnv(f, 1 if (ver >= 9) else 0));
-        else:
-            cMat['_TexEnvs'].append(None); # !!TODO: check if we need a default here
-
-    if (ver >= 3):
-        if (ver >= 7):
-            n = r_uint32(f);
-            #print('num LightMaps = %d' % n);
-            cMat['_LightMaps'] = [];
-            for i in range(0, n):
-                cMat['_LightMaps'].append(parse_CLightMap_2(f));
-            cMat['_LightMapsMulx2'] = r_bool(f);
-        else:
-            cMat['_LightMaps'] = parse_cont(f, parse_CLightMap);
-
-
-    cMat['_TexAddrMode'] = [];
-    if (ver >= 4):
-        if (cMat['_Flags'] & IDRV_MAT_TEX_ADDR != 0):
-            for i in range(0, IDRV_MAT_MAXTEXTURES):
-                cMat['_TexAddrMode'].append(r_uint8(f));
-    
-    cMat['_TexUserMat'] = [];
-    if (ver >= 6):
-        for i in range(0, IDRV_MAT_MAXTEXTURES):
-            # implements CMaterial::isUserTexMatEnabled(uint stage):
-            if (cMat['_Flags'] & (IDRV_MAT_USER_TEX_0_MAT << i) != 0):
-                cMat['_TexUserMat'].append(parse_CMatrix(f));
-            else:
-                cMat['_TexUserMat'].append(None);
-
-    #print("Finished reading CMaterial");
-        
-    cMat['NelType'] = 'CMaterial';
-    return cMat;
-
-
-
-def parse_CLightMapInfoList(f):
-    data = {};
-    ver = r_version(f);
-    data['LightGroup'] = r_uint32(f);
-    data['AnimatedLight'] = r_lstring(f);
-
-    data['StageList'] = [];
-    numCMatStage = r_uint32(f);
-    for i in range(0, numCMatStage):
-        matStage = {};
-        r_version(f);
-        matStage['MatId'] = r_uint8(f);
-        matStage['StageId'] = r_uint8(f);
-        data['StageList'].append(matStage);
-
-    data['NelType'] = 'CLightMapInfoList';
-    return data;
-
-
-def parse_CLodCharacterTexture(f):
-    data = {};
-    r_version(f);
-    data['_Width'] = r_uint32(f);
-    data['_Height'] = r_uint32(f);
-    num = r_uint32(f);
-    data['Texture'] = [];
-    for i in range (0, num):
-        data['Texture'].append( (r_uint8(f), r_uint8(f), r_uint8(f), r_uint8(f)) ); # T U V Q
-
-    data['NelType'] = 'CLodCharacterTexture';
-    return data;
-
-
-def parse_CAnimatedTexture(f):
-    data = {}
-    data['Texture'] = parse_PolyPtr(f);
-    data['NelType'] = 'CAnimatedTexture';
-    return data;
-
-def parse_CMaterialBase(f):
-    data = {};
-    ver = r_version(f);
-    data['Name'] = r_lstring(f);
-
-    data['DefaultAmbient'] = versioned(r_RGBA, f);
-    data['DefaultDiffuse'] = versioned(r_RGBA, f);
-    data['DefaultSpecular'] = versioned(r_RGBA, f);
-    data['DefaultShininess'] = versioned(r_float, f);
-    data['DefaultEmissive'] = versioned(r_RGBA, f);
-    data['DefaultOpacity'] = versioned(r_float, f);
-    data['DefaultTexture'] = versioned(r_int32, f);
-    data['_AnimatedTextures'] = parse_map(f, r_uint32, parse_CAnimatedTexture, 'TAnimatedTextureMap');
-
-    if (ver > 0):
-        data['DefaultTexAnimTracks'] = [parse_CTexAnimTracks(f) for i in range(IDRV_MAT_MAXTEXTURES)];
-    else:
-        print("WARNING: parse_CMaterialBase: setting default values of DefaultTexAnimTracks not yet supported!");
-
-    data['NelType'] = 'CMaterialBase';
-    return data;
-
-def parse_CMeshBase(f):
-    data = {};
-    ver = r_version(f);
-
-    # Vector of _AnimatedMorph not yet supported
-    if (ver >= 2):
-        if (r_int32(f) != 0):
-            error("Reading _AnimatedMorph not yet supported");
-    if (ver < 1):
-        error("Mesh with ver < 1 is too old");
-
-    data['_DefaultPos'] = versioned(r_Vec3f, f);
-    data['_DefaultPivot'] = versioned(r_Vec3f, f);
-    data['_DefaultRotEuler'] = versioned(r_Vec3f, f);
-    data['_DefaultRotQuat'] = versioned(r_Vec4f, f);
-    data['_DefaultScale'] = versioned(r_Vec3f, f);
-    data['_Materials'] = parse_cont(f, parse_CMaterial);
-    data['_AnimatedMaterials'] = parse_map(f, r_uint32, parse_CMaterialBase, 'TAnimatedMaterialMap');
-
-    if (ver >= 8):
-        data['_LightInfos'] = parse_cont(f, parse_CLightMapInfoList);
-    else:
-        data['_LightInfos'] = []
-        numLightInfosOld = r_int32(f);
-        if (numLightInfosOld > 0):
-            error("parse_CMeshBase loading of _LightInfosOld not yet supported");
-
-    data['_IsLightable'] = r_bool(f) if (ver >= 3) else False; # Note: in the orig. code vor ver < 3 this is computed by looking for light-maps in the materials
-    
-    data['_UseLightingLocalAttenuation'] = r_bool(f) if (ver >= 4) else False;
-    data['_AutoAnim'] = r_bool(f) if (ver >= 5) else False;
-    data['_DistMax'] = r_float(f) if (ver >= 6) else 0.0;
-    if (ver >= 7):
-        data['_LodCharacterTexture'] = parse_ptr(f, parse_CLodCharacterTexture);
-    
-    if (ver >= 9):
-        data['_CollisionMeshGeneration'] = r_enum(enum_TCameraCollisionGenerate, f);
-    else:
-        data['_CollisionMeshGeneration'] = enum_TCameraCollisionGenerate[0];
-
-    data['NelType'] = 'CMeshBase';
-    return data;
-
-
-def parse_CMeshMorpher(f):
-    data = {};
-    r_version(f);
-
-    data['BlendShapes'] = [];
-    numBlendShapes = r_uint32(f);
-    if (numBlendShapes > 0):
-        error("Reading of BlendShapes in parse_CMeshMorpher not yet implemented!");
-    
-    data['NelType'] = 'CMeshMorpher';
-    return data;
-
-
-  
-
-
-enum_CVertexBuffer_TValue = ("Position", "Normal", "TexCoord0", "TexCoord1", "TexCoord2", "TexCoord3", "TexCoord4", "TexCoord5", "TexCoord6", "TexCoord7", "PrimaryColor", "SecondaryColor", "Weight", "PaletteSkin", "Fog", "Empty",);
-enum_CVertexBuffer_TPreferredMemory = ("RAMPreferred", "AGPPreferred", "StaticPreferred", "RAMVolatile", "AGPVolatile",);
-
-# Float2 == 4; Float3 == 7; 12 == UChar4; Float4 == 10; Float1 = 1 (See vertex_buffer.cpp line 69)
-DefaultValueType = (7, 7, 4, 4, 4, 4, 4, 4, 4, 4, 12, 12, 10, 12, 1, 1);
-
-
-def parse_VertexData(sizeType, f):
-    if sizeType == 0: return (r_double(f),);
-    elif sizeType == 1: return (r_float(f),);
-    elif sizeType == 2: return (r_int16(f),);
-    elif sizeType == 3: return (r_double(f),r_double(f),);
-    elif sizeType == 4: return (r_float(f),r_float(f),);
-    elif sizeType == 5: return (r_int16(f),r_int16(f),);
-    elif sizeType == 6: return (r_double(f),r_double(f),r_double(f),);
-    elif sizeType == 7: return (r_float(f),r_float(f),r_float(f),);
-    elif sizeType == 8: return (r_int16(f),r_int16(f),r_int16(f),);
-    elif sizeType == 9: return (r_double(f),r_double(f),r_double(f),r_double(f),);
-    elif sizeType == 10: return (r_float(f),r_float(f),r_float(f),r_float(f),);
-    elif sizeType == 11: return (r_int16(f),r_int16(f),r_int16(f),r_int16(f),);
-    elif sizeType == 12: return (r_int8(f),r_int8(f),r_int8(f),r_int8(f),);
-    else: error("parse_VertexData with invalid SizeType");
-
-# CVertexBuffer::serialHeader(...) '3d/vertex_buffer.cpp'
-def read_CVertexBuffer_Header(f, data):
-    flags = 0;
-    hver = r_version(f);
-    if (hver < 1):
-        oldFlags = r_uint32(f);
-        print("!!TODO: remapping of old flags in CVertexBuffer header ver < 1 not yet implemented! oldFlags = " + str(oldFlags));
-        flags = 12295; # !!TODO: hardcoded value for GNU
-        data['_Type'] = [DefaultValueType[i] for i in range(len(enum_CVertexBuffer_TValue))];
-    else:
-        flags = r_uint16(f);
-        data['_Type'] = [r_uint8(f) for i in range(len(enum_CVertexBuffer_TValue))];
-
-    data['_NbVerts'] = r_uint32(f);
-    data['_Flags'] = flags; # Note: in the orig. code this is set again using addValueEx (with some error checking)
-    data['_VertexColorFormat'] = r_uint8(f) if (hver >= 2) else 0; # 0 == TRGBA; 1 == TBGRA
-
-    if (hver >= 3):
-        data['_PreferredMemory'] = r_enum(enum_CVertexBuffer_TPreferredMemory, f);
-        data['_Name'] = r_lstring(f);
-    else:
-        data['_PreferredMemory'] = enum_CVertexBuffer_TPreferredMemory[0];
-        data['_Name'] = "";
-
-
-# CVertexBuffer::serialSubset(...) '3d/vertex_buffer.cpp'
-def read_CVertexBuffer_Subset(f, vertexStart, vertexEnd, data):
-    flags = data['_Flags'];
-    data['_VertexData'] = {};
-    sver = r_version(f);
-
-    for id in range(vertexStart, vertexEnd):
-        for value in range(0, len(enum_CVertexBuffer_TValue)):
-            if ((flags & (1 << value)) != 0):
-                valueIdx = enum_CVertexBuffer_TValue[value];
-                if valueIdx not in data['_VertexData']: 
-                    data['_VertexData'][valueIdx] = [];
-                data['_VertexData'][valueIdx].append(parse_VertexData(data['_Type'][value], f))
-
-    #print(data['_VertexData'].keys());
-    #print(data['_VertexData']['Position']);
-
-    if (sver >= 2):
-        data['_UVRouting'] = (r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f));
-    else:
-        data['_UVRouting'] = (0,1,2,3,4,5,6,7);
-    
-
-def parse_CVertexBuffer(f):
-    data = {};
-    bver = r_version(f);
-    if (bver < 2):
-        error("Parsing old CVertexBuffer (< 2) not yet implemented!");
-    #else
-    
-    # serialHeader()
-    read_CVertexBuffer_Header(f, data);
-
-    # serialSubset(): this reads in all the vertex data as specified by flags
-    read_CVertexBuffer_Subset(f, 0, data['_NbVerts'], data);
-
-    data['NelType'] = 'CVertexBuffer';
-    return data;
-        
-
-def parse_CIndexBuffer(f):
-    data = {};
-
-    ver = r_version(f);
-
-    if ver < 1:
-        # skip:
-        r_uint32(f); r_uint32(f);
-        parse_cont(f, r_uint32);
-        # read triangles
-        data['_NbIndexes'] = r_uint32(f)*3;
-        data['_Capacity'] = r_uint32(f)*3;
-        data['_NonResidentIndexes'] = parse_cont(f, r_uint32);
-        # skip:
-        r_uint32(f); r_uint32(f);
-        parse_cont(f, r_uint32);
-    else: # ver >= 1
-        data['_NbIndexes'] = r_uint32(f);
-        data['_Capacity'] = r_uint32(f);
-        data['_NonResidentIndexes'] = parse_cont(f, r_uint32);
-        data['_PreferredMemory'] = r_enum(enum_CVertexBuffer_TPreferredMemory, f);
-        if ver == 1: 
-            for i in range(len(enum_CVertexBuffer_TPreferredMemory)): r_bool(f);
-
-    data['NelType'] = 'CIndexBuffer';
-    return data;
-
-
-def parse_CMeshVPWindTree(f):
-    data = {};
-    r_version(f);
-    for i in range(3):
-        data['Frequency_'+str(i)] = r_float(f);
-        data['FrequencyWindFactor_'+str(i)] = r_float(f);
-        data['PowerXY_'+str(i)] = r_float(f);
-        data['PowerZ_'+str(i)] = r_float(f);
-        data['Bias_'+str(i)] = r_float(f);
-    data['SpecularLighting'] = r_bool(f);
-
-    data['NelType'] = 'CMeshVPWindTree';
-    return data;
-
-#!!TODO: check which CRdrPass this was (there are several defined as subclasses!!
-def parse_CRdrPass(f):
-    data = {};
-    r_version(f);
-    data['MaterialId'] = r_uint32(f);
-    data['PBlock'] = parse_CIndexBuffer(f);
-
-    data['NelType'] = 'CRdrPass';
-    return data;
-
-
-def parse_CMatrixBlock(f):
-    data = {};
-    r_version(f);
-    data['MatrixId'] = [r_uint32(f) for i in range(16)];
-    data['NumMatrix'] = r_uint32(f);
-    data['RdrPass'] = parse_cont(f, parse_CRdrPass);
-
-    data['NelType'] = 'CMatrixBlock';
-    return data;
-
-
-def parse_CAABBox(f):
-    data = {};
-    r_version(f);
-    data['Center'] = r_Vec3f(f);
-    data['HalfSize'] = r_Vec3f(f);
-
-    data['NelType'] = 'CAABBox';
-    return data;
-
-# CMRMWedgeGeom::serial(...) (nel/3d/mrm_mesh.h)
-def parse_CMRMWedgeGeom(f):
-    data = {};
-
-    data['Start'] = r_uint32(f);
-    data['End'] = r_uint32(f);
-    
-    data['NelType'] = 'CMRMWedgeGeom';
-    return data;
-
-
-#CMeshMRMSkinnedGeom::CPackedVertexBuffer::CPackedVertex::serial
-def parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer_CPackedVertex(f):
-    data = {};
-    r_version(f);
-
-    data['X'] = r_int16(f);
-    data['Y'] = r_int16(f);
-    data['Z'] = r_int16(f);
-    data['Nx'] = r_int16(f);
-    data['Ny'] = r_int16(f);
-    data['Nz'] = r_int16(f);
-    data['U'] = r_int16(f);
-    data['V'] = r_int16(f);
-    #Matrices and Weights are stored interleaved
-    data['Matrices_Weights'] = [(r_uint8(f), r_uint8(f)) for i in range(NL3D_MESH_MRM_SKINNED_MAX_MATRIX)];
-
-    data['NelType'] = 'CMeshMRMSkinnedGeom::CPackedVertexBuffer::CPackedVertex';
-    return data;
-
-#CMeshMRMSkinnedGeom::CPackedVertexBuffer::serial(...)
-def parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer(f):
-    data = {};
-    r_version(f);
-
-    data['_PackedBuffer'] = parse_cont(f, parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer_CPackedVertex);
-    data['_DecompactScale'] = r_float(f);
-    
-    data['NelType'] = 'CMeshMRMSkinnedGeom::CPackedVertexBuffer';
-    return data;
-
-
-#CMeshMRMSkinnedGeom::CRdrPass::serial(...) (mesh_mrm_skinned.h)
-def parse_CMeshMRMSkinnedGeom_CRdrPass(f):
-    data = {};
-    r_version(f);
-
-    data['MaterialId'] = r_uint32(f);
-    data['PBlock'] = parse_cont(f, r_uint16);
-
-    data['NelType'] = 'CMeshMRMSkinnedGeom::CRdrPass';
-    return data;
-
-#CMeshMRMSkinnedGeom::CLod::serial(...) (mesh_mrm_skinned.h)
-def parse_CMeshMRMSkinnedGeom_CLod(f):
-    data = {};
-    r_version(f);
-
-    data['NWedges'] = r_uint32(f);
-    data['RdrPass'] = parse_cont(f, parse_CMeshMRMSkinnedGeom_CRdrPass);
-    data['Geomorphs'] = parse_cont(f, parse_CMRMWedgeGeom);
-    data['MatrixInfluences'] = parse_cont(f, r_uint32);
-    data['InfluencedVertices'] = [parse_cont(f, r_uint32) for i in range(NL3D_MESH_SKINNING_MAX_MATRIX)];
-
-    data['NelType'] = 'CMeshMRMSkinnedGeom::CLod';
-    return data;
-
-#CShadowVertex::serial(...)  (shadow_skin.h)
-def parse_CShadowVertex(f):
-    data = {};
-    r_version(f);
-
-    data['Vertex'] = r_Vec3f(f);
-    data['MatrixId'] = r_uint32(f);
-
-    data['NelType'] = 'CShadowVertex';
-    return data;
-
-
-#CMeshMRMSkinnedGeom::serial
-def parse_CMeshMRMSkinnedGeom(f):
-    data = {};
-    r_version(f);
-
-    data['_BonesName'] = parse_cont(f, r_lstring);
-
-    data['_BBox'] = parse_CAABBox(f);
-    data['_LevelDetail.MaxFaceUsed'] = r_uint32(f);
-    data['_LevelDetail.MinFaceUsed'] = r_uint32(f);
-    data['_LevelDetail.DistanceFinest'] = r_float(f);
-    data['_LevelDetail.DistanceMiddle'] = r_float(f);
-    data['_LevelDetail.DistanceCoarsest'] = r_float(f);
-    data['_LevelDetail.OODistanceDelta'] = r_float(f);
-    data['_LevelDetail.DistancePow'] = r_float(f);
-
-    data['_VBufferFinal'] = parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer(f);
-    data['_ShadowSkin.Vertices'] = parse_cont(f, parse_CShadowVertex);
-    data['_ShadowSkin.Triangles'] = parse_cont(f, r_uint32);
-
-    data['_Lods'] = parse_cont(f, parse_CMeshMRMSkinnedGeom_CLod);
-
-    data['NelType'] = 'CMeshMRMSSkinnedGeom';
-    return data;
-    
-
-# CMeshMRMGeom::CLodInfo::serial(...) from 'nel/3d/mesh_mrm.h'
-def parse_CMeshMRMGeom_CLodInfo(f):
-    data = {};
-    r_version(f);
-    data['StartAddWedge'] = r_uint32(f);
-    data['EndAddWedges'] = r_uint32(f);
-
-    data['NelType'] = 'CMeshMRMGeom::CLodInfo';
-    return data;
-
-# CMeshMRMGeom::CVertexBlock
-def parse_CMeshMRMGeom_CVertexBlock(f):
-    # (VertexStart, NVertices)
-    return (r_uint32(f), r_uint32(f));
-    
-
-def parse_CMeshMRMGeom_CRdrPass(f):
-    data = {};
-    r_version(f);
-
-    data['MaterialId'] = r_uint32(f);
-    data['PBlock'] = parse_CIndexBuffer(f);
-
-    data['NelType'] = 'CMeshMRMGeom::CRdrPass';
-    return data;
-
-
-# CMeshMRMGeom::CLod::serial(NLMISC::IStream &f) from '3d/mesh_mrm.cpp'
-def parse_CMeshMRMGeom_CLod(f):
-    data = {}
-    ver = r_version(f);
-    
-    data['NWedges'] = r_uint32(f);
-    data['RdrPass'] = parse_cont(f, parse_CMeshMRMGeom_CRdrPass);
-    data['Geomorphs'] = parse_cont(f, parse_CMRMWedgeGeom);
-    data['MatrixInfluences'] = parse_cont(f, r_uint32);
-    data['InfluencedVertices'] = [parse_cont(f, r_uint32) for i in range(NL3D_MESH_SKINNING_MAX_MATRIX)];
-
-    print(data['NWedges']);
-    
-    if (ver >= 1):
-        data['SkinVertexBlocks'] = parse_cont(f, parse_CMeshMRMGeom_CVertexBlock);
-    else:
-        print("WARNING: building SkinVertexBlocks in parse_CMeshMRMGeom_CLod not yet implemented!");
-
-    data['NelType'] = 'CMeshMRMGeom::CLod';
-    return data;
-
-
-# CMeshMRMGeom::serialLodVertexData(NLMISC::IStream &f, uint startWedge, uint endWedge) from '3d/mesh_mrm.cpp'
-def read_CMeshMRMGeom_serialLodVertexData(f, startWedge, endWedge, data):
-    ver = r_version(f);
-
-    read_CVertexBuffer_Subset(f, startWedge, endWedge, data['_VBufferFinal']);
-
-    if data['_Skinned'] and ver < 1:
-        error('Skinned CMeshMRMGeom not yet implemented');
-    
-
-# CMeshMRMGeom::load(...) '3d/mesh_mrm.cpp'
-def parse_CMeshMRMGeom(f):
-    data = {};
-
-    #CMeshMRMGeom::loadHeader(...)
-    hver = r_version(f);
-    data['_BonesName'] = parse_cont(f, r_lstring) if (hver >= 3) else [];
-    data['_MeshVertexProgram'] = parse_PolyPtr(f) if (hver >= 2) else None;
-    data['_MeshMorpher'] = parse_CMeshMorpher(f) if (hver >= 1) else None;
-    
-    data['_Skinned'] = r_bool(f);
-    data['_BBox'] = parse_CAABBox(f);
-    data['_LevelDetail.MaxFaceUsed'] = r_uint32(f);
-    data['_LevelDetail.MinFaceUsed'] = r_uint32(f);
-    data['_LevelDetail.DistanceFinest'] = r_float(f);
-    data['_LevelDetail.DistanceMiddle'] = r_float(f);
-    data['_LevelDetail.DistanceCoarsest'] = r_float(f);
-    data['_LevelDetail.OODistanceDelta'] = r_float(f);
-    data['_LevelDetail.DistancePow'] = r_float(f);
-
-    data['_LodInfos'] = parse_cont(f, parse_CMeshMRMGeom_CLodInfo);
-
-    nWedges = r_uint32(f);
-
-    data['_VBufferFinal'] = {'NelType':"CVertexBuffer"};
-    read_CVertexBuffer_Header(f, data['_VBufferFinal']);
-
-    data['_SkinWeights'] = parse_cont(f, parse_CMesh_CSkinWeight) if (hver >= 4) else [];
-
-    if (hver >= 5):
-        data['_ShadowSkin.Vertices'] = parse_cont(f, parse_CShadowVertex);
-        data['_ShadowSkin.Triangles'] = parse_cont(f, r_uint32);
-
-    # this computes some absolute offset ?? directly taken from the code; not sure yet what this does
-    startPos = f.tell();
-    for lodInfo in data['_LodInfos']:
-        lodInfo['LodOffset'] = startPos + r_int32(f);
-
-    # finished CMeshMRMGeom::loadHeader(...)
-
-    # next we read all the Lod:
-    data['_Lods'] = [];
-
-    for lodInfo in data['_LodInfos']:
-        data['_Lods'].append(parse_CMeshMRMGeom_CLod(f));
-        read_CMeshMRMGeom_serialLodVertexData(f, lodInfo['StartAddWedge'], lodInfo['EndAddWedges'], data);
-
-    data['NelType'] = 'CMeshMRMGeom';
-    return data;
-
-def parse_CMeshGeom(f):
-    data = {}
-    ver = r_version(f);
-    #print(" CMeshGeom ver = %d" % ver);
-
-    data['_BonesName'] = []
-    if (ver >= 4):
-        numBoneNames = r_uint32(f);
-        for i in range(0, numBoneNames):
-            data['_BonesName'].append(r_lstring(f));
-            print("   read a BoneName: " + str(data['_BonesName'][-1]));
-
-    data['_MeshVertexProgram'] = parse_PolyPtr(f) if (ver >= 3) else None;
-    data['_MeshMorpher'] = parse_CMeshMorpher(f) if (ver >= 1) else None;
-    data['_VBuffer'] = parse_CVertexBuffer(f);
-    data['_MatrixBlocks'] = parse_cont(f, parse_CMatrixBlock);
-    data['_BBox'] = parse_CAABBox(f);
-    data['_Skinned'] = r_bool(f);
-    data['NelType'] = 'CMeshGeom';
-    return data;
-
-
-# CMesh::CSkinWeight::serial(...)
-def parse_CMesh_CSkinWeight(f):
-    data = {};
-
-    data['MatrixId_Weights'] = [(r_uint32(f), r_float(f)) for i in range(NL3D_MESH_SKINNING_MAX_MATRIX)];
-
-    data['NelType'] = 'CMesh::CSkinWeight';
-    return data;
-
-
-def parse_CMesh(f):
-    ver = r_version(f);
-    data = parse_CMeshBase(f);
-    data['_MeshGeom'] = parse_CMeshGeom(f);
-
-    data['NelType'] = 'CMesh';
-    return data;
-
-
-def parse_CMeshMRMSkinned(f):
-    r_version(f);
-    data = parse_CMeshBase(f);
-
-    data['_MeshMRMGeom'] = parse_CMeshMRMSkinnedGeom(f);
-    data['NelType'] = 'CMeshMRMSkinned';
-    return data;
-    
-
-# CMeshMRM::serial '3d/mesh_mrm.cpp'
-def parse_CMeshMRM(f):
-    ver = r_version(f);
-    data = parse_CMeshBase(f);
-    data['_MeshMRMGeom'] = parse_CMeshMRMGeom(f);
-
-    data['NelType'] = 'CMeshMRM';
-    return data;
-
-
-
-
-def parse_CTextureMultiFile(f):
-    r_version(f);
-    data = parse_ITexture(f);
-    data['_FileNames'] = parse_cont(f, r_lstring);
-    data['_CurrSelectedTexture'] = r_uint32(f);
-    
-    data['NelType'] = 'CTextureMultiFile';
-    return data;
-    
-
-def parse_CMeshSlot(f):
-    data = {};
-    r_version(f);
-
-    data['MeshGeom'] = parse_PolyPtr(f);
-    data['A'] = r_float(f);
-    data['B'] = r_float(f);
-    data['DistMax'] = r_float(f);
-    data['EndPolygonCount'] = r_float(f);
-    data['BlendLength'] = r_float(f);
-    data['Flags'] = r_uint8(f);
-
-    data['NelType'] = 'CMeshSlot';
-    return data;
-
-def parse_CMeshMultiLod(f):
-    r_version(f);
-    data = parse_CMeshBase(f);
-    data['_StaticLod'] = r_bool(f);
-    data['_MeshVector'] = parse_cont(f, parse_CMeshSlot);
-    
-    data['NelType'] = 'CMeshMultiLod';
-    return data;
-
-
-
-def parse_CBoneBase(f):
-    data = {};
-    ver = r_version(f);
-
-    data['Name'] = r_lstring(f);
-
-    data['InvBindPos'] = parse_CMatrix(f);
-    data['FatherId'] = r_int32(f);
-    data['UnheritScale'] = r_bool(f);
-    data['LodDisableDistance'] = r_float(f) if ver >= 1 else 0.0;
-    data['DefaultPos'] = versioned(r_Vec3f, f);
-    data['DefaultRotEuler'] = versioned(r_Vec3f, f);
-    data['DefaultRotQuat'] = versioned(r_Vec4f, f);
-    data['DefaultScale'] = versioned(r_Vec3f, f);
-    data['DefaultPivot'] = versioned(r_Vec3f, f);
-    data['SkinScale'] = r_Vec3f(f) if ver >= 2 else (1.0, 1.0, 1.0);
-
-    print("Loaded : "+ data['Name'] + "  DefaultRotQuat = " + str(data['DefaultRotQuat']) );
-    
-    data['NelType'] = 'CBoneBase';
-    return data;
-
-
-def parse_CSkeletonShapeCLod(f):
-    data = {};
-    r_version(f);
-    data['Distance'] = r_float(f);
-    data['ActiveBones'] = parse_cont(f, r_uint8);
-
-    data['NelType'] = 'CSkeletonShapeCLod';
-    return data;
-   
-
-def parse_CSkeletonShape(f):
-    data = {};
-    ver = r_version(f);
-
-    data['_Bones'] = parse_cont(f, parse_CBoneBase);
-    data['_BoneMap'] = parse_map(f, r_lstring, r_uint32, 'std::map<std::string, uint32>');
-    #print(data['_BoneMap']);
-
-    if (ver >= 1):
-        data['_Lods'] = parse_cont(f, parse_CSkeletonShapeCLod);
-    else:
-        print("WARNING: parse_CSkeletonShape for old version (< 1) not yet fully implemented!");
-        data['_Lods'] = [{}];
-        data['_Lods'][0]['Distance'] = 0;
-        #data['_Lods'][0]['ActiveBones'] = ?? !!TODO
-
-    data['NelType'] = 'CSkeletonShape';
-    return data;
-
-
-# implements 'template<class T> class CKey ::serial(...)' from nel/3d/key.h
-def parse_CKey(f, Type_ParseFunc):
-    r_version(f);
-    return Type_ParseFunc(f);
-
-# implements 'template<class T> class CKeyTCB : public CKey<T> ::serial(...)' from nel/3d/key.h
-def parse_CKeyTCB(f, Type_ParseFunc):
-    r_version(f);
-    data = {};
-    data['Value'] = Type_ParseFunc(f);
-    data['Tension'] = r_float(f);
-    data['Continuity'] = r_float(f);
-    data['Bias'] = r_float(f);
-    data['EaseTo'] = r_float(f);
-    data['EaseFrom'] = r_float(f);
-    return data;
-
-# implements 'template<class CKeyT> class ITrackKeyFramer::serial' from nel/3d/track_keyframer.h
-def parse_ITrackKeyFramer(f, nelCTrackKeyFramer_TypeName, nelKey_TypeName, fCKey_ParseFunc, fKeyType_ParseFunc):
-    #print("Called parse_ITrackKeyFramer");
-    data = {};
-
-    r_version(f);
-
-    # parse the map of CKey values (specified by Type_ParseFunc for internal data)
-    data['NelCKeyType'] = nelKey_TypeName; # this is stored to later identify the values stored in the key map
-    data['_MapKey'] = {};
-    numElements = r_uint32(f);
-    for i in range(numElements):
-        key = r_float(f);
-        mat = fCKey_ParseFunc(f, fKeyType_ParseFunc);
-        data['_MapKey'][key] = mat;
-
-    #print(data['NelCKeyType']);
-    #print(data['_MapKey']);
-
-    data['_RangeLock'] = r_bool(f);
-    data['_RangeBegin'] = r_float(f);
-    data['_RangeEnd'] = r_float(f);
-    data['_LoopMode'] = r_bool(f);
-
-    data['NelType'] = nelCTrackKeyFramer_TypeName;
-    return data;
-
-
-# CTrackSampledCommon::CTimeBlock 'nel/3d/track_sampled_common.h'
-def parse_CTrackSampledCommon_CTimeBlock(f):
-    data = {};
-    r_version(f);
-    data['TimeOffset'] = r_uint16(f);
-    data['KeyOffset'] = r_uint32(f);
-    data['Times'] = parse_cont(f, r_uint8);
-
-    data['NelType'] = 'CTrackSampledCommon::CTimeBlock';
-    return data;
-  
-# CQuatPack from 'nel/3d/track_sampled_quat.h'
-# Note: we unpack them here already
-def parse_CQuatPack(f):
-    # x y z w
-    x = r_int16(f);
-    y = r_int16(f);
-    z = r_int16(f);
-    w = r_int16(f);
-    return unpack_CQuatPack((x, y, z, w));
-
-def unpack_CQuatPack(quatpack):
-    bquat = mathutils.Quaternion();
-    bquat.x = quatpack[0] * NL3D_OO32767;
-    bquat.y = quatpack[1] * NL3D_OO32767;
-    bquat.z = quatpack[2] * NL3D_OO32767;
-    bquat.w = quatpack[3] * NL3D_OO32767;
-
-    bquat.normalize();
-    return bquat;
-
-
-
-def _CTrackSampledCommon_serialCommon(f, data):
-    # Note: for compatibility with CTrackSampledQuat.serial the r_version is skipped here and expected to be done by the caller
-    data['_LoopMode'] = r_bool(f);
-    data['_BeginTime'] = r_float(f);
-    data['_EndTime'] = r_float(f);
-    data['_TotalRange'] = r_float(f);
-    data['_OOTotalRange'] = r_float(f);
-    data['_DeltaTime'] = r_float(f);
-    data['_OODeltaTime'] = r_float(f);
-    data['_TimeBlocks'] = parse_cont(f, parse_CTrackSampledCommon_CTimeBlock);
-
-    
-# CTrackSampledQuat from 'nel/3d/track_sampled_quat.h'
-def parse_CTrackSampledQuat(f):
-    data = {};
-    ver = r_version(f);
-    
-    if (ver >= 1): # the code then calls CTrackSampledCommon::serialCommon where the only difference is another serialVersion
-        r_version(f);
-
-    _CTrackSampledCommon_serialCommon(f, data);
-
-    # CQuatPack is a class {sint16 x,y,z,w;}
-    data['_Keys'] = parse_cont(f, parse_CQuatPack);
-        
-    data['NelType'] = 'CTrackSampledQuat';
-    return data;
-    
-
-# CTrackSampledQuat from 'nel/3d/track_sampled_vector.h'
-def parse_CTrackSampledVector(f):
-    data = {};
-    ver = r_version(f);
-
-    r_version(f); # another r_version for the version stored in the 'serialCommon' part of this data
-    _CTrackSampledCommon_serialCommon(f, data);
-
-    data['_Keys'] = parse_cont(f, r_Vec3f); #this is an array of CVector
-
-    data['NelType'] = 'CTrackSampledVector';
-    return data;
-
-# CSurfaceLightGrid::CCellCorner  'nel/3d/surface_light_grid.h'
-def parse_CSurfaceLightGrid_CCellCorner(f):
-    data = {};
-    ver = r_version(f);
-    
-    data['LocalAmbientId'] = r_uint8(f) if (ver >= 1) else 0xFF;
-    data['SunContribution'] = r_uint8(f);
-    data['Light'] = (r_uint8(f), r_uint8(f));
-
-    data['NelType'] = 'CSurfaceLightGrid::CCellCorner';
-    return data;
-
-# CSurfaceLightGrid::serial(...) from 'nel/3d/surface_light_grid.cpp'
-def parse_CSurfaceLightGrid(f):
-    data = {};
-    r_version(f);
-
-    data['Origin'] = r_Vec2f(f);
-    data['Width'] = r_uint32(f);
-    data['Height'] = r_uint32(f);
-    data['Cells'] = parse_cont(f, parse_CSurfaceLightGrid_CCellCorner);
-
-    data['NelType'] = 'CSurfaceLightGrid';
-    return data;
-
-# CIGSurfaceLight::CRetrieverLightGrid from 'nel/3d/ig_surface_light.h'
-def parse_CIGSurfaceLight_CRetrieverLightGrid(f):
-    data = {};
-    r_version(f);
-    
-    data['Grids'] = parse_cont(f, parse_CSurfaceLightGrid);
-
-    data['NelType'] = 'CRetrieverLightGrid';
-    return data;
-
-# CIGSurfaceLight::serial(...) from 'nel/3d/ig_surface_light.cpp'
-def parse_CIGSurfaceLight(f):
-    data = {};
-    ver = r_version(f);
-
-    data['_CellSize'] = r_float(f);
-    data['_OOCellSize'] = r_float(f);
-
-    if (ver < 1):
-        data['_RetrieverGridMap'] = parse_map(f, r_lstring, parse_CIGSurfaceLight_CRetrieverLightGrid, 'TRetrieverGridMap'); 
-    else:
-        data['_RetrieverGridMap'] = parse_map(f, r_uint32, parse_CIGSurfaceLight_CRetrieverLightGrid, 'TRetrieverGridMap'); 
-
-    data['NelType'] = 'CIGSurfaceLight';
-    return data;
-
-# CPointLightNamedArray::CPointLightGroup(...) from 'nel/3d/point_light_named_array.h'
-def parse_CPointLightNamedArray_CPointLightGroup(f):
-    data = {};
-    r_version(f);
-    data['AnimationLight'] = r_lstring(f);
-    data['LightGroup'] = r_uint32(f);
-    data['StartId'] = r_uint32(f);
-    data['EndId'] = r_uint32(f);
-
-    data['NelType'] = 'CPointLightNamedArray::CPointLightGroup';
-    return data;
-    
-
-
-# reads the data from CPointLight into the given data dict (from 'src/3d/point_light.cpp')
-def read_CPointLight(f, data):
-    ver = r_version(f);
-
-    data['_AddAmbientWithSun'] = r_bool(f) if ver >= 2 else False;
-    data['_Type'] = r_enum(enum_CPointLight_TType, f) if ver >= 1 else enum_CPointLight_TType[0];
-    data['_SpotDirection'] = r_Vec3f(f) if ver >= 1 else (0,1,0);
-    data['_SpotAngleBegin'] = r_float(f) if ver >= 1 else math.pi/4;
-    data['_SpotAngleEnd'] = r_float(f) if ver >= 1 else math.pi/2;
-
-    data['_Position'] = r_Vec3f(f);
-    data['_Ambient'] = r_RGBA(f);
-    data['_Diffuse'] = r_RGBA(f);
-    data['_Specular'] = r_RGBA(f);
-    data['_AttenuationBegin'] = r_float(f);
-    data['_AttenuationEnd'] = r_float(f);
 
+# set to a nel3d_cache.NelParseCache(cacheDir) to store the parsed files on disk
+# and reuse them in later imports (also across blender sessions)
+gParseCache = None;
 
-# CPointLightNamed::serial(...) from 'src/3d/point_light_named.cpp'
-def parse_CPointLightNamed(f):
-    data = {};
-    ver = r_version(f);
-
-    read_CPointLight(f, data);
-
-    data['AnimatedLight'] = r_lstring(f);
-    data['_DefaultAmbient'] = r_RGBA(f);
-    data['_DefaultDiffuse'] = r_RGBA(f);
-    data['_DefaultSpecular'] = r_RGBA(f);
-
-    if (ver >= 1):
-        data['LightGroup'] = r_uint32(f);
-
-    data['NelType'] = 'CPointLightNamed';
-    return data;
-    
-
-# CPointLightNamedArray::serial(...) from 'nel/3d/point_light_named_array.h'
-def parse_CPointLightNamedArray(f):
-    data = {};
-    ver = r_version(f);
-
-    data['_PointLights'] = parse_cont(f, parse_CPointLightNamed);
-
-    if ver == 0:
-        error("Parsing old CPointLightNamedArray map not yet implemented");
-    else:
-        data['_PointLightGroupMap'] = parse_cont(f, parse_CPointLightNamedArray_CPointLightGroup);
-
-    data['NelType'] = 'CPointLightNamedArray';
-    return data;
-
-# CPortal::serial(...) from 'src/3d/portal.cpp'
-def parse_CPortal(f):
-    data = {};
-    version = r_version(f);
-
-    data['_LocalPoly'] = parse_cont(f, r_Vec3f);
-    data['_Name'] = r_lstring(f);
-
-    if (version >= 1):
-        data['_OcclusionModelId_str'] = r_lstring(f);
-        data['_OpenOcclusionModelId_str'] = r_lstring(f);
-
-    data['NelType'] = 'CPortal';
-    return data;
-
-    
-# CCluster::serial(...) from 'nel/3d/cluster.cpp'
-def parse_CCluster(f):
-    data = {};
-
-    version = r_version(f);
-
-    data['Name'] = r_lstring(f) if (version >= 1) else "";
-    data['_LocalVolume'] = parse_cont(f, r_Vec4f); # CPlane type (plane.h) (as four floats)
-    data['_LocalBBox'] = parse_CAABBox(f);
-    data['FatherVisible'] = r_bool(f);
-    data['VisibleFromFather'] = r_bool(f);
-
-    if (version >= 2):
-        data['_SoundGroupId_str'] = r_lstring(f);
-        data['_EnvironmentFxId_str'] = r_lstring(f);
-
-    if (version >= 3):
-        data['AudibleFromFather'] = r_bool(f);
-        data['FatherAudible'] = r_bool(f);
-
-    data['NelType'] = 'CCluster';
-    return data;
-
-
-# CInstanceGroup::CInstance 'nel/3d/scene_group.h'
-def parse_CInstanceGroup_CInstance(f):
-    data = {};
-    version = r_version(f);
-
-    data['Visible'] = r_bool(f) if version >= 7 else True;
-    data['DontCastShadowForExterior'] = r_bool(f) if version >= 6 else False;
-    data['DontCastShadowForInterior'] = r_bool(f) if version >= 5 else False;
-    data['LocalAmbientId'] = r_uint8(f) if version >= 4 else 0xFF;
-    if (version >= 3):
-        data['AvoidStaticLightPreCompute'] = r_bool(f);
-        data['DontCastShadow'] = r_bool(f);
-        data['StaticLightEnabled'] = r_bool(f);
-        data['SunContribution'] = r_uint8(f);
-        data['Light'] = (r_uint8(f), r_uint8(f));
-    if (version >= 2):
-        data['InstanceName'] = r_lstring(f);
-        data['DontAddToScene'] = r_bool(f);
-    if (version >= 1):
-        data['Clusters'] = parse_cont(f, r_int32);
-
-    data['Name'] = r_lstring(f);
-    data['Pos'] = r_Vec3f(f);
-    data['Rot'] = r_Vec4f(f);
-    data['Scale'] = r_Vec3f(f);
-    data['nParent'] = r_int32(f);
-
-    data['NelType'] = 'CInstanceGroup::CInstance';
-    return data;
-
-
-# CInstanceGroup::serial(...) from 'nel/3d/scene_group.cpp'
-def parse_CInstanceGroup(f):
-    data = {};
-    ver = r_version(f);
+gImageSearchPaths = ['.', '../ryzom_assets_rev2/orig_textures_flat', '../testdata', 'construction', 'newbieland_maps', 'lacustre_maps', 'fauna_maps', 'desert_maps', 'jungle_maps', 'snowballs/maps', 'outgame', 'objects']
     
-    data['_RealTimeSunContribution'] = r_bool(f) if ver >= 5 else True;
-    data['_IGSurfaceLight'] = parse_CIGSurfaceLight(f) if ver >= 4 else [];
-    data['_PointLightArray'] = parse_CPointLightNamedArray(f) if ver >= 3 else [];
-    data['_GlobalPos'] = r_Vec3f(f) if ver >= 2 else (0,0,0);
-
-    if (ver >= 1):
-        data['_ClusterInfos'] = parse_cont(f, parse_CCluster);
-        data['_Portals'] = parse_cont(f, parse_CPortal);
-
-        for i in range(len(data['_ClusterInfos'])):
-            nNbPortals = r_uint32(f);
-            for j in range(nNbPortals):
-                nPortalNb = r_int32(f);
-                #!!TODO: actually set the data here (if it is needed); currently ignored
-
-
-    data['_InstancesInfos'] = parse_cont(f, parse_CInstanceGroup_CInstance);
-
-    data['NelType'] = 'CInstanceGroup';
-    return data;
-
-
-def parse_map(f, key_func, parse_func, typeName):
-    data = {};
-    numElements = r_uint32(f);
-
-    for i in range(numElements):
-        key = key_func(f);
-        mat = parse_func(f);
-        data[key] = mat;
-
-    data['NelType'] = typeName;
-    return data;
-
-
-def parse_cont(f, parse_func):
-    data = [];
-    num = r_uint32(f);
-    for i in range(0, num):
-        data.append(parse_func(f));
-    return data;
-
-
-gStreamIDMap = {}; # stores the loaded 'id's of PolyPtr for one stream !!TODO: encapsulate it into a stream
-
+# image file name index per import root path: lower case file name -> full path (see
+# helper_getImageIndex); clear it when texture files were added to the search paths
+gImageIndex = {};
+
+# full image path -> name of the blender image loaded from it
+gImageCache = {};
+
+# Lists each of the gImageSearchPaths below importRootPath once and returns a dict that maps
+# the lower case file names to their full path. A .dds or .png file is also entered under
+# the .tga name it replaces; the lookup order of the search paths is kept: the first path
+# wins and inside a path the exact name comes before the .dds and then the .png fallback.
+def helper_getImageIndex(importRootPath):
+    if importRootPath in gImageIndex:
+        return gImageIndex[importRootPath];
+
+    fallbackExts = {'.dds': 1, '.png': 2};
+    found = {}; # lower case name -> ((search path index, fallback), full path)
+    for pathIdx, path in enumerate(gImageSearchPaths):
+        path = importRootPath + '/' + path + '/';
+        try:
+            fileNames = os.listdir(path);
+        except OSError:
+            continue;
+        for fname in fileNames:
+            name = fname.lower();
+            candidates = [(name, (pathIdx, 0))];
+            base, ext = os.path.splitext(name);
+            if ext in fallbackExts:
+                candidates.append((base + '.tga', (pathIdx, fallbackExts[ext])));
+            for key, order in candidates:
+                if key not in found or order < found[key][0]:
+                    found[key] = (order, path + fname);
 
-def parse_ptr(f, parse_func):
-    node = r_uint64(f);
-    #print("Node in parse_ptr: " + str(node));
-    if (node == 0):
-        return None;
-    if (node in gStreamIDMap):
-        return gStreamIDMap[node];
+    index = dict((name, fullPath) for name, (order, fullPath) in found.items());
+    gImageIndex[importRootPath] = index;
+    return index;
 
-    return parse_func(f);
-    
 
-def parse_PolyPtr(f):
-    node = r_uint64(f);
-    #print('node = %d' % node);
-    if (node == 0):
+def findImage(filename, importRootPath):
+    fullPath = helper_getImageIndex(importRootPath).get(filename.lower());
+    if fullPath is None:
+        print("WARNING: could not find image texture " + filename);
         return None;
 
-    if (node in gStreamIDMap):
-        print("FoundSth: " + gStreamIDMap[node]["NelType"]);
-        return gStreamIDMap[node];
-
-    className = r_lstring(f);
-
-    if className == 'CMesh':
-        gStreamIDMap[node] = parse_CMesh(f);
-    elif className == 'CMeshMultiLod':
-        gStreamIDMap[node] = parse_CMeshMultiLod(f);
-    elif className == 'CMeshMRM':
-        gStreamIDMap[node] = parse_CMeshMRM(f);
-    elif className == 'CMeshMRMSkinned':
-        gStreamIDMap[node] = parse_CMeshMRMSkinned(f);
-    elif className == 'CTextureFile':
-        gStreamIDMap[node] = parse_CTextureFile(f);
-    elif className == 'CTextureMultiFile':
-        gStreamIDMap[node] = parse_CTextureMultiFile(f);
-    elif className == 'CMeshGeom':
-        gStreamIDMap[node] = parse_CMeshGeom(f);
-    elif className == 'CMeshVPWindTree':
-        gStreamIDMap[node] = parse_CMeshVPWindTree(f);
-    elif className == 'CTextureCube':
-        gStreamIDMap[node] = parse_CTextureCube(f);
-    elif className == 'CSkeletonShape':
-        gStreamIDMap[node] = parse_CSkeletonShape(f);
-
-    elif className == 'CTrackSampledQuat':
-        gStreamIDMap[node] = parse_CTrackSampledQuat(f);
-    elif className == 'CTrackSampledVector':
-        gStreamIDMap[node] = parse_CTrackSampledVector(f);
-
-    # Animation Track Classes: see 'nel/3d/track_keyframer.h'
-    elif className == 'CTrackKeyFramerLinearQuat':
-        gStreamIDMap[node] = parse_ITrackKeyFramer(f, 'CTrackKeyFramerLinearQuat', 'CKeyQuat', parse_CKey, r_Vec4f); # reads quaternions as Vec4f
-    elif className == 'CTrackKeyFramerLinearVector':
-        gStreamIDMap[node] = parse_ITrackKeyFramer(f, 'CTrackKeyFramerLinearVector', 'CKeyVector', parse_CKey, r_Vec3f);
-    elif className == 'CTrackKeyFramerTCBQuat':
-        gStreamIDMap[node] = parse_ITrackKeyFramer(f, 'CTrackKeyFramerTCBQuat', 'CKeyTCBQuat', parse_CKeyTCB, r_Vec4f);
-
-    elif className == 'CTrackDefaultVector':
-        gStreamIDMap[node] = parse_CTrackDefaultVector(f);
-    elif className == 'CTrackDefaultQuat':
-        gStreamIDMap[node] = parse_CTrackDefaultQuat(f);
+    # every image file is loaded only once
+    imgName = gImageCache.get(fullPath);
+    if imgName is not None and imgName in bpy.data.images:
+        return bpy.data.images[imgName];
 
+    from bpy_extras.image_utils import load_image # only needed when a mesh with textures is imported
+    img = load_image(fullPath);
+    if (img):
+        gImageCache[fullPath] = img.name;
+        return img;
     else:
-        error("Unsuported PolyPtr node = " + str(node) + " className = " + str(className));
+        print("ERROR loading image from " + fullPath);
         return None;
 
-    return gStreamIDMap[node];
-
-# reading in a file where magic == b'NEL_ANIM' and returning a 'CAnimation' data object
-def parse_CAnimation(f):
-    data = {};
-
-    version = r_version(f);
-    data['_Name'] = r_lstring(f);
-    data['_IdByName'] = parse_map(f, r_lstring, r_uint32, 'TMapStringUInt'); # this is empty if AnimHeaderCompression is enabled; the required mapping will come from an animation set
-    data['_TrackVector'] = parse_cont(f, parse_PolyPtr);
-
-    data['_MinEndTime'] = r_float(f) if version >= 1 else -FLT_MAX;
-
-    if (version >= 2):
-        data['_SSSShapes'] = parse_cont(f, r_lstring);
-
-    data['NelType'] = "CAnimation";
-    return data;
-    
-
-
-gImageSearchPaths = ['.', '../ryzom_assets_rev2/orig_textures_flat', '../testdata', 'construction', 'newbieland_maps', 'lacustre_maps', 'fauna_maps', 'desert_maps', 'jungle_maps', 'snowballs/maps', 'outgame', 'objects']
-    
-def findImage(filename, importRootPath):
-    filename = filename.lower();
-    for path in gImageSearchPaths:
-        path = importRootPath + '/' + path + '/';
-        fname = filename;
-        if not os.path.exists(path+fname):
-            fname = filename.replace('.tga', '.dds').replace('.TGA', '.dds');
-        if not os.path.exists(path+fname):
-            fname = filename.replace('.tga', '.png').replace('.TGA', '.png');
-        if not os.path.exists(path+fname):
-            continue;
-
-        img = load_image(path+fname);
-        if (img): return img;
-        else:
-            print("ERROR loading image from " + path+fname);
-            return None;
-
-    print("WARNING: could not find image texture " + filename);
-    return None;
-
 
 def helper_createAndAddTexture_returnImage(bmat, texFileName, suffixName, importRootPath):
     img = findImage(texFileName, importRootPath);
@@ -1498,67 +169,156 @@ def helper_createAndAddTexture_returnImage(bmat, texFileName, suffixName, import
     
 
 
-def load_NEL_file(fullFilePath):
-    gStreamIDMap.clear(); # clear the node ID cache
-
-    if not os.path.exists(fullFilePath):
-        error("Could not load file %r" % fullFilePath);
-    name = os.path.basename(fullFilePath);
-    f = open(fullFilePath, 'rb');
-    
-    # read the first 3 'magic' 32 bits
-    magic0 = f.read(4);
-    magic1 = f.read(4);
-    magic2 = f.read(4);
-    f.seek(0); # rewind file (since we have to check how long the magic is below
-
-    if magic0 == b'SHAP':
-        f.read(4); # skip magic
-        meshdata = parse_PolyPtr(f);
-        meshdata['NelName'] = name;
-        return meshdata;
-    elif magic0 == b'NEL_' and magic1 == 'ANIM' and magic2 == b'_SET':
-        f.read(12); # skip magic
-        error("!!TODO: ANIM_SET not yet implemented");
-    elif magic0 == b'NEL_' and magic1 == b'ANIM':
-        f.read(8); # skip magic
-        animdata = parse_CAnimation(f);
-        animdata['NelName'] = name;
-        return animdata;
-    elif magic0 == b'GRPT':
-        f.read(4); # skip magic
-        igroup = parse_CInstanceGroup(f);
-        igroup['NelName'] = name;
-        return igroup;
-    else:
-        error("Unsupported NEL file format magic = " + str(magic) + "; only 'SHAP' and 'NEL_ANIM' file are currently supported.");
-        
-
-    return None;
-
+# concatenates the index buffers of all given (materialId, indices) render passes into one flat
+# array of triangle corners and one array that holds the material id of each triangle
+def helper_concatRdrPasses(rdrPasses):
+    if numpy is not None:
+        if len(rdrPasses) == 0:
+            return numpy.zeros(0, numpy.int32), numpy.zeros(0, numpy.int32);
+        corners = numpy.concatenate([numpy.asarray(idxs, numpy.int32) for matId, idxs in rdrPasses]);
+        faceMatIds = numpy.repeat(numpy.array([matId for matId, idxs in rdrPasses], numpy.int32),
+                                  [len(idxs) // 3 for matId, idxs in rdrPasses]);
+        return corners, faceMatIds;
+
+    corners = array.array('i');
+    faceMatIds = array.array('i');
+    for matId, idxs in rdrPasses:
+        corners.extend(idxs);
+        faceMatIds.extend(array.array('i', (matId,)) * (len(idxs) // 3));
+    return corners, faceMatIds;
+
+
+# converts flat triangle corners into the 4 indices per face expected by tessfaces 'vertices_raw'.
+# Like bpy_extras.io_utils.unpack_face_list triangles with a 0 as last index are rotated; this is
+# done in place in corners so per corner data (uvs) stays in sync when gathered with it afterwards
+def helper_toTessfaceVertices(corners):
+    numFaces = len(corners) // 3;
+    if numpy is not None:
+        faces = corners.reshape(numFaces, 3);
+        lastIsZero = (faces[:, 2] == 0);
+        faces[lastIsZero] = numpy.roll(faces[lastIsZero], -1, axis=1);
+        verticesRaw = numpy.zeros((numFaces, 4), numpy.int32);
+        verticesRaw[:, :3] = faces;
+        return verticesRaw.ravel();
+
+    for i in [i for i, idx in enumerate(corners[2::3]) if idx == 0]:
+        a, b, c = corners[3*i:3*i + 3];
+        corners[3*i:3*i + 3] = array.array('i', (b, c, a));
+    verticesRaw = array.array('i', (0,)) * (4 * numFaces);
+    verticesRaw[0::4] = corners[0::3];
+    verticesRaw[1::4] = corners[1::3];
+    verticesRaw[2::4] = corners[2::3];
+    return verticesRaw;
+
+
+# gathers the per vertex uvs for all triangle corners (as returned by helper_toTessfaceVertices)
+# and returns the 8 floats per face expected by the tessface uv layer 'uv_raw'; v is flipped for blender
+def helper_toTessfaceUVs(uvs, corners):
+    numFaces = len(corners) // 3;
+    if numpy is not None:
+        uvRaw = numpy.zeros((numFaces, 4, 2), numpy.float32);
+        uvRaw[:, :3, :] = numpy.asarray(uvs, numpy.float32)[corners].reshape(numFaces, 3, 2);
+        uvRaw[:, :3, 1] = 1.0 - uvRaw[:, :3, 1];
+        return uvRaw.ravel();
+
+    us = [uv[0] for uv in uvs];
+    vs = [1.0 - uv[1] for uv in uvs];
+    uvRaw = array.array('f', (0.0,)) * (8 * numFaces);
+    for corner in range(3):
+        cornerIdxs = corners[corner::3];
+        uvRaw[2*corner::8] = array.array('f', [us[i] for i in cornerIdxs]);
+        uvRaw[2*corner + 1::8] = array.array('f', [vs[i] for i in cornerIdxs]);
+    return uvRaw;
+
+
+# This is more or less a hack to assign the first loaded image in a material to each face
+# so it is visible in blender; the image is looked up once per material
+def helper_assignFaceImages(bmesh, bUVLayer, faceMatIds):
+    matImages = [];
+    for bmat in bmesh.materials:
+        img = None;
+        if (len(bmat.texture_slots) > 0 and bmat.texture_slots[0] != None):
+            img = bmat.texture_slots[0].texture.image;
+        matImages.append(img);
+
+    if not any(matImages):
+        return;
+    for i, matId in enumerate(faceMatIds):
+        img = matImages[matId];
+        if img: bUVLayer.data[i].image = img;
+
+
+# compacts the vertices referenced by the given triangle corners: returns the table of used
+# vertex indices (in order of first use) and the corners remapped into this table
+def helper_compactVertices(corners):
+    if numpy is not None:
+        uniqueIdxs, firstUse, inverse = numpy.unique(corners, return_index=True, return_inverse=True);
+        order = numpy.argsort(firstUse);
+        rank = numpy.empty(len(order), numpy.int32);
+        rank[order] = numpy.arange(len(order), dtype=numpy.int32);
+        return uniqueIdxs[order], rank[inverse.ravel()];
+
+    usedVertices = list(dict.fromkeys(corners));
+    remap = {nelIdx: bIdx for bIdx, nelIdx in enumerate(usedVertices)};
+    return usedVertices, array.array('i', [remap[idx] for idx in corners]);
+
+
+# groups the skinning influences (rows of bone matrix ids and weights per nel vertex) of the
+# used vertices by bone and weight. Returns a list of (matrixId, weight, [blender vertex indices])
+# so that each vertex group needs only one add(...) per distinct weight; several influences of
+# the same bone on one vertex are summed up first
+def helper_groupSkinWeights(matrices, weights, usedVertices):
+    if numpy is not None:
+        matrices = numpy.asarray(matrices);
+        numInfluences = matrices.shape[1];
+        boneIds = matrices[usedVertices].ravel().astype(numpy.int64);
+        boneWeights = numpy.asarray(weights)[usedVertices].ravel();
+        vertexIds = numpy.repeat(numpy.arange(len(usedVertices), dtype=numpy.int64), numInfluences);
+        used = (boneWeights != 0);
+        if not used.any():
+            return [];
+        stride = int(boneIds[used].max()) + 1;
+        keys, inverse = numpy.unique(vertexIds[used] * stride + boneIds[used], return_inverse=True);
+        sums = numpy.bincount(inverse.ravel(), weights=boneWeights[used]);
+        boneIds = keys % stride;
+        vertexIds = keys // stride;
+
+        order = numpy.lexsort((vertexIds, sums, boneIds));
+        boneIds = boneIds[order]; sums = sums[order]; vertexIds = vertexIds[order];
+        starts = numpy.concatenate(([0], numpy.flatnonzero((boneIds[1:] != boneIds[:-1]) | (sums[1:] != sums[:-1])) + 1));
+        ends = numpy.concatenate((starts[1:], [len(order)]));
+        return [(int(boneIds[s]), float(sums[s]), vertexIds[s:e].tolist()) for s, e in zip(starts, ends)];
+
+    vertexBoneWeights = {};
+    for bIdx, nelIdx in enumerate(usedVertices):
+        for boneId, w in zip(matrices[nelIdx], weights[nelIdx]):
+            if (w != 0):
+                key = (bIdx, boneId);
+                vertexBoneWeights[key] = vertexBoneWeights.get(key, 0.0) + w;
+    groups = {};
+    for (bIdx, boneId), w in vertexBoneWeights.items():
+        groups.setdefault((boneId, w), []).append(bIdx);
+    return [(boneId, w, idxs) for (boneId, w), idxs in sorted(groups.items())];
 
 
 # this function expects an already generated bmesh and adds the geometry
 def convert_CMeshGeom_to_BlenderMesh(bmesh, temp_Geom):
     temp_VData = temp_Geom['_VBuffer']['_VertexData'];
     bmesh.vertices.add(temp_Geom['_VBuffer']['_NbVerts']);
-    bmesh.vertices.foreach_set("co", unpack_list(temp_VData['Position']));
-    if 'Normal' in temp_VData: bmesh.vertices.foreach_set("normal", unpack_list(temp_VData['Normal']));
+    bmesh.vertices.foreach_set("co", array_flatten(temp_VData['Position'], 'f'));
+    if 'Normal' in temp_VData: bmesh.vertices.foreach_set("normal", array_flatten(temp_VData['Normal'], 'f'));
 
-    #!!TOOPT: this conversion copies the index data again (which might be slow when batch-importing a huge amount of models)
-    temp_AllFace_Idxs = []
-    temp_AllFace_MatIds = []
+    # the render passes of all matrix blocks are concatenated as whole index arrays
+    rdrPasses = [];
     for matrixBlock in temp_Geom['_MatrixBlocks']:
         for rdrPass in matrixBlock['RdrPass']:
-            matId = rdrPass['MaterialId'];
-            numIndices = rdrPass['PBlock']['_NbIndexes'];
-            for iIdx in range(0, numIndices, 3):
-                faceIdxs = (rdrPass['PBlock']['_NonResidentIndexes'][iIdx],rdrPass['PBlock']['_NonResidentIndexes'][iIdx+1],rdrPass['PBlock']['_NonResidentIndexes'][iIdx+2]);
-                temp_AllFace_Idxs.append(faceIdxs);
-                temp_AllFace_MatIds.append(matId);
-
-    bmesh.tessfaces.add(len(temp_AllFace_Idxs));
-    bmesh.tessfaces.foreach_set("vertices_raw", unpack_face_list(temp_AllFace_Idxs));
+            pblock = rdrPass['PBlock'];
+            rdrPasses.append((rdrPass['MaterialId'], pblock['_NonResidentIndexes'][:pblock['_NbIndexes']]));
+    temp_AllFace_Idxs, temp_AllFace_MatIds = helper_concatRdrPasses(rdrPasses);
+    numFaces = len(temp_AllFace_MatIds);
+
+    bmesh.tessfaces.add(numFaces);
+    bmesh.tessfaces.foreach_set("vertices_raw", helper_toTessfaceVertices(temp_AllFace_Idxs));
     bmesh.tessfaces.foreach_set("material_index", temp_AllFace_MatIds);
 
     if (temp_Geom['_Skinned']):
@@ -1569,31 +329,62 @@ def convert_CMeshGeom_to_BlenderMesh(bmesh, temp_Geom):
         setKey = 'TexCoord'+str(i);
         if setKey in temp_VData:
             bUVLayer = bmesh.tessface_uv_textures.new(setKey);
-            vertexUVs = temp_VData[setKey];
-            for i, faceIdxs in enumerate(temp_AllFace_Idxs):
-                b_texFace = bUVLayer.data[i];
-                b_texFace.uv1 = vertexUVs[faceIdxs[0]];
-                b_texFace.uv2 = vertexUVs[faceIdxs[1]];
-                b_texFace.uv3 = vertexUVs[faceIdxs[2]];
-
-                b_texFace.uv1[1] = 1.0 - b_texFace.uv1[1]
-                b_texFace.uv2[1] = 1.0 - b_texFace.uv2[1]
-                b_texFace.uv3[1] = 1.0 - b_texFace.uv3[1]
-
-                if (len(bmesh.materials[temp_AllFace_MatIds[i]].texture_slots) > 0):
-                    if (bmesh.materials[temp_AllFace_MatIds[i]].texture_slots[0] != None):
-                        b_texFace.image = bmesh.materials[temp_AllFace_MatIds[i]].texture_slots[0].texture.image;
+            bUVLayer.data.foreach_set("uv_raw", helper_toTessfaceUVs(temp_VData[setKey], temp_AllFace_Idxs));
+            helper_assignFaceImages(bmesh, bUVLayer, temp_AllFace_MatIds);
 
     # enddef --convert_CMeshGeom_to_BlenderMesh(bmesh, temp_Geom)--
 
 
+# converts the finest loaded lod of a CMeshMRMGeom (see read_CMeshMRMGeom_SingleLod)
 def convert_CMeshMRMGeom_to_BlenderMesh(bobj, bmesh, nelGeom):
-    error("!!TODO: not yet implemented: convert_CMeshMRMGeom_to_BlenderMesh");
+    lod = [lod for lod in nelGeom['_Lods'] if lod is not None][-1];
+
+    # the geomorphs are applied to a copy of the vertex values (including the skin weights)
+    # so the parsed vertex buffer stays untouched
+    vertexValues = {};
+    for key, rows in nelGeom['_VBufferFinal']['_VertexData'].items():
+        vertexValues[key] = numpy.array(rows) if numpy is not None else list(rows);
+    if nelGeom['_Skinned']:
+        matrices = [[m for m, w in sw['MatrixId_Weights']] for sw in nelGeom['_SkinWeights']];
+        weights = [[w for m, w in sw['MatrixId_Weights']] for sw in nelGeom['_SkinWeights']];
+        vertexValues['Matrix'] = numpy.array(matrices, numpy.uint32) if numpy is not None else matrices;
+        vertexValues['Weight'] = numpy.array(weights, numpy.float32) if numpy is not None else weights;
+    helper_applyGeomorphStart(vertexValues, lod['Geomorphs']);
+
+    # the used vertices are compacted over the concatenated index buffers of all render passes
+    rdrPasses = [];
+    for rdrPass in lod['RdrPass']:
+        pblock = rdrPass['PBlock'];
+        rdrPasses.append((rdrPass['MaterialId'], pblock['_NonResidentIndexes'][:pblock['_NbIndexes']]));
+    temp_AllCorners, temp_AllFace_MatIds = helper_concatRdrPasses(rdrPasses);
+    temp_UsedVertices, temp_AllCorners = helper_compactVertices(temp_AllCorners);
+
+    bmesh.vertices.add(len(temp_UsedVertices));
+    bmesh.vertices.foreach_set("co", array_flatten(array_gather(vertexValues['Position'], temp_UsedVertices), 'f'));
+    if 'Normal' in vertexValues: bmesh.vertices.foreach_set("normal", array_flatten(array_gather(vertexValues['Normal'], temp_UsedVertices), 'f'));
+
+    bmesh.tessfaces.add(len(temp_AllFace_MatIds));
+    bmesh.tessfaces.foreach_set("vertices_raw", helper_toTessfaceVertices(temp_AllCorners));
+    bmesh.tessfaces.foreach_set("material_index", temp_AllFace_MatIds);
+
+    #look for uv's and add them as named uv-sets to the bmesh
+    for i in range (8):
+        setKey = 'TexCoord'+str(i);
+        if setKey in vertexValues:
+            bUVLayer = bmesh.tessface_uv_textures.new(setKey);
+            bUVLayer.data.foreach_set("uv_raw", helper_toTessfaceUVs(array_gather(vertexValues[setKey], temp_UsedVertices), temp_AllCorners));
+            helper_assignFaceImages(bmesh, bUVLayer, temp_AllFace_MatIds);
+
+    if nelGeom['_Skinned']:
+        vgroups = [bobj.vertex_groups.new(boneName) for boneName in nelGeom['_BonesName']];
+        for vgroupIdx, w, bIdxs in helper_groupSkinWeights(vertexValues['Matrix'], vertexValues['Weight'], temp_UsedVertices):
+            vgroups[vgroupIdx].add(bIdxs, w, 'REPLACE');
 
     # enddef --def convert_CMeshMRMGeom_to_BlenderMesh(bobj, bmesh, nelGeom)--
 
 
-# unpacks a CMeshMRMSkinnedGeom::CPackedVertexBuffer into [[Position], [Normal], [UV])
+# unpacks a CMeshMRMSkinnedGeom::CPackedVertexBuffer into float rows of 'Position', 'Normal', 'UV', 'Weight'
+# and the bone 'Matrix' ids; all values are scaled as whole arrays when numpy is available
 def unpack_CPackedVertexBuffer(packedVB):
     scale = packedVB['_DecompactScale'];
     normalScale = 1.0 / NL3D_MESH_MRM_SKINNED_NORMAL_FACTOR;
@@ -1602,22 +393,35 @@ def unpack_CPackedVertexBuffer(packedVB):
 
     packedVertices = packedVB['_PackedBuffer'];
     unpackedVB = {};
-    unpackedVB['Postion'] = [ (v['X'] * scale, v['Y'] * scale, v['Z'] * scale) for v in packedVertices];
-    unpackedVB['Normal'] = [ (v['Nx'] * normalScale, v['Ny'] *  normalScale, v['Nz'] *  normalScale)  for v in packedVertices];
-    unpackedVB['UVs'] = [ (v['U'] * uvScale, v['V'] * uvScale) for v in packedVertices];
-
-    unpackedVB['Matrix'] = [(v['Matrices_Weights'][0][0],
-                            v['Matrices_Weights'][1][0],
-                            v['Matrices_Weights'][2][0],
-                            v['Matrices_Weights'][3][0]) for v in packedVertices];
-    unpackedVB['Weight'] = [(v['Matrices_Weights'][0][1] * weightScale,
-                            v['Matrices_Weights'][1][1] * weightScale,
-                            v['Matrices_Weights'][2][1] * weightScale,
-                            v['Matrices_Weights'][3][1] * weightScale) for v in packedVertices];
+    if numpy is not None:
+        unpackedVB['Position'] = packedVertices['Position'] * numpy.float32(scale);
+        unpackedVB['Normal'] = packedVertices['Normal'] * numpy.float32(normalScale);
+        unpackedVB['UV'] = packedVertices['UV'] * numpy.float32(uvScale);
+        unpackedVB['Matrix'] = numpy.array(packedVertices['Matrix']);
+        unpackedVB['Weight'] = packedVertices['Weight'] * numpy.float32(weightScale);
+    else:
+        unpackedVB['Position'] = [(x * scale, y * scale, z * scale) for x, y, z in packedVertices['Position']];
+        unpackedVB['Normal'] = [(x * normalScale, y * normalScale, z * normalScale) for x, y, z in packedVertices['Normal']];
+        unpackedVB['UV'] = [(u * uvScale, v * uvScale) for u, v in packedVertices['UV']];
+        unpackedVB['Matrix'] = list(packedVertices['Matrix']);
+        unpackedVB['Weight'] = [tuple(w * weightScale for w in weights) for weights in packedVertices['Weight']];
 
     return unpackedVB;
 
 
+#applyGeomorph for selected lod using the 'Start' index for the maximum LoD level; this changes
+# the rows of the unpackedVB (as returned by unpack_CPackedVertexBuffer) in place
+def helper_applyGeomorphStart(unpackedVB, geomorphs):
+    numGeomorphs = len(geomorphs);
+    if numGeomorphs == 0:
+        return;
+    startIdxs = [morph['Start'] for morph in geomorphs];
+    for key, rows in unpackedVB.items():
+        if numpy is not None:
+            rows[:numGeomorphs] = rows[startIdxs];
+        else:
+            rows[:numGeomorphs] = [rows[i] for i in startIdxs];
+
 
 def debug_PrintMRMGeomInfo(mrmGeom):
     print(" NumLODs = %d" % len(mrmGeom['_Lods']));
@@ -1646,91 +450,40 @@ def convert_CMeshMRMSkinnedGeom_to_BlenderMesh(bobj, bmesh, mrmGeom):
     #for lod in mrmGeom['_Lods']: !!TODO: need a plan on how to handle Lod meshes
     lod = mrmGeom['_Lods'][-1];
 
-    geoms = lod['Geomorphs'];
-
-    #applyGeomorph for selected lod using the 'Start' index for the maximum LoD level
-    # this data must be preserved if LoD support should be added to the loader
-    for i, morph in enumerate(geoms):
-        startIdx = morph['Start'];
-        endIdx = morph['End'];
-        packedVB['_PackedBuffer'][i] = packedVB['_PackedBuffer'][startIdx]; # ????
-
-
     unpackedVB = unpack_CPackedVertexBuffer(packedVB);
 
-    temp_AllFace_Idxs = []
-    temp_AllFace_MatIds = []
-
-    hack_VertexMap = {}; # maps the nel vertex index to the blender vertex index in temp_AllVertices
-    temp_AllVertices = []; # used to store only the vertices that are actually used (?? is this needed ??)
-    temp_AllNormals = [];
-    temp_AllUVs = [];
-    
-    for rdrPass in lod['RdrPass']:
-        #numTris = numTris + len(rdrPass['PBlock'])/3;
-        matId = rdrPass['MaterialId'];
-        for fIdx in range(0, len(rdrPass['PBlock']), 3):
-            faceIdxs = (rdrPass['PBlock'][fIdx+0], rdrPass['PBlock'][fIdx+1], rdrPass['PBlock'][fIdx+2]);
-
-            idx = [0,0,0];
-            for i in range(3):
-                if faceIdxs[i] in hack_VertexMap:
-                    idx[i] = hack_VertexMap[faceIdxs[i]];
-                else:
-                    idx[i] = len(temp_AllVertices);
-                    hack_VertexMap[faceIdxs[i]] = idx[i];
-                    temp_AllVertices.append(unpackedVB['Postion'][faceIdxs[i]]);
-                    temp_AllNormals.append(unpackedVB['Normal'][faceIdxs[i]]);
-                    temp_AllUVs.append(unpackedVB['UVs'][faceIdxs[i]]);
-
-                    if (temp_AllVertices[-1] == (0, 0, 0)):
-                        print("%d <== %d" % (idx[i], faceIdxs[i]));
-            
-            temp_AllFace_Idxs.append((idx[0], idx[1], idx[2]));
-            temp_AllFace_MatIds.append(matId);
+    # the geomorphs are applied to the unpacked copy so the parsed packed buffer stays untouched
+    helper_applyGeomorphStart(unpackedVB, lod['Geomorphs']);
 
+    # the used vertices are compacted over the concatenated index buffers of all render passes
+    rdrPasses = [(rdrPass['MaterialId'], rdrPass['PBlock']) for rdrPass in lod['RdrPass']];
+    temp_AllCorners, temp_AllFace_MatIds = helper_concatRdrPasses(rdrPasses);
+    temp_UsedVertices, temp_AllCorners = helper_compactVertices(temp_AllCorners);
 
-    bmesh.vertices.add(len(temp_AllVertices));
-    bmesh.vertices.foreach_set("co", unpack_list(temp_AllVertices));
-    bmesh.vertices.foreach_set("normal", unpack_list(temp_AllNormals));
+    bmesh.vertices.add(len(temp_UsedVertices));
+    bmesh.vertices.foreach_set("co", array_flatten(array_gather(unpackedVB['Position'], temp_UsedVertices), 'f'));
+    bmesh.vertices.foreach_set("normal", array_flatten(array_gather(unpackedVB['Normal'], temp_UsedVertices), 'f'));
+    temp_AllUVs = array_gather(unpackedVB['UV'], temp_UsedVertices);
 
-    bmesh.tessfaces.add(len(temp_AllFace_Idxs));
-    bmesh.tessfaces.foreach_set("vertices_raw", unpack_face_list(temp_AllFace_Idxs));
+    bmesh.tessfaces.add(len(temp_AllFace_MatIds));
+    bmesh.tessfaces.foreach_set("vertices_raw", helper_toTessfaceVertices(temp_AllCorners));
     bmesh.tessfaces.foreach_set("material_index", temp_AllFace_MatIds);
 
     bUVLayer = bmesh.tessface_uv_textures.new("uv0");
-    for i, faceIdxs in enumerate(temp_AllFace_Idxs):
-        b_texFace = bUVLayer.data[i];
-        b_texFace.uv1 = temp_AllUVs[faceIdxs[0]];
-        b_texFace.uv2 = temp_AllUVs[faceIdxs[1]];
-        b_texFace.uv3 = temp_AllUVs[faceIdxs[2]];
-
-        b_texFace.uv1[1] = 1.0 - b_texFace.uv1[1]
-        b_texFace.uv2[1] = 1.0 - b_texFace.uv2[1]
-        b_texFace.uv3[1] = 1.0 - b_texFace.uv3[1]
-
-        # This is more or less a hack to assign the first loaded image in a material to each face
-        # so it is visible in blender
-        if (len(bmesh.materials[temp_AllFace_MatIds[i]].texture_slots) > 0):
-            b_texFace.image = bmesh.materials[temp_AllFace_MatIds[i]].texture_slots[0].texture.image;
+    bUVLayer.data.foreach_set("uv_raw", helper_toTessfaceUVs(temp_AllUVs, temp_AllCorners));
+    helper_assignFaceImages(bmesh, bUVLayer, temp_AllFace_MatIds);
 
 
 
     vgroups = [];
     # now we create the vertex groups named with the '_BonesName' array from the nel mrmGeom:
     for boneName in mrmGeom['_BonesName']:
-        print(boneName);
         vgroups.append(bobj.vertex_groups.new(boneName));
 
-    
-    for nelIdx, bIdx in hack_VertexMap.items():
-        nelVertexMatrix = unpackedVB['Matrix'][nelIdx];
-        nelVertexWeight = unpackedVB['Weight'][nelIdx];
-        for i, w in enumerate(nelVertexWeight):
-            if (w != 0):
-                vgroupIdx = nelVertexMatrix[i];
-                vgroups[vgroupIdx].add([bIdx], w, 'ADD');
-                
+    # the weights are grouped by bone first; one add(...) per bone and distinct weight
+    # (blender 2.63 has no direct bulk write of vertex group weights)
+    for vgroupIdx, w, bIdxs in helper_groupSkinWeights(unpackedVB['Matrix'], unpackedVB['Weight'], temp_UsedVertices):
+        vgroups[vgroupIdx].add(bIdxs, w, 'REPLACE');
 
     return;
     error("Not yet implemented");
@@ -1739,6 +492,81 @@ def convert_CMeshMRMSkinnedGeom_to_BlenderMesh(bobj, bmesh, mrmGeom):
 
 
 
+# creates a new blender material from a parsed CMaterial; matIdx is only used in the texture names
+def convert_CMaterial_to_BlenderMaterial(mat, matName, matIdx, importRootPath):
+    bmat = bpy.data.materials.new(matName);
+    
+    #!!TODO: what is '_Color' what is '_Diffuse' ??
+    #!!Note: alpha and specular_alpha are currently ignored here
+    bmat.diffuse_color = [x / 255.0 for x in mat['_Color'][:3]];
+    bmat.specular_color = [x / 255.0 for x in mat['_Specular'][:3]];
+    bmat.specular_hardness = mat['_Shininess']; #!!TODO: this needs a propper conversion; bmat.specular_hardness is in int[0..511] the mat['_Shininess'] is a float
+
+    for tex in mat['_Textures']:
+        if tex != None and '_FileName' in tex:
+            texFileName = tex['_FileName'];
+            helper_createAndAddTexture_returnImage(bmat, texFileName, str(matIdx), importRootPath);
+        elif tex != None and '_FileNames' in tex:
+            for texNum, texFileName in enumerate(tex['_FileNames']):
+                helper_createAndAddTexture_returnImage(bmat, texFileName, str(matIdx)+"_"+str(texNum), importRootPath);
+        elif tex != None:
+            print("WARNING !!TODO: Texture without '_Filename': NelType = " + tex['NelType']);
+            #print(tex);
+            
+
+    #print(mat['_SrcBlend']);
+    #print(mat['_DstBlend']);
+    #print(mat['_AlphaTestThreshold']);
+    #print("");
+
+    if (mat['_SrcBlend'] == 'one'):        
+        # Settings for nicer preview; !!TODO: this should depend on the texture??
+        bmat.game_settings.alpha_blend = "ALPHA";
+        bmat.game_settings.use_backface_culling = False;
+
+        # Settings to render alphaclipping
+        bmat.alpha = 0.0;
+        bmat.use_transparency = True;
+        bmat.use_transparent_shadows = True;
+
+    return bmat;
+
+
+# returns a string that is equal for all CMaterials that convert to the same blender material
+def helper_getMaterialHash(mat, importRootPath):
+    textures = [];
+    for tex in mat['_Textures']:
+        if tex == None:
+            textures.append(None);
+        elif '_FileName' in tex:
+            textures.append(tex['_FileName'].lower());
+        elif '_FileNames' in tex:
+            textures.append(tuple(texFileName.lower() for texFileName in tex['_FileNames']));
+        else:
+            textures.append(tex['NelType']);
+    texEnvs = [tuple(texEnv['ConstantColor']) if texEnv != None else None for texEnv in mat['_TexEnvs']];
+
+    key = (importRootPath, mat['_ShaderType'], mat['_Flags'], mat['_SrcBlend'], mat['_DstBlend'],
+           tuple(mat['_Color']), tuple(mat['_Emissive']), tuple(mat['_Ambient']), tuple(mat['_Diffuse']), tuple(mat['_Specular']),
+           mat['_Shininess'], mat['_AlphaTestThreshold'], tuple(textures), tuple(texEnvs));
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest();
+
+# material hash (see helper_getMaterialHash) -> name of the blender material created for it
+gMaterialCache = {};
+
+# returns the blender material for a parsed CMaterial; identical materials of all imported
+# shapes share one blender material (and its textures)
+def helper_getBlenderMaterial(mat, matName, matIdx, importRootPath):
+    matHash = helper_getMaterialHash(mat, importRootPath);
+    bmatName = gMaterialCache.get(matHash);
+    if bmatName is not None and bmatName in bpy.data.materials:
+        return bpy.data.materials[bmatName];
+
+    bmat = convert_CMaterial_to_BlenderMaterial(mat, matName, matIdx, importRootPath);
+    gMaterialCache[matHash] = bmat.name;
+    return bmat;
+
+
 def convert_NelMesh_to_BlenderObject(meshdata, importRootPath):
     name = meshdata['NelName'];
     bmesh = bpy.data.meshes.new(name);
@@ -1746,42 +574,7 @@ def convert_NelMesh_to_BlenderObject(meshdata, importRootPath):
     # convert the materials !!TODO: lots of parameters are not yet added/implemented
     for i, mat in enumerate(meshdata['_Materials']):
         # all keys in mat: ['_Specular', '_ShaderType', '_DstBlend', '_AlphaTestThreshold', '_Textures', '_ZFunction', '_TexAddrMode', '_LightMapsMulx2', '_TexCoordGenMode, '_TexEnvs', '_Shininess', '_ZBias', '_Color', '_TexUserMat', '_Ambient', '_Flags', '_Emissive', '_SrcBlend', '_LightMaps', '_Diffuse'])
-
-        bmat = bpy.data.materials.new(name+"_mat"+str(i));
-        
-        #!!TODO: what is '_Color' what is '_Diffuse' ??
-        #!!Note: alpha and specular_alpha are currently ignored here
-        bmat.diffuse_color = [x / 255.0 for x in mat['_Color'][:3]];
-        bmat.specular_color = [x / 255.0 for x in mat['_Specular'][:3]];
-        bmat.specular_hardness = mat['_Shininess']; #!!TODO: this needs a propper conversion; bmat.specular_hardness is in int[0..511] the mat['_Shininess'] is a float
-
-        for tex in mat['_Textures']:
-            if tex != None and '_FileName' in tex:
-                texFileName = tex['_FileName'];
-                helper_createAndAddTexture_returnImage(bmat, texFileName, str(i), importRootPath);
-            elif tex != None and '_FileNames' in tex:
-                for texNum, texFileName in enumerate(tex['_FileNames']):
-                    helper_createAndAddTexture_returnImage(bmat, texFileName, str(i)+"_"+str(texNum), importRootPath);
-            elif tex != None:
-                print("WARNING !!TODO: Texture without '_Filename': NelType = " + tex['NelType']);
-                #print(tex);
-                
-
-        #print(mat['_SrcBlend']);
-        #print(mat['_DstBlend']);
-        #print(mat['_AlphaTestThreshold']);
-        #print("");
-
-        if (mat['_SrcBlend'] == 'one'):        
-            # Settings for nicer preview; !!TODO: this should depend on the texture??
-            bmat.game_settings.alpha_blend = "ALPHA";
-            bmat.game_settings.use_backface_culling = False;
-
-            # Settings to render alphaclipping
-            bmat.alpha = 0.0;
-            bmat.use_transparency = True;
-            bmat.use_transparent_shadows = True;
-
+        bmat = helper_getBlenderMaterial(mat, name+"_mat"+str(i), i, importRootPath);
         bmesh.materials.append(bmat);
 
 
@@ -1817,6 +610,11 @@ def convert_NelMesh_to_BlenderObject(meshdata, importRootPath):
     #--enddef convert_NelMesh_to_BlenderObject(meshdata)--
 
 
+# returns the mathutils.Matrix of a parsed CMatrix (see parse_CMatrix)
+def helper_getBlenderMatrix(nelMatrix):
+    return mathutils.Matrix(nelMatrix['M']);
+
+
 def convert_NelSkeleton_to_BlenderArmature(skeleton):
     if skeleton['NelType'] != 'CSkeletonShape':
         error("convert_NelSkeleton_to_BlenderArmature: Invalid NelType given: " + str(skeleton['NelType']));
@@ -1842,7 +640,7 @@ def convert_NelSkeleton_to_BlenderArmature(skeleton):
         #!!TODO: need to understand how to handle inv bind position and the Default* stored in the skeleton
         # animation data seems to be absolute to the Default* matrix
 
-        worldTM = nbone['InvBindPos']['M'].inverted();
+        worldTM = helper_getBlenderMatrix(nbone['InvBindPos']).inverted();
         #worldTM = helper_Nel_get_LocalSkeletonMatrix_Recursive(nbone, skeleton);
         #worldTM = mathutils.Matrix.Identity(4);
 
@@ -1890,7 +688,7 @@ def getBindTrafo_Recursive(boneName, nelSkeleton):
     nelBone = nelSkeleton['_Bones'][nelSkeleton['_BoneMap'][boneName]];
     
     #print(nelBone['InvBindPos']['M']);
-    bMat = nelBone['InvBindPos']['M'];
+    bMat = helper_getBlenderMatrix(nelBone['InvBindPos']);
 
 
     if (nelBone['FatherId'] == -1):
@@ -1924,6 +722,47 @@ def temp_helper_KeyQuatToBlenderFCurveQuat(nelBone, nelSkeleton, x, y, z, w):
 
     return keyQuat;
 
+# the same for all keys of a sampled track at once (rows of (w, x, y, z)); like above the keys are
+# currently used unchanged
+def temp_helper_KeyQuatsToBlenderFCurveQuats(nelBone, nelSkeleton, keyQuats):
+    return keyQuats;
+
+
+# the number of blender frames per second of NeL animation time
+BLENDER_FRAMES_PER_SECOND = 60;
+
+# returns the blender frames of the given key times (in seconds; i.e. the _KeyTimes of a sampled track)
+def helper_getKeyFrames(keyTimes):
+    if numpy is not None:
+        return numpy.asarray(keyTimes) * BLENDER_FRAMES_PER_SECOND;
+    return [BLENDER_FRAMES_PER_SECOND * t for t in keyTimes];
+
+# the value of 'LINEAR' in the enum of blender's Keyframe.interpolation
+KEYFRAME_INTERPOLATION_LINEAR = 1;
+
+# fills each of the given (empty) fcurves with one column of rows at the given frames; all keyframes
+# of a curve are added at once and set with one foreach_set("co", ...) instead of one
+# keyframe_points.insert (and curve update) per key. The keys are sampled (or reduced, see
+# nel3d_anim.py) values, so they are interpolated linearly instead of with the default bezier
+# curves that overshoot between the keys
+def helper_setFCurvesKeyframes(bfcurves, frames, rows):
+    numKeys = len(frames);
+    interpolations = array.array('i', [KEYFRAME_INTERPOLATION_LINEAR]) * numKeys;
+    if numpy is not None:
+        rows = numpy.asarray(rows);
+        co = numpy.empty((numKeys, 2), numpy.float32);
+        co[:, 0] = frames;
+    for channel, bfcurve in enumerate(bfcurves):
+        if numpy is not None:
+            co[:, 1] = rows[:, channel];
+            values = co.ravel();
+        else:
+            values = array.array('f', [c for frame, row in zip(frames, rows) for c in (frame, row[channel])]);
+        bfcurve.keyframe_points.add(numKeys);
+        bfcurve.keyframe_points.foreach_set("co", values);
+        bfcurve.keyframe_points.foreach_set("interpolation", interpolations);
+        bfcurve.update();
+
 
 
 def helper_convertNelTrackToBlenderRotationFCurves(baction, bbone, nelTrackData, nelBone, nelSkeleton):
@@ -1955,30 +794,14 @@ def helper_convertNelTrackToBlenderRotationFCurves(baction, bbone, nelTrackData,
         frame = 0;
         if nelTrackData['NelType'] == 'CTrackSampledQuat':
             #nelTrackData['_LoopMode']
-            startTime = nelTrackData['_BeginTime'];
-            endTime = nelTrackData['_EndTime'];
-            keyFrames = nelTrackData['_Keys'];
-
-            for idx, key in enumerate(keyFrames):
-                frame = 60 * (startTime + (idx*(endTime-startTime))/len(keyFrames));
-                
-                keyQuat = temp_helper_KeyQuatToBlenderFCurveQuat(nelBone, nelSkeleton, key[1], key[2], key[3], key[0]);
-                        
-                qx.keyframe_points.insert(frame, keyQuat.x);
-                qy.keyframe_points.insert(frame, keyQuat.y);
-                qz.keyframe_points.insert(frame, keyQuat.z);
-                qw.keyframe_points.insert(frame, keyQuat.w);
-        elif nelTrackData['NelType'] == 'CTrackKeyFramerTCBQuat':
-            startTime = nelTrackData['_RangeBegin'];
-            endTime = nelTrackData['_RangeEnd'];
-            keyFrames = nelTrackData['_MapKey'];
-            # !!TODO: not yet implemented... 
-            error("CTrackKeyFramerTCBQuat not yet implemented for FCurve conversion");
-            for idx, key in enumerate(sorted(keyFrames.keys())):
-                frame = 60 * (startTime + key);
-                nquat = keyFrames[key]['Value'];
-                print(str(key) + ": " + str(nquat));
-            print("");
+            frames = helper_getKeyFrames(nelTrackData['_KeyTimes']);
+            keyQuats = temp_helper_KeyQuatsToBlenderFCurveQuats(nelBone, nelSkeleton, nelTrackData['_Keys']);
+            helper_setFCurvesKeyframes((qw, qx, qy, qz), frames, keyQuats);
+        elif nelTrackData['NelType'] in ('CTrackKeyFramerLinearQuat', 'CTrackKeyFramerTCBQuat'):
+            # the keyframer tracks are baked with one key per frame as blender can not interpolate them the same way
+            keyTimes, keyQuats = NelTrackEvaluator(nelTrackData).bake(BLENDER_FRAMES_PER_SECOND);
+            keyQuats = temp_helper_KeyQuatsToBlenderFCurveQuats(nelBone, nelSkeleton, keyQuats);
+            helper_setFCurvesKeyframes((qw, qx, qy, qz), helper_getKeyFrames(keyTimes), keyQuats);
         else:
             error("Unsupported rotation track dict of type = " + nelTrackData['NelType']);
     #--------------------------------------------------------------------------------
@@ -2007,22 +830,11 @@ def helper_convertNelTrackToBlenderPositionFCurves(baction, bbone, nelTrackData)
         frame = 0;
         if nelTrackData['NelType'] == 'CTrackSampledVector':
             #nelTrackData['_LoopMode']
-            startTime = nelTrackData['_BeginTime'];
-            endTime = nelTrackData['_EndTime'];
-            keyFrames = nelTrackData['_Keys'];
-
-            for idx, key in enumerate(keyFrames):
-                frame = 60 * (startTime + (idx*(endTime-startTime))/len(keyFrames));
-                x = key[0];
-                y = key[1];
-                z = key[2];
-                if (idx == 0):
-                    print("  vec : %f %f %f" % (x, y, z));
-        
-                px.keyframe_points.insert(frame, x);
-                py.keyframe_points.insert(frame, y);
-                pz.keyframe_points.insert(frame, z);
-
+            frames = helper_getKeyFrames(nelTrackData['_KeyTimes']);
+            helper_setFCurvesKeyframes((px, py, pz), frames, nelTrackData['_Keys']);
+        elif nelTrackData['NelType'] == 'CTrackKeyFramerLinearVector':
+            keyTimes, keyPositions = NelTrackEvaluator(nelTrackData).bake(BLENDER_FRAMES_PER_SECOND);
+            helper_setFCurvesKeyframes((px, py, pz), helper_getKeyFrames(keyTimes), keyPositions);
 
         else:
             error("Unsupported position track dict of type = " + nelTrackData['NelType']);
@@ -2051,7 +863,28 @@ def helper_ConvertBoneTrackMap_To_FCurvesInAction(boneTrackMap, baction, nelSkel
 
 
 
-def convert_NelAnimation_to_BlenderAction(animdata, nelSkeleton, bobj):
+# we go through all tracks of the given _IdByName and try to find the associated bone (by name)
+# in the bobj; returns (bone, trackName, trackID) for each found track
+def helper_getBoneTracks(idByName, bobj):
+    boneTracks = [];
+    for trackName, trackID in idByName.items():
+        if trackName == 'NelType': continue; # skip our own typename we added to the map
+
+        if (trackName.find('.') != -1):
+            [boneName, type] = trackName.split('.', 2);
+            if boneName not in bobj.pose.bones:
+                print("Warning: bone with name '"+boneName+"' not found in given blender object " + str(bobj.name));
+            else:
+                boneTracks.append((bobj.pose.bones[boneName], trackName, trackID));
+        else:
+            #!!TODO: probably no valid bone or it is for the root?? (not yet sure...)
+            print("Warning: probably invalid bone: _IdByName is : '" + trackName + "' for trackID " + str(trackID) + " or it is the global model transform... !!TODO: check");
+    return boneTracks;
+
+
+# converts the animation into a new action of bobj and returns it; boneTracks can be given
+# when helper_getBoneTracks(animdata['_IdByName'], bobj) is already known
+def convert_NelAnimation_to_BlenderAction(animdata, nelSkeleton, bobj, boneTracks = None):
     # some very early experiments:
     if (animdata['NelType'] != "CAnimation"):
         error("convert_NelAnimation_to_BlenderAction got unsupported type: " + animdata['NelType']);
@@ -2076,45 +909,15 @@ def convert_NelAnimation_to_BlenderAction(animdata, nelSkeleton, bobj):
     baction = bpy.data.actions.new(actionName);
 
 
-    boneTrackMap = {};
-
-    # we now go through all tracks, try to find the associated bone (by name) in the bobj
-    # and store it in the 'boneTrackMap' to later convert it
-    for trackName, trackID in animdata['_IdByName'].items():
-        if trackName == 'NelType': continue; # skip our own typename we added to the map
-
-        if (trackName.find('.') != -1):
-            [boneName, type] = trackName.split('.', 2);
-            #print(str(i) + ":  " + boneName);
-            if boneName not in bobj.pose.bones:
-                print("Warning: bone with name '"+boneName+"' not found in given blender object " + str(bobj.name));
-            else:
-                bone = bobj.pose.bones[boneName];
-
-                if bone not in boneTrackMap:
-                    boneTrackMap[bone] = [];
-
-                track = animdata['_TrackVector'][trackID];
-
-                #print(track);
+    if boneTracks is None:
+        boneTracks = helper_getBoneTracks(animdata['_IdByName'], bobj);
 
-                #if not isinstance(track, dict):
-                #    print("WARNING: track with name '" + name + "' is not a dict");
-                #    # this might be a static position !!TODO: needs more research; currently ignored
-                #    continue;
-
-                boneTrackMap[bone].append((trackName, track));
-
-                #if track['NelCKeyType'] == 'CKeyQuat':
-                #    boneTrackMap[bone][0] = track;
-                #elif track['NelCKeyType'] == 'CKeyVector':
-                #    boneTrackMap[bone][1] = track;
-                #else:
-                #    error("Unsupported track type '"+track['NelCKeyType']+"' in animation conversion for bone '"+bone.name+"'");
-
-        else:
-            #!!TODO: probably no valid bone or it is for the root?? (not yet sure...)
-            print("Warning: probably invalid bone: _IdByName is : '" + trackName + "' for trackID " + str(trackID) + " or it is the global model transform... !!TODO: check");
+    # the tracks of each bone are collected in the 'boneTrackMap' to later convert them
+    boneTrackMap = {};
+    for bone, trackName, trackID in boneTracks:
+        if bone not in boneTrackMap:
+            boneTrackMap[bone] = [];
+        boneTrackMap[bone].append((trackName, animdata['_TrackVector'][trackID]));
 
     # now boneTrackMap contains all the data and next we convert it into actual fcurves
     # 
@@ -2124,9 +927,29 @@ def convert_NelAnimation_to_BlenderAction(animdata, nelSkeleton, bobj):
     if bobj.animation_data == None:
         bobj.animation_data_create();
     bobj.animation_data.action = baction; 
+    return baction;
 
     #--enddef convert_NelAnimation_to_BlenderAction(animdata)--
 
+
+# converts all animations of a CAnimationSet into actions of bobj; the bones of each shared
+# name -> track id table (see helper_shareAnimationHeaders) are looked up only once. Returns
+# the list of created actions.
+def convert_NelAnimationSet_to_BlenderActions(animSet, nelSkeleton, bobj):
+    if (animSet['NelType'] != "CAnimationSet"):
+        error("convert_NelAnimationSet_to_BlenderActions got unsupported type: " + animSet['NelType']);
+
+    bactions = [];
+    boneTracksByHeader = {};
+    for animdata in animSet['_Animation']:
+        if animdata is None:
+            continue;
+        header = id(animdata['_IdByName']);
+        if header not in boneTracksByHeader:
+            boneTracksByHeader[header] = helper_getBoneTracks(animdata['_IdByName'], bobj);
+        bactions.append(convert_NelAnimation_to_BlenderAction(animdata, nelSkeleton, bobj, boneTracksByHeader[header]));
+    return bactions;
+
     
 def connectBlenderSkeleton_To_BlenderMeshObject(bSkeletonObj, bMeshObj):
     armatureMod = bMeshObj.modifiers.new(type='ARMATURE',name='Armature');
@@ -2182,7 +1005,7 @@ def debug_ApplyDefaultPosRot_AsPose(nelSkeleton, bSkeletonObj):
         print(bbone.name + ": ");
 
         _LocalMatrix = helper_Nel_CBone_GetMatix(nelBone); # !!checked!!ok
-        _BoneBase_InvBindPos = nelBone['InvBindPos']['M']; # !!checked!!ok
+        _BoneBase_InvBindPos = helper_getBlenderMatrix(nelBone['InvBindPos']); # !!checked!!ok
         _LocalSkeletonMatrix = helper_Nel_get_LocalSkeletonMatrix_Recursive(nelBone, nelSkeleton); # !!checked!!ok
         _BoneSkinMatrix = _LocalSkeletonMatrix * _BoneBase_InvBindPos; # !!checked!!ok
 
@@ -2217,7 +1040,7 @@ def getParentInvBindPos(nelBone, nelSkeleton):
     if (nelBone['FatherId'] == -1):
         return mathutils.Matrix.Identity(4);
     else:
-        return nelSkeleton['_Bones'][nelBone['FatherId']]['InvBindPos']['M'];
+        return helper_getBlenderMatrix(nelSkeleton['_Bones'][nelBone['FatherId']]['InvBindPos']);
     
 
 def debug_CreateDefaultBoneTracks(nelSkeleton, bSkeletonObj):
@@ -2230,7 +1053,7 @@ def debug_CreateDefaultBoneTracks(nelSkeleton, bSkeletonObj):
         bbone = bSkeletonObj.pose.bones[nelBone['Name']];
 
         _LocalMatrix = helper_Nel_CBone_GetMatix(nelBone); # !!checked!!ok
-        _BoneBase_InvBindPos = nelBone['InvBindPos']['M']; # !!checked!!ok
+        _BoneBase_InvBindPos = helper_getBlenderMatrix(nelBone['InvBindPos']); # !!checked!!ok
         _LocalSkeletonMatrix = helper_Nel_get_LocalSkeletonMatrix_Recursive(nelBone, nelSkeleton); # !!checked!!ok
         _BoneSkinMatrix = _LocalSkeletonMatrix * _BoneBase_InvBindPos; # !!checked!!ok
 
@@ -2279,46 +1102,204 @@ def debug_CreateDefaultBoneTracks(nelSkeleton, bSkeletonObj):
 
 
 # !!TODO: a very very early test
-def convert_NelInstanceGroup_to_Blender(nelIG, rootPath):
-    print("WARNING: convert_NelInstanceGroup_to_Blender is just an early test");
-    
-    globalCenter = mathutils.Vector((0,0,0));
-    allBObjs = [];
+# In-session cache of the shapes converted for instance groups. It maps a shape file
+# to the name of its blender mesh and the names of the vertex groups of the object
+# it was created for (vertex groups belong to the object, not to the mesh). Every
+# further instance of the shape is a new object that links the same mesh. Only the
+# maxShapes most recently used shapes are kept; the meshes themselves are never deleted.
+class NelShapeCache:
+    def __init__(self, maxShapes = 256):
+        self.maxShapes = maxShapes;
+        self.shapes = collections.OrderedDict(); # shape file name (lower case) -> (mesh name, vertex group names)
+
+    # returns (bmesh, vertexGroupNames) or None
+    def get(self, fileName):
+        key = fileName.lower();
+        if key not in self.shapes:
+            return None;
+        meshName, vertexGroupNames = self.shapes[key];
+        if meshName not in bpy.data.meshes: # the mesh was deleted since it was converted
+            del self.shapes[key];
+            return None;
+        self.shapes.move_to_end(key);
+        return bpy.data.meshes[meshName], vertexGroupNames;
+
+    def add(self, fileName, bobj):
+        key = fileName.lower();
+        self.shapes[key] = (bobj.data.name, [vg.name for vg in bobj.vertex_groups]);
+        self.shapes.move_to_end(key);
+        while len(self.shapes) > self.maxShapes:
+            self.shapes.popitem(last = False);
+
+    def clear(self):
+        self.shapes.clear();
+
+# used by convert_NelInstanceGroup_to_Blender; lives as long as the add-on is loaded so
+# that shapes are shared across several instance group imports
+gShapeCache = NelShapeCache();
+
+
+# returns a new blender object of the given shape file; the shape is only loaded and
+# converted when it is not yet in the shapeCache (see NelShapeCache)
+def helper_instanceNelShape(fileName, importRootPath, shapeCache):
+    cached = shapeCache.get(fileName) if shapeCache is not None else None;
+    if cached is None:
+        nelMesh = load_NEL_file(fileName, gParseCache);
+        bobj = convert_NelMesh_to_BlenderObject(nelMesh, importRootPath);
+        if shapeCache is not None:
+            shapeCache.add(fileName, bobj);
+        return bobj;
+
+    bmesh, vertexGroupNames = cached;
+    bobj = bpy.data.objects.new(os.path.basename(fileName), bmesh);
+    for vertexGroupName in vertexGroupNames:
+        bobj.vertex_groups.new(vertexGroupName);
+    bpy.context.scene.objects.link(bobj);
+    return bobj;
 
-    for nelInstance in nelIG['_InstancesInfos']:
-        fname = rootPath + nelInstance['Name'] + ".shape";
-        if os.path.exists(fname):
-            print('Trying to load ' + fname);
-            nelMesh = load_NEL_file(fname);
-            # !!TODO: find an easy way of instancing meshes (probably need to split the convert_NelMesh_to_BlenderObject method
-            try:
-                bMeshObj = convert_NelMesh_to_BlenderObject(nelMesh, rootPath);
-            except:
-                print("Excpetion thrown while loading file: ");
-                continue;
 
-            allBObjs.append(bMeshObj);
+# returns the blender matrix_basis of a CInstanceGroup::CInstance moved by -center
+def helper_getInstanceMatrix(nelInstance, center):
+    position = mathutils.Vector(nelInstance['Pos']);
+    scale = mathutils.Vector(nelInstance['Scale']);
+    rotation = mathutils.Quaternion((-nelInstance['Rot'][3], nelInstance['Rot'][0], nelInstance['Rot'][1], nelInstance['Rot'][2]));
 
-            position = mathutils.Vector(nelInstance['Pos']);
-            scale = mathutils.Vector(nelInstance['Scale']);
-            rotation = mathutils.Quaternion((-nelInstance['Rot'][3], nelInstance['Rot'][0], nelInstance['Rot'][1], nelInstance['Rot'][2]));
+    scaleMat = mathutils.Matrix.Identity(4);
+    scaleMat[0][0] = scale[0];
+    scaleMat[1][1] = scale[1];
+    scaleMat[2][2] = scale[2];
 
-            scaleMat = mathutils.Matrix.Identity(4);
-            scaleMat[0][0] = scale[0];
-            scaleMat[1][1] = scale[1];
-            scaleMat[2][2] = scale[2];
+    return rotation.to_matrix().to_4x4() * scaleMat * mathutils.Matrix.Translation(position - center);
 
-            bMeshObj.matrix_basis = rotation.to_matrix().to_4x4() * scaleMat * mathutils.Matrix.Translation(position);
 
-            globalCenter = globalCenter + position;
+# Imports the instances of a parsed instance group one at a time: each shape is loaded,
+# converted and released before the next instance is imported (see helper_instanceNelShape
+# for the sharing of meshes). Yields (index, numInstances, bobj) after each instance; bobj is
+# None when the instance failed. A dict with the keys 'Index', 'Name', 'FileName' and 'Error'
+# is appended to errors (when given) for each failed instance. All objects are moved by the
+# average position of the imported instances so that the group is centered around the origin:
+# the center is estimated from the instances whose shape file exists and, when some of them
+# fail to import, the created objects are placed again around the corrected center after
+# the last instance (i.e. only when the iteration is run to its end).
+def iter_convert_NelInstanceGroup_to_Blender(nelIG, rootPath, shapeCache = None, errors = None):
+    if shapeCache is None:
+        shapeCache = gShapeCache;
 
-    globalCenter = globalCenter / len(allBObjs);
+    instances = nelIG['_InstancesInfos'];
+    fileNames = [rootPath + nelInstance['Name'] + ".shape" for nelInstance in instances];
 
-    # test: re-center all loaded objects around average
-    for bMeshObj in allBObjs:
-        bMeshObj.matrix_basis = bMeshObj.matrix_basis * mathutils.Matrix.Translation(-globalCenter);
+    # the center is known before the first object is created so every object is placed only once
+    globalCenter = mathutils.Vector((0,0,0));
+    numFound = 0;
+    for nelInstance, fname in zip(instances, fileNames):
+        if os.path.exists(fname):
+            globalCenter = globalCenter + mathutils.Vector(nelInstance['Pos']);
+            numFound += 1;
+    if numFound > 0:
+        globalCenter = globalCenter / numFound;
+
+    placed = []; # (nelInstance, bobj) of the imported instances
+    for idx, nelInstance in enumerate(instances):
+        fname = fileNames[idx];
+        bMeshObj = None;
+        try:
+            if not os.path.exists(fname):
+                error("shape file not found");
+            bMeshObj = helper_instanceNelShape(fname, rootPath, shapeCache);
+            bMeshObj.matrix_basis = helper_getInstanceMatrix(nelInstance, globalCenter);
+            placed.append((nelInstance, bMeshObj));
+        except Exception as e:
+            bMeshObj = None;
+            if errors is not None:
+                errors.append({'Index': idx, 'Name': nelInstance['Name'], 'FileName': fname, 'Error': str(e)});
+        yield idx, len(instances), bMeshObj;
+
+    # instances with an existing shape file failed: the estimated center is off
+    if 0 < len(placed) < numFound:
+        globalCenter = mathutils.Vector((0,0,0));
+        for nelInstance, bMeshObj in placed:
+            globalCenter = globalCenter + mathutils.Vector(nelInstance['Pos']);
+        globalCenter = globalCenter / len(placed);
+        for nelInstance, bMeshObj in placed:
+            bMeshObj.matrix_basis = helper_getInstanceMatrix(nelInstance, globalCenter);
+
+
+# imports all instances of the instance group with a progress indicator; returns the list of
+# created objects and the list of errors (see iter_convert_NelInstanceGroup_to_Blender)
+def convert_NelInstanceGroup_to_Blender(nelIG, rootPath, shapeCache = None):
+    print("WARNING: convert_NelInstanceGroup_to_Blender is just an early test");
 
-    print(globalCenter);
+    allBObjs = [];
+    errors = [];
+    wm = bpy.context.window_manager;
+    wm.progress_begin(0, max(1, len(nelIG['_InstancesInfos'])));
+    try:
+        for idx, numInstances, bMeshObj in iter_convert_NelInstanceGroup_to_Blender(nelIG, rootPath, shapeCache, errors):
+            if bMeshObj is not None:
+                allBObjs.append(bMeshObj);
+            wm.progress_update(idx + 1);
+    finally:
+        wm.progress_end();
+
+    for e in errors:
+        print("WARNING: could not import instance %d '%s': %s" % (e['Index'], e['Name'], e['Error']));
+    print("Imported %d of %d instances" % (len(allBObjs), len(nelIG['_InstancesInfos'])));
+    return allBObjs, errors;
+
+
+# Imports instances selected from a nel3d_zone.NelInstanceIndex (e.g. the result of
+# index.queryRadius(...)) given as (igFileName, globalPos, nelInstance). The shapes are
+# loaded from rootPath and shared through the shapeCache like in
+# convert_NelInstanceGroup_to_Blender. The objects are placed at their world position
+# relative to origin (default: the average world position of the imported instances). Returns the
+# created objects and the errors (like convert_NelInstanceGroup_to_Blender with an
+# additional 'IGFileName').
+def convert_NelZone_to_Blender(instances, rootPath, origin = None, shapeCache = None):
+    if shapeCache is None:
+        shapeCache = gShapeCache;
+    centered = origin is None;
+    if origin is None:
+        origin = mathutils.Vector((0,0,0));
+        for igFileName, globalPos, nelInstance in instances:
+            origin = origin + mathutils.Vector(globalPos) + mathutils.Vector(nelInstance['Pos']);
+        if len(instances) > 0:
+            origin = origin / len(instances);
+    origin = mathutils.Vector(origin);
+
+    allBObjs = [];
+    placed = []; # (globalPos, nelInstance, bobj) of the imported instances
+    errors = [];
+    wm = bpy.context.window_manager;
+    wm.progress_begin(0, max(1, len(instances)));
+    try:
+        for idx, (igFileName, globalPos, nelInstance) in enumerate(instances):
+            fname = rootPath + nelInstance['Name'] + ".shape";
+            try:
+                if not os.path.exists(fname):
+                    error("shape file not found");
+                bMeshObj = helper_instanceNelShape(fname, rootPath, shapeCache);
+                bMeshObj.matrix_basis = helper_getInstanceMatrix(nelInstance, origin - mathutils.Vector(globalPos));
+                allBObjs.append(bMeshObj);
+                placed.append((globalPos, nelInstance, bMeshObj));
+            except Exception as e:
+                errors.append({'Index': idx, 'IGFileName': igFileName, 'Name': nelInstance['Name'], 'FileName': fname, 'Error': str(e)});
+            wm.progress_update(idx + 1);
+    finally:
+        wm.progress_end();
+
+    # the default origin included the failed instances: center on the imported ones
+    if centered and 0 < len(placed) < len(instances):
+        origin = mathutils.Vector((0,0,0));
+        for globalPos, nelInstance, bMeshObj in placed:
+            origin = origin + mathutils.Vector(globalPos) + mathutils.Vector(nelInstance['Pos']);
+        origin = origin / len(placed);
+        for globalPos, nelInstance, bMeshObj in placed:
+            bMeshObj.matrix_basis = helper_getInstanceMatrix(nelInstance, origin - mathutils.Vector(globalPos));
+
+    for e in errors:
+        print("WARNING: could not import instance '%s' of %s: %s" % (e['Name'], e['IGFileName'], e['Error']));
+    print("Imported %d of %d instances" % (len(allBObjs), len(instances)));
+    return allBObjs, errors;
 
 
 from bpy.props import StringProperty, BoolProperty
@@ -2336,7 +1317,7 @@ class IMPORT_OT_NeL(bpy.types.Operator):
         fileRootPath = os.path.dirname(self.filepath);
         print(gFileRootPath);
         print();
-        nelMesh = load_NEL_file(self.filepath);
+        nelMesh = load_NEL_file(self.filepath, gParseCache);
         bMeshObj = convert_NelMesh_to_BlenderObject(nelMesh, fileRootPath);
         return {'FINISHED'}
 
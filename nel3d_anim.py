@@ -0,0 +1,458 @@
+#-------------------------------------------------------------------------------
+# NeL 3D Blender Importer - animation track processing
+#
+#-------------------------------------------------------------------------------
+#
+# ***** begin GPL LICENSE BLOCK *****
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ***** END GPL LICENCE BLOCK *****
+#
+#-------------------------------------------------------------------------------
+#
+# Works on the tracks of a parsed CAnimation (see parse_CAnimation in
+# nel3d_parse.py). The densely sampled tracks of Ryzom .anim files can
+# be reduced before they are converted to blender F-curves:
+#
+#   animation, report = reduce_NelAnimation(animation);
+#
+# removes all keys of the CTrackSampledQuat/CTrackSampledVector tracks
+# that the linear interpolation of the remaining keys reproduces within
+# the given tolerances. This is the interpolation of the LINEAR F-curves
+# created from the keys: component wise also for the quaternions, which
+# blender normalizes before use. The NelTrackEvaluator samples
+# any track of an animation (sampled, linear and TCB keyframer or
+# default values) at many times at once:
+#
+#   evaluator = NelTrackEvaluator(animation['_TrackVector'][trackID]);
+#   values = evaluator.eval(times);
+#
+# which is used for the conversion of keyframer tracks to F-curves and
+# for evaluating poses without blender. This file does not need blender.
+#
+#  Notes:
+#   - like in nel3d_parse.py quaternions are (w, x, y, z); the raw
+#     (x, y, z, w) values of keyframer and default tracks are converted
+#
+#-------------------------------------------------------------------------------
+
+import math
+import bisect
+
+from nel3d_parse import *
+
+
+# default tolerances of reduce_NelAnimation: the largest rotation (in radians) and the
+# largest distance between a removed key and the interpolation of the kept keys
+NEL_REDUCE_ANGLE_TOLERANCE = math.radians(0.5);
+NEL_REDUCE_POSITION_TOLERANCE = 0.001;
+
+# above this cosine of the angle between two quaternions slerp is replaced by a normalized lerp
+NEL_SLERP_LINEAR_THRESHOLD = 0.9995;
+
+
+#-------------------------------------------------------------------------------
+# quaternion helpers; the quat_* functions work on single (w, x, y, z) tuples and
+# the array_* functions on numpy arrays of (w, x, y, z) rows
+
+def quat_mul(q1, q2):
+    w1, x1, y1, z1 = q1;
+    w2, x2, y2, z2 = q2;
+    return (w1*w2 - x1*x2 - y1*y2 - z1*z2,
+            w1*x2 + x1*w2 + y1*z2 - z1*y2,
+            w1*y2 - x1*z2 + y1*w2 + z1*x2,
+            w1*z2 + x1*y2 - y1*x2 + z1*w2);
+
+def quat_conj(q):
+    return (q[0], -q[1], -q[2], -q[3]);
+
+def quat_normalized(q):
+    length = math.sqrt(sum(c * c for c in q));
+    if length == 0.0:
+        return (1.0, 0.0, 0.0, 0.0);
+    return tuple(c / length for c in q);
+
+# returns the logarithm of a unit quaternion as the vector (x, y, z) of the pure quaternion
+def quat_log(q):
+    length = math.sqrt(q[1]*q[1] + q[2]*q[2] + q[3]*q[3]);
+    if length < 1e-9:
+        return (0.0, 0.0, 0.0);
+    angle = math.atan2(length, q[0]) / length;
+    return (q[1] * angle, q[2] * angle, q[3] * angle);
+
+# the inverse of quat_log
+def quat_exp(v):
+    angle = math.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2]);
+    if angle < 1e-9:
+        return (1.0, 0.0, 0.0, 0.0);
+    s = math.sin(angle) / angle;
+    return (math.cos(angle), v[0] * s, v[1] * s, v[2] * s);
+
+# spherical interpolation (along the shortest path) from q0 (s = 0) to q1 (s = 1)
+def quat_slerp(q0, q1, s):
+    dot = sum(a * b for a, b in zip(q0, q1));
+    if dot < 0.0:
+        q1 = [-b for b in q1];
+        dot = -dot;
+    if dot > NEL_SLERP_LINEAR_THRESHOLD:
+        return quat_normalized([a + s * (b - a) for a, b in zip(q0, q1)]);
+    omega = math.acos(min(dot, 1.0));
+    w0 = math.sin((1.0 - s) * omega) / math.sin(omega);
+    w1 = math.sin(s * omega) / math.sin(omega);
+    return quat_normalized([w0 * a + w1 * b for a, b in zip(q0, q1)]);
+
+# quat_slerp of numpy rows: q0 and q1 are (n, 4) (or a single (4,) quaternion) and s has n values
+def array_slerp(q0, q1, s):
+    q0 = numpy.asarray(q0, numpy.float64);
+    q1 = numpy.asarray(q1, numpy.float64);
+    s = numpy.asarray(s, numpy.float64)[:, numpy.newaxis];
+    dot = (q0 * q1).sum(axis=-1)[..., numpy.newaxis];
+    q1 = numpy.where(dot < 0.0, -q1, q1);
+    dot = numpy.abs(dot);
+    linear = (dot > NEL_SLERP_LINEAR_THRESHOLD);
+    omega = numpy.arccos(numpy.minimum(dot, 1.0));
+    sinOmega = numpy.where(linear, 1.0, numpy.sin(omega));
+    w0 = numpy.where(linear, 1.0 - s, numpy.sin((1.0 - s) * omega) / sinOmega);
+    w1 = numpy.where(linear, s, numpy.sin(s * omega) / sinOmega);
+    quats = w0 * q0 + w1 * q1;
+    return quats / numpy.sqrt((quats * quats).sum(axis=1))[:, numpy.newaxis];
+
+
+# returns the error of each key between the keys first and last (both excluded) against the
+# linear interpolation of these two keys at the key times: the angle (in radians) to the
+# normalized component wise interpolation of the quaternions (like LINEAR F-curves, see the
+# notes at the top of this file) when isQuat or else the distance
+def helper_getInterpolationErrors(times, values, first, last, isQuat):
+    t0 = times[first];
+    t1 = times[last];
+    if numpy is not None:
+        s = (numpy.asarray(times[first + 1:last], numpy.float64) - t0) / (t1 - t0) if t1 != t0 else numpy.zeros(last - first - 1);
+        keys = numpy.asarray(values[first + 1:last], numpy.float64);
+        v0 = numpy.asarray(values[first], numpy.float64);
+        v1 = numpy.asarray(values[last], numpy.float64);
+        interp = v0 + s[:, numpy.newaxis] * (v1 - v0);
+        if not isQuat:
+            return numpy.sqrt(((interp - keys) ** 2).sum(axis=1));
+
+        lengths = numpy.sqrt((interp * interp).sum(axis=1));
+        dots = numpy.abs((interp * keys).sum(axis=1)) / numpy.where(lengths > 0.0, lengths, 1.0);
+        return numpy.where(lengths > 0.0, 2.0 * numpy.arccos(numpy.minimum(dots, 1.0)), math.pi);
+
+    v0 = values[first];
+    v1 = values[last];
+    errors = [];
+    if not isQuat:
+        for i in range(first + 1, last):
+            s = (times[i] - t0) / (t1 - t0) if t1 != t0 else 0.0;
+            errors.append(math.sqrt(sum((a + s * (b - a) - c) ** 2 for a, b, c in zip(v0, v1, values[i]))));
+        return errors;
+
+    for i in range(first + 1, last):
+        s = (times[i] - t0) / (t1 - t0) if t1 != t0 else 0.0;
+        interp = [a + s * (b - a) for a, b in zip(v0, v1)];
+        length = math.sqrt(sum(c * c for c in interp));
+        if length == 0.0:
+            errors.append(math.pi);
+        else:
+            errors.append(2.0 * math.acos(min(abs(sum(a * b for a, b in zip(interp, values[i]))) / length, 1.0)));
+    return errors;
+
+
+# returns the (sorted) indices of the keys to keep so that the interpolation between the kept
+# keys reproduces every removed key within tolerance (see helper_getInterpolationErrors). The
+# segment between two kept keys is split at its worst key until all keys are within tolerance.
+def reduce_SampledKeys(times, values, isQuat, tolerance):
+    numKeys = len(values);
+    if numKeys <= 2:
+        return list(range(numKeys));
+
+    keep = set((0, numKeys - 1));
+    segments = [(0, numKeys - 1)];
+    while segments:
+        first, last = segments.pop();
+        if last - first < 2:
+            continue;
+        errors = helper_getInterpolationErrors(times, values, first, last, isQuat);
+        if numpy is not None:
+            worst = int(numpy.argmax(errors));
+        else:
+            worst = max(range(len(errors)), key=errors.__getitem__);
+        if errors[worst] > tolerance:
+            split = first + 1 + worst;
+            keep.add(split);
+            segments.append((first, split));
+            segments.append((split, last));
+    return sorted(keep);
+
+
+# returns a copy of the given CTrackSampledQuat/CTrackSampledVector with only the keys kept by
+# reduce_SampledKeys in _Keys and _KeyTimes; Note: the _TimeBlocks are left as parsed and do
+# not match the reduced keys
+def reduce_CTrackSampled(nelTrack, angleTolerance = NEL_REDUCE_ANGLE_TOLERANCE, positionTolerance = NEL_REDUCE_POSITION_TOLERANCE):
+    if nelTrack['NelType'] == 'CTrackSampledQuat':
+        keptIdxs = reduce_SampledKeys(nelTrack['_KeyTimes'], nelTrack['_Keys'], True, angleTolerance);
+    elif nelTrack['NelType'] == 'CTrackSampledVector':
+        keptIdxs = reduce_SampledKeys(nelTrack['_KeyTimes'], nelTrack['_Keys'], False, positionTolerance);
+    else:
+        error("reduce_CTrackSampled got unsupported track type: " + nelTrack['NelType']);
+
+    reduced = dict(nelTrack);
+    reduced['_Keys'] = array_gather(nelTrack['_Keys'], keptIdxs);
+    reduced['_KeyTimes'] = array_gather(nelTrack['_KeyTimes'], keptIdxs);
+    return reduced;
+
+
+# The optional reduction stage between loading a CAnimation and converting it: returns a copy
+# of the animation where all sampled tracks are reduced with reduce_CTrackSampled and a report
+# that maps the name (or the id when the animation has no _IdByName) of each reduced track to
+# {'NumKeys': number of parsed keys, 'NumRemoved': number of removed keys}
+def reduce_NelAnimation(animdata, angleTolerance = NEL_REDUCE_ANGLE_TOLERANCE, positionTolerance = NEL_REDUCE_POSITION_TOLERANCE):
+    if (animdata['NelType'] != "CAnimation"):
+        error("reduce_NelAnimation got unsupported type: " + animdata['NelType']);
+
+    trackNames = {};
+    for trackName, trackID in animdata['_IdByName'].items():
+        if trackName == 'NelType': continue; # skip our own typename added to the map
+        trackNames[trackID] = trackName;
+
+    reduced = dict(animdata);
+    reduced['_TrackVector'] = list(animdata['_TrackVector']);
+    report = {};
+    for trackID, track in enumerate(animdata['_TrackVector']):
+        if isinstance(track, dict) and track['NelType'] in ('CTrackSampledQuat', 'CTrackSampledVector'):
+            reducedTrack = reduce_CTrackSampled(track, angleTolerance, positionTolerance);
+            reduced['_TrackVector'][trackID] = reducedTrack;
+            report[trackNames.get(trackID, trackID)] = {'NumKeys': len(track['_Keys']), 'NumRemoved': len(track['_Keys']) - len(reducedTrack['_Keys'])};
+    return reduced, report;
+
+
+#-------------------------------------------------------------------------------
+# track evaluation
+
+# the ease curve of NeL TCB keys for the relative time s in a segment; e0 is the EaseFrom of
+# the first and e1 the EaseTo of the second key of the segment
+def helper_ease(s, e0, e1):
+    total = e0 + e1;
+    if total < 0.0001:
+        return s;
+    if total > 1.0:
+        e0 /= total;
+        e1 /= total;
+    k = 1.0 / (2.0 - e0 - e1);
+    if s < e0:
+        return k / e0 * s * s;
+    if s < 1.0 - e1 or e1 == 0.0:
+        return k * (2.0 * s - e0);
+    s = 1.0 - s;
+    return 1.0 - k / e1 * s * s;
+
+# helper_ease of numpy arrays
+def array_ease(s, e0, e1):
+    total = e0 + e1;
+    scale = numpy.where(total > 1.0, total, 1.0);
+    e0 = e0 / scale;
+    e1 = e1 / scale;
+    k = 1.0 / (2.0 - e0 - e1);
+    eased = numpy.where(s < e0, k / numpy.where(e0 > 0.0, e0, 1.0) * s * s,
+            numpy.where(s < 1.0 - e1, k * (2.0 * s - e0), 1.0 - k / numpy.where(e1 > 0.0, e1, 1.0) * (1.0 - s) * (1.0 - s)));
+    return numpy.where(total < 0.0001, s, eased);
+
+
+# Evaluates a track of a CAnimation at any times: CTrackSampledQuat/CTrackSampledVector
+# (slerp/linear between the samples), CTrackKeyFramerLinearQuat/CTrackKeyFramerLinearVector,
+# CTrackKeyFramerTCBQuat (squad with Kochanek-Bartels tangents and the ease of the keys) and
+# the constant values of CTrackDefaultQuat/CTrackDefaultVector (plain tuples). The keys are
+# sorted and the TCB tangents computed once on construction; eval(...) then interpolates all
+# given times at once. The range is [_RangeBegin, _RangeEnd] when _RangeLock is set (else the
+# times of the first and last key). In loop mode, like in NeL, the loop starts at the first key
+# and lasts as long as the range: times outside [loopStart, loopEnd] are wrapped into it and
+# the last key is interpolated towards the first one over the rest of the loop.
+class NelTrackEvaluator:
+    def __init__(self, nelTrack):
+        self.isTCB = False;
+        self.loop = False;
+        if isinstance(nelTrack, tuple):
+            self.isQuat = (len(nelTrack) == 4);
+            times = [0.0];
+            values = [nelTrack];
+            self.begin = self.end = 0.0;
+        elif nelTrack['NelType'] in ('CTrackSampledQuat', 'CTrackSampledVector'):
+            self.isQuat = (nelTrack['NelType'] == 'CTrackSampledQuat');
+            times = nelTrack['_KeyTimes'];
+            values = nelTrack['_Keys'];
+            self.begin = nelTrack['_BeginTime'];
+            self.end = nelTrack['_EndTime'];
+            self.loop = nelTrack['_LoopMode'];
+        elif nelTrack['NelType'] in ('CTrackKeyFramerLinearQuat', 'CTrackKeyFramerLinearVector', 'CTrackKeyFramerTCBQuat'):
+            self.isQuat = nelTrack['NelCKeyType'] in ('CKeyQuat', 'CKeyTCBQuat');
+            self.isTCB = (nelTrack['NelCKeyType'] == 'CKeyTCBQuat');
+            times = sorted(nelTrack['_MapKey'].keys());
+            keys = [nelTrack['_MapKey'][t] for t in times];
+            values = [key['Value'] for key in keys] if self.isTCB else keys;
+            if len(times) == 0:
+                error("NelTrackEvaluator: track without keys");
+            if nelTrack['_RangeLock']:
+                self.begin = nelTrack['_RangeBegin'];
+                self.end = nelTrack['_RangeEnd'];
+            else:
+                self.begin = times[0];
+                self.end = times[-1];
+            self.loop = nelTrack['_LoopMode'];
+        else:
+            error("NelTrackEvaluator got unsupported track type: " + nelTrack['NelType']);
+
+        numKeys = len(times);
+        if not isinstance(nelTrack, dict) or nelTrack['NelType'] not in ('CTrackSampledQuat', 'CTrackSampledVector'):
+            times = [float(t) for t in times];
+            if self.isQuat:
+                # (x, y, z, w) to (w, x, y, z) with the sign of each key closest to the one before
+                values = [quat_normalized((q[3], q[0], q[1], q[2])) for q in values];
+                for i in range(1, numKeys):
+                    if sum(a * b for a, b in zip(values[i - 1], values[i])) < 0.0:
+                        values[i] = tuple(-c for c in values[i]);
+            values = [tuple(v) for v in values];
+        self.loop = self.loop and (self.end > self.begin);
+        self.loopStart = times[0];
+        self.loopEnd = times[0] + (self.end - self.begin);
+
+        # key i is interpolated towards key nextIdxs[i] over durations[i]; the segment of the last
+        # key only exists in loop mode when its key is before the end of the loop
+        loopDuration = self.loopEnd - times[-1] if self.loop else 0.0;
+        self.hasLoopSegment = (loopDuration > 0.0 and numKeys > 1);
+        durations = [times[i + 1] - times[i] for i in range(numKeys - 1)] + [loopDuration if self.hasLoopSegment else 0.0];
+        nextIdxs = [(i + 1) % numKeys for i in range(numKeys)];
+
+        if self.isTCB:
+            self.helper_computeTCBQuats(times, values, keys, loopDuration);
+            easeFrom = [key['EaseFrom'] for key in keys];
+            easeTo = [key['EaseTo'] for key in keys];
+
+        if numpy is not None:
+            self.times = numpy.asarray(times, numpy.float64);
+            self.values = numpy.asarray(values, numpy.float64);
+            self.durations = numpy.asarray(durations, numpy.float64);
+            self.nextIdxs = numpy.asarray(nextIdxs, numpy.intp);
+            if self.isTCB:
+                self.inQuats = numpy.asarray(self.inQuats, numpy.float64);
+                self.outQuats = numpy.asarray(self.outQuats, numpy.float64);
+                self.easeFrom = numpy.asarray(easeFrom, numpy.float64);
+                self.easeTo = numpy.asarray(easeTo, numpy.float64);
+        else:
+            self.times = list(times);
+            self.values = [tuple(v) for v in values];
+            self.durations = durations;
+            self.nextIdxs = nextIdxs;
+            if self.isTCB:
+                self.easeFrom = easeFrom;
+                self.easeTo = easeTo;
+
+    # computes the inner quadrangle points of each key for squad from its Kochanek-Bartels
+    # tangents (like for the vectors of a TCB track but on the logarithm of the rotations
+    # between neighbouring keys): outQuats[i] is used after key i and inQuats[i] before key i
+    def helper_computeTCBQuats(self, times, values, keys, loopDuration):
+        numKeys = len(times);
+        self.inQuats = [];
+        self.outQuats = [];
+        for i in range(numKeys):
+            q = values[i];
+            hasPrev = (i > 0 or self.hasLoopSegment);
+            hasNext = (i < numKeys - 1 or self.hasLoopSegment);
+            qm = qp = None;
+            if hasPrev:
+                prevDt = times[i] - times[i - 1] if i > 0 else loopDuration;
+                qprev = values[i - 1];
+                if sum(a * b for a, b in zip(qprev, q)) < 0.0:
+                    qprev = tuple(-c for c in qprev);
+                qm = quat_log(quat_mul(quat_conj(qprev), q));
+            if hasNext:
+                nextDt = times[i + 1] - times[i] if i < numKeys - 1 else loopDuration;
+                qnext = values[(i + 1) % numKeys];
+                if sum(a * b for a, b in zip(q, qnext)) < 0.0:
+                    qnext = tuple(-c for c in qnext);
+                qp = quat_log(quat_mul(quat_conj(q), qnext));
+            if qm is None and qp is None:
+                self.inQuats.append(q);
+                self.outQuats.append(q);
+                continue;
+            if qm is None: qm = qp;
+            if qp is None: qp = qm;
+
+            key = keys[i];
+            fp = fn = 1.0;
+            if hasPrev and hasNext:
+                # speed correction for keys with different time distances to their neighbours
+                dt = 0.5 * (prevDt + nextDt);
+                fp = prevDt / dt;
+                fn = nextDt / dt;
+                c = abs(key['Continuity']);
+                fp = fp + c - c * fp;
+                fn = fn + c - c * fn;
+            tm = 0.5 * (1.0 - key['Tension']);
+            cm = 1.0 - key['Continuity'];
+            cp = 2.0 - cm;
+            bm = 1.0 - key['Bias'];
+            bp = 2.0 - bm;
+            ksm = tm * cm * bp * fp;
+            ksp = tm * cp * bm * fp;
+            kdm = tm * cp * bp * fn;
+            kdp = tm * cm * bm * fn;
+
+            tanIn = [ksm * a + ksp * b for a, b in zip(qm, qp)];
+            tanOut = [kdm * a + kdp * b for a, b in zip(qm, qp)];
+            self.inQuats.append(quat_mul(q, quat_exp([0.5 * (a - t) for a, t in zip(qm, tanIn)])));
+            self.outQuats.append(quat_mul(q, quat_exp([0.5 * (t - b) for t, b in zip(tanOut, qp)])));
+
+    # returns the values of the track at the given times (in seconds) as (len(times), 4) rows of
+    # (w, x, y, z) for rotations or (len(times), 3) rows for vectors; a numpy array or a list of tuples
+    def eval(self, times):
+        if numpy is not None:
+            t = numpy.array(times, numpy.float64, ndmin=1);
+            if self.loop:
+                outside = (t < self.loopStart) | (t > self.loopEnd);
+                t[outside] = self.loopStart + numpy.mod(t[outside] - self.loopStart, self.loopEnd - self.loopStart);
+            i = numpy.clip(numpy.searchsorted(self.times, t, 'right') - 1, 0, len(self.times) - 1);
+            j = self.nextIdxs[i];
+            durations = self.durations[i];
+            s = numpy.clip((t - self.times[i]) / numpy.where(durations > 0.0, durations, 1.0), 0.0, 1.0);
+            s[durations <= 0.0] = 0.0;
+            if self.isTCB:
+                s = array_ease(s, self.easeFrom[i], self.easeTo[j]);
+                return array_slerp(array_slerp(self.values[i], self.values[j], s), array_slerp(self.outQuats[i], self.inQuats[j], s), 2.0 * s * (1.0 - s));
+            if self.isQuat:
+                return array_slerp(self.values[i], self.values[j], s);
+            return self.values[i] + s[:, numpy.newaxis] * (self.values[j] - self.values[i]);
+
+        result = [];
+        for t in times:
+            if self.loop and (t < self.loopStart or t > self.loopEnd):
+                t = self.loopStart + (t - self.loopStart) % (self.loopEnd - self.loopStart);
+            i = min(max(bisect.bisect_right(self.times, t) - 1, 0), len(self.times) - 1);
+            j = self.nextIdxs[i];
+            s = min(max((t - self.times[i]) / self.durations[i], 0.0), 1.0) if self.durations[i] > 0.0 else 0.0;
+            if self.isTCB:
+                s = helper_ease(s, self.easeFrom[i], self.easeTo[j]);
+                result.append(quat_slerp(quat_slerp(self.values[i], self.values[j], s), quat_slerp(self.outQuats[i], self.inQuats[j], s), 2.0 * s * (1.0 - s)));
+            elif self.isQuat:
+                result.append(quat_slerp(self.values[i], self.values[j], s));
+            else:
+                result.append(tuple(a + s * (b - a) for a, b in zip(self.values[i], self.values[j])));
+        return result;
+
+    # samples the whole range of the track with frameRate samples per second (the last sample is
+    # at the end of the range); returns the sample times and their values (see eval)
+    def bake(self, frameRate):
+        numSamples = int(math.ceil((self.end - self.begin) * frameRate - 1e-6)) + 1 if self.end > self.begin else 1;
+        times = [min(self.begin + k / float(frameRate), self.end) for k in range(numSamples)];
+        return times, self.eval(times);
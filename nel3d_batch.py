@@ -0,0 +1,225 @@
+#-------------------------------------------------------------------------------
+# NeL 3D Blender Importer - batch parsing
+#
+#-------------------------------------------------------------------------------
+#
+# ***** begin GPL LICENSE BLOCK *****
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ***** END GPL LICENCE BLOCK *****
+#
+#-------------------------------------------------------------------------------
+#
+# Parses many NeL 3D files (*.shape, *.skel, *.anim, *.ig) with a pool
+# of worker processes outside of blender. Only the parse layer
+# (nel3d_parse.py) is used; the conversion to blender objects still
+# has to be done inside blender with import_nel3d.py.
+#
+# Usage from the command line:
+#
+#   python nel3d_batch.py [-j JOBS] [-o OUTDIR] [-e EXT] [-s SECTIONS] PATH [PATH ...]
+#
+# Each PATH is either a NeL file or a directory that is searched
+# recursively for NeL files. With -o the parsed data of each file is
+# pickled to OUTDIR/<file name>.<path hash>.pickle; the hash of the
+# absolute path keeps files with the same name in different
+# directories apart. With -s only the given parts of shapes and
+# instance groups are loaded (see NEL_SECTIONS in nel3d_parse.py), e.g. -s ""
+# for fast scans of materials and bone names. Files that fail to parse
+# are reported at the end and do not stop the batch.
+#
+# Usage as a module:
+#
+#   for result in batch_parse_NEL_files(find_NEL_files([rootPath])):
+#       if result['Error'] is None:
+#           use(result['Data']);
+#
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import array
+import time
+import hashlib
+import pickle
+import traceback
+import multiprocessing
+
+import nel3d_parse
+
+NEL_FILE_EXTENSIONS = ('.shape', '.skel', '.anim', '.ig');
+
+
+
+# returns the sorted list of all NeL files in the given paths; directories are
+# searched recursively
+def find_NEL_files(paths, extensions = NEL_FILE_EXTENSIONS):
+    extensions = tuple(e.lower() for e in extensions);
+    files = [];
+    for path in paths:
+        if os.path.isdir(path):
+            for dirPath, dirNames, fileNames in os.walk(path):
+                dirNames.sort();
+                for fileName in sorted(fileNames):
+                    if fileName.lower().endswith(extensions):
+                        files.append(os.path.join(dirPath, fileName));
+        else:
+            files.append(path);
+    return files;
+
+
+# returns a copy of the parsed data that can be pickled: the memoryviews into the
+# file buffer (see r_array) are copied to arrays; objects that are referenced
+# several times (shared (Poly)Ptr) stay shared
+def helper_detachParsedData(data, memo = None):
+    if memo is None:
+        memo = {};
+    key = id(data);
+    if key in memo:
+        return memo[key];
+
+    if isinstance(data, memoryview):
+        result = array.array(data.format, data.tobytes());
+    elif isinstance(data, dict):
+        result = {};
+        memo[key] = result;
+        for k, v in data.items():
+            result[k] = helper_detachParsedData(v, memo);
+    elif isinstance(data, list):
+        result = [];
+        memo[key] = result;
+        result.extend(helper_detachParsedData(v, memo) for v in data);
+    elif isinstance(data, tuple):
+        result = tuple(helper_detachParsedData(v, memo) for v in data);
+    else:
+        return data;
+
+    memo[key] = result;
+    return result;
+
+
+# parses one file and never raises; returns a dict with the keys
+#   'Path': the given path
+#   'Data': the parsed data (None on error or when keepData is False)
+#   'Error': None or the formatted exception
+#   'Stats': the statistics of the NelLoadContext (see load_NEL_stream)
+#   'OutFile': the pickle file the data was written to (or None)
+# sections is None or the set of NEL_SECTIONS to load (see NelLoadContext.wants)
+def parse_NEL_file_safe(path, outDir = None, keepData = True, sections = None):
+    result = {};
+    result['Path'] = path;
+    result['Data'] = None;
+    result['Error'] = None;
+    result['Stats'] = None;
+    result['OutFile'] = None;
+    try:
+        f = nel3d_parse.NelLoadContext.fromFile(path);
+        f.sections = sections;
+        try:
+            data = nel3d_parse.load_NEL_stream(f);
+        finally:
+            result['Stats'] = f.stats;
+        data = helper_detachParsedData(data);
+
+        if outDir is not None:
+            pathHash = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12];
+            outFile = os.path.join(outDir, os.path.basename(path) + "." + pathHash + ".pickle");
+            with open(outFile, "wb") as out:
+                pickle.dump(data, out, pickle.HIGHEST_PROTOCOL);
+            result['OutFile'] = outFile;
+        if keepData:
+            result['Data'] = data;
+    except Exception:
+        result['Error'] = traceback.format_exc();
+    return result;
+
+
+def _parse_NEL_file_job(job):
+    return parse_NEL_file_safe(*job);
+
+
+# parses all given files with numJobs worker processes (default: one per cpu) and
+# yields the result of each file (see parse_NEL_file_safe) as soon as it is
+# finished; the results are not in the order of paths
+def batch_parse_NEL_files(paths, numJobs = None, outDir = None, keepData = True, sections = None):
+    if outDir is not None and not os.path.isdir(outDir):
+        os.makedirs(outDir);
+
+    jobs = [(path, outDir, keepData, sections) for path in paths];
+    if numJobs is None:
+        numJobs = multiprocessing.cpu_count();
+    if numJobs <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _parse_NEL_file_job(job);
+        return;
+
+    # many small files: hand them out in chunks to keep the inter process overhead low
+    chunkSize = max(1, min(64, len(jobs) // (numJobs * 8)));
+    pool = multiprocessing.Pool(numJobs);
+    try:
+        for result in pool.imap_unordered(_parse_NEL_file_job, jobs, chunkSize):
+            yield result;
+        pool.close();
+    finally:
+        pool.terminate();
+        pool.join();
+
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description = "Parse NeL 3D files (" + ", ".join(NEL_FILE_EXTENSIONS) + ") in parallel.");
+    parser.add_argument("paths", nargs = "+", metavar = "PATH", help = "a NeL file or a directory that is searched recursively");
+    parser.add_argument("-j", "--jobs", type = int, default = None, help = "number of worker processes (default: number of cpus)");
+    parser.add_argument("-o", "--out", default = None, metavar = "OUTDIR", help = "pickle the parsed data of each file into OUTDIR");
+    parser.add_argument("-e", "--ext", action = "append", default = None, help = "file extension to search for (can be given several times)");
+    parser.add_argument("-s", "--sections", default = None, help = "comma separated list of the shape sections to load (of " + ",".join(nel3d_parse.NEL_SECTIONS) + "; default: all); an empty string loads only the headers, materials and bone names");
+    parser.add_argument("-v", "--verbose", action = "store_true", help = "print one line per parsed file");
+    args = parser.parse_args(argv);
+
+    sections = None;
+    if args.sections is not None:
+        sections = set(s for s in args.sections.split(",") if s);
+        for section in sections:
+            if section not in nel3d_parse.NEL_SECTIONS:
+                parser.error("unknown section '%s'" % section);
+
+    files = find_NEL_files(args.paths, args.ext or NEL_FILE_EXTENSIONS);
+    print("Parsing %d files" % len(files));
+
+    startTime = time.time();
+    numBytes = 0;
+    failed = [];
+    for result in batch_parse_NEL_files(files, args.jobs, args.out, keepData = False, sections = sections):
+        if result['Stats'] is not None:
+            numBytes += result['Stats']['FileSize'];
+        if result['Error'] is not None:
+            failed.append(result);
+            if args.verbose:
+                print("FAILED " + result['Path']);
+        elif args.verbose:
+            print("ok     %s (%.3fs)" % (result['Path'], result['Stats']['ParseTime']));
+    totalTime = time.time() - startTime;
+
+    for result in failed:
+        print();
+        print("Error while parsing " + result['Path'] + ":");
+        print(result['Error']);
+    print("Parsed %d files (%d failed, %.1f MB) in %.1fs" % (len(files), len(failed), numBytes / (1024.0 * 1024.0), totalTime));
+    return 1 if failed else 0;
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]));
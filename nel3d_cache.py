@@ -0,0 +1,256 @@
+#-------------------------------------------------------------------------------
+# NeL 3D Blender Importer - on-disk cache of parsed files
+#
+#-------------------------------------------------------------------------------
+#
+# ***** begin GPL LICENSE BLOCK *****
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ***** END GPL LICENCE BLOCK *****
+#
+#-------------------------------------------------------------------------------
+#
+# Stores the result of load_NEL_file in a cache directory so that the
+# same file does not have to be parsed again (e.g. in the next blender
+# session). Usage:
+#
+#   cache = NelParseCache("d:/tmp/nel3d_cache");
+#   data = load_NEL_file(fullFilePath, cache);
+#
+# Layout of the cache directory:
+#   refs/<hash of path>   (size, mtime, content hash) of a loaded file
+#   <content hash>.meta   the parsed data pickled without its arrays
+#   <content hash>.bin    the raw bytes of all arrays of the parsed data
+#
+# A file is only read and hashed again when its size or mtime changed;
+# files with the same content share one entry. On a warm load the
+# .bin file is mapped with mmap and the arrays are created directly on
+# the mapped memory (numpy.frombuffer or memoryview.cast just like
+# r_array does). Entries that were written by another parser version
+# (NEL_PARSE_VERSION) are parsed again. When the cache grows larger
+# than maxSize bytes the least recently used entries are deleted.
+#
+#-------------------------------------------------------------------------------
+
+import os
+import io
+import mmap
+import array
+import pickle
+import hashlib
+
+from nel3d_parse import *
+
+# stamp stored in each entry; the array storage differs with and without numpy
+CACHE_FORMAT_VERSION = (1, NEL_PARSE_VERSION, 'numpy' if numpy is not None else 'array');
+
+# byte alignment of the arrays in the .bin file
+CACHE_ARRAY_ALIGN = 16;
+
+
+
+# pickles the parsed data and moves all arrays into the separate binary blob
+class _NelCachePickler(pickle.Pickler):
+    def __init__(self, metaFile, binFile):
+        pickle.Pickler.__init__(self, metaFile, pickle.HIGHEST_PROTOCOL);
+        self.binFile = binFile;
+        self.binSize = 0;
+
+    def storeBytes(self, data):
+        pad = -self.binSize % CACHE_ARRAY_ALIGN;
+        if pad:
+            self.binFile.write(b'\0' * pad);
+        offset = self.binSize + pad;
+        self.binFile.write(data);
+        self.binSize = offset + len(data);
+        return offset;
+
+    def persistent_id(self, obj):
+        if numpy is not None and isinstance(obj, numpy.ndarray):
+            data = numpy.ascontiguousarray(obj).tobytes();
+            return ('ndarray', self.storeBytes(data), len(data), obj.dtype, obj.shape);
+        if isinstance(obj, memoryview):
+            return ('array', self.storeBytes(obj.tobytes()), obj.nbytes, obj.format);
+        if isinstance(obj, array.array):
+            return ('array', self.storeBytes(obj.tobytes()), len(obj) * obj.itemsize, obj.typecode);
+        return None;
+
+
+# rebuilds the arrays on the (mapped) binary blob
+class _NelCacheUnpickler(pickle.Unpickler):
+    def __init__(self, metaFile, binBuffer):
+        pickle.Unpickler.__init__(self, metaFile);
+        self.binBuffer = binBuffer;
+
+    def persistent_load(self, pid):
+        if pid[1] + pid[2] > len(self.binBuffer):
+            raise pickle.UnpicklingError("NeL cache entry array past the end of the .bin file");
+        if pid[0] == 'ndarray':
+            kind, offset, size, dtype, shape = pid;
+            return numpy.frombuffer(self.binBuffer, dtype, size // dtype.itemsize, offset).reshape(shape);
+        elif pid[0] == 'array':
+            kind, offset, size, typecode = pid;
+            return memoryview(self.binBuffer)[offset:offset + size].cast(typecode);
+        raise pickle.UnpicklingError("Unknown array in NeL cache entry: " + str(pid[0]));
+
+
+class NelParseCache:
+    def __init__(self, cacheDir, maxSize = 1024*1024*1024):
+        self.cacheDir = cacheDir;
+        self.maxSize = maxSize;
+        self.stats = {};
+        self.stats['Hits'] = 0;
+        self.stats['Misses'] = 0;
+        self.stats['Evicted'] = 0; # number of deleted entries
+        self.curSize = None; # size of all entries; computed by the first evict()
+
+        if not os.path.isdir(os.path.join(cacheDir, "refs")):
+            os.makedirs(os.path.join(cacheDir, "refs"));
+
+    def entryPath(self, contentHash, ext):
+        return os.path.join(self.cacheDir, contentHash + ext);
+
+    def refPath(self, fullFilePath):
+        pathHash = hashlib.sha1(os.path.abspath(fullFilePath).encode('utf-8')).hexdigest();
+        return os.path.join(self.cacheDir, "refs", pathHash);
+
+    # returns the parsed data of the given file
+    def load(self, fullFilePath):
+        st = os.stat(fullFilePath);
+        refPath = self.refPath(fullFilePath);
+        fileKey = (st.st_size, st.st_mtime_ns);
+
+        # size and mtime unchanged: the content hash of the last load is still valid
+        contentHash = None;
+        try:
+            with open(refPath, "rb") as f:
+                ref = pickle.load(f);
+            if ref[0] == fileKey:
+                contentHash = ref[1];
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, IndexError):
+            pass;
+
+        fileData = None;
+        if contentHash is None:
+            with open(fullFilePath, "rb") as f:
+                fileData = f.read();
+            contentHash = hashlib.sha1(fileData).hexdigest();
+            helper_writeFileAtomic(refPath, pickle.dumps((fileKey, contentHash), pickle.HIGHEST_PROTOCOL));
+
+        data = self.loadEntry(contentHash);
+        if data is not None:
+            self.stats['Hits'] += 1;
+        else:
+            self.stats['Misses'] += 1;
+            if fileData is None:
+                with open(fullFilePath, "rb") as f:
+                    fileData = f.read();
+            data = load_NEL_stream(NelLoadContext(fileData, os.path.basename(fullFilePath)));
+            self.storeEntry(contentHash, data);
+            self.evict();
+
+        # entries are shared by all files with the same content
+        if isinstance(data, dict) and 'NelName' in data:
+            data['NelName'] = os.path.basename(fullFilePath);
+        return data;
+
+    # returns the stored data or None when there is no valid entry
+    def loadEntry(self, contentHash):
+        metaPath = self.entryPath(contentHash, ".meta");
+        binPath = self.entryPath(contentHash, ".bin");
+        try:
+            with open(metaPath, "rb") as metaFile:
+                if pickle.load(metaFile) != CACHE_FORMAT_VERSION:
+                    return None;
+                with open(binPath, "rb") as binFile:
+                    if os.fstat(binFile.fileno()).st_size > 0:
+                        binBuffer = mmap.mmap(binFile.fileno(), 0, access = mmap.ACCESS_READ);
+                    else:
+                        binBuffer = b'';
+                data = _NelCacheUnpickler(metaFile, binBuffer).load();
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, IndexError):
+            return None; # missing, truncated or stale entries are parsed again
+        try:
+            os.utime(metaPath); # marks the entry as recently used for evict()
+        except OSError:
+            pass;
+        return data;
+
+    def storeEntry(self, contentHash, data):
+        metaFile = io.BytesIO();
+        binFile = io.BytesIO();
+        pickle.dump(CACHE_FORMAT_VERSION, metaFile, pickle.HIGHEST_PROTOCOL);
+        _NelCachePickler(metaFile, binFile).dump(data);
+        try:
+            # the .meta file is written last: an entry is only valid when it exists
+            helper_writeFileAtomic(self.entryPath(contentHash, ".bin"), binFile.getvalue());
+            helper_writeFileAtomic(self.entryPath(contentHash, ".meta"), metaFile.getvalue());
+            if self.curSize is not None:
+                self.curSize += len(binFile.getvalue()) + len(metaFile.getvalue());
+        except OSError as e:
+            print("WARNING: could not write NeL cache entry " + contentHash + ": " + str(e));
+
+    # deletes the least recently used entries until the cache is smaller than maxSize;
+    # the cache directory is only scanned when the size is exceeded
+    def evict(self):
+        if self.curSize is not None and self.curSize <= self.maxSize:
+            return;
+
+        entries = [];
+        totalSize = 0;
+        for entry in os.scandir(self.cacheDir):
+            if not entry.name.endswith(".meta"):
+                continue;
+            contentHash = entry.name[:-len(".meta")];
+            try:
+                size = entry.stat().st_size + os.path.getsize(self.entryPath(contentHash, ".bin"));
+            except OSError:
+                continue;
+            entries.append((entry.stat().st_mtime, size, contentHash));
+            totalSize += size;
+        self.curSize = totalSize;
+        if totalSize <= self.maxSize:
+            return;
+
+        entries.sort();
+        for mtime, size, contentHash in entries:
+            if totalSize <= self.maxSize:
+                break;
+            try:
+                os.remove(self.entryPath(contentHash, ".meta"));
+                os.remove(self.entryPath(contentHash, ".bin"));
+            except OSError:
+                continue; # e.g. still mapped on windows
+            totalSize -= size;
+            self.stats['Evicted'] += 1;
+        self.curSize = totalSize;
+
+    # deletes all entries
+    def clear(self):
+        for entry in os.scandir(self.cacheDir):
+            if entry.name.endswith((".meta", ".bin")):
+                try:
+                    os.remove(entry.path);
+                except OSError:
+                    pass;
+        self.curSize = None;
+
+
+# writes the file under a temporary name first so that concurrent readers never see a partial file
+def helper_writeFileAtomic(path, data):
+    tmpPath = "%s.%d.tmp" % (path, os.getpid());
+    with open(tmpPath, "wb") as f:
+        f.write(data);
+    os.replace(tmpPath, path);
@@ -0,0 +1,1976 @@
+#-------------------------------------------------------------------------------
+# NeL 3D Blender Importer - binary file parser
+#
+#-------------------------------------------------------------------------------
+#
+# ***** begin GPL LICENSE BLOCK *****
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ***** END GPL LICENCE BLOCK *****
+#
+#-------------------------------------------------------------------------------
+#
+# The parse layer of the importer: reads NeL 3D files (*.shape,
+# *.skel, *.anim, *.ig) into plain python dicts. It does not depend on
+# blender (only on the standard library and, when available, numpy) so
+# it can also be used in a normal python interpreter (see
+# nel3d_batch.py). The conversion to blender objects is done in
+# import_nel3d.py.
+#
+# The code here is based directly on the NeL source-code as contained
+# in the dev.ryzom.com hg repository. Most of the relevant files are
+# in 'code/nel/src/3d' where the serial(...) method of each class
+# defines the binary data format that is loaded here.
+# 
+#-------------------------------------------------------------------------------
+#  Notes: 
+#   - all state of one load (the file buffer, the cached nodes of
+#     (Poly)Ptr ids and statistics) is held in a NelLoadContext that is
+#     passed as 'f' to all parse_* functions; there is no global state
+#     so several files can be loaded concurrently
+#   - matrices are stored as 4 rows of 4 floats and quaternions as
+#     (w, x, y, z) tuples
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import math
+import struct
+import array
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None; # the bulk array decoding falls back to the struct and array modules
+
+# version of the parsed data layout; increase it whenever a parse_* function changes
+# what it returns so that results stored by nel3d_cache.py are invalidated
+NEL_PARSE_VERSION = 4;
+
+# the parts of a shape that can be skipped with the sections of a NelLoadContext:
+#   'Geometry': vertex data, index buffers, MRM geomorphs and skinning data
+#   'ShadowSkin': the _ShadowSkin.* of MRM meshes
+#   'LightInfos': the _LightInfos of CMeshBase
+#   'LodCharacterTexture': the _LodCharacterTexture of CMeshBase
+#   'IGLights': the _IGSurfaceLight and _PointLightArray of CInstanceGroup
+#   'IGClusters': the _ClusterInfos and _Portals of CInstanceGroup
+# materials, bone names and all headers are always loaded; so are the global position
+# and the instances of instance groups
+NEL_SECTIONS = ('Geometry', 'ShadowSkin', 'LightInfos', 'LodCharacterTexture', 'IGLights', 'IGClusters');
+
+
+
+def error(message):
+    raise Exception(message);
+
+   
+
+# precompiled little endian formats used by the r_* functions below
+STRUCT_UINT64 = struct.Struct('<Q');
+STRUCT_UINT32 = struct.Struct('<I');
+STRUCT_UINT16 = struct.Struct('<H');
+STRUCT_UINT8 = struct.Struct('<B');
+STRUCT_INT64 = struct.Struct('<q');
+STRUCT_INT32 = struct.Struct('<i');
+STRUCT_INT16 = struct.Struct('<h');
+STRUCT_INT8 = struct.Struct('<b');
+STRUCT_DOUBLE = struct.Struct('<d');
+STRUCT_FLOAT = struct.Struct('<f');
+STRUCT_VEC2F = struct.Struct('<2f');
+STRUCT_VEC3F = struct.Struct('<3f');
+STRUCT_VEC4F = struct.Struct('<4f');
+STRUCT_RGBA = struct.Struct('<4B');
+
+
+# The stream all parse_* functions read from. The complete file is loaded
+# once into memory and the r_* functions below unpack directly from this
+# buffer at the current cursor position (instead of doing one f.read(...)
+# per value).
+class NelStreamReader:
+    def __init__(self, data, name = ""):
+        self.buf = data;
+        self.pos = 0;
+        self.name = name;
+
+    @classmethod
+    def fromFile(cls, fullFilePath):
+        with open(fullFilePath, 'rb') as fh:
+            data = fh.read();
+        return cls(data, os.path.basename(fullFilePath));
+
+    def read(self, n):
+        pos = self.pos;
+        if pos + n > len(self.buf):
+            error("NelStreamReader: read of %d bytes at offset %d is past the end of %r" % (n, pos, self.name));
+        self.pos = pos + n;
+        return self.buf[pos:pos + n];
+
+    def skip(self, n):
+        self.pos += n;
+
+    def tell(self):
+        return self.pos;
+
+    def seek(self, pos):
+        self.pos = pos;
+
+    # unpacks the given precompiled struct.Struct at the cursor and advances
+    def unpack(self, s):
+        val = s.unpack_from(self.buf, self.pos);
+        self.pos += s.size;
+        return val;
+
+
+# All state of a single load: the stream (this class extends the reader so the r_* functions
+# can keep reading buf/pos directly), the table of already loaded (Poly)Ptr ids of this stream
+# and per load statistics. One context is created per file and passed as 'f' through all parse_*
+# calls, which makes the parsing reentrant.
+class NelLoadContext(NelStreamReader):
+    def __init__(self, data, name = "", sections = None):
+        NelStreamReader.__init__(self, data, name);
+        self.streamIDMap = {}; # stores the loaded 'id's of (Poly)Ptr for this stream
+        self.sections = sections; # None (everything) or the set of NEL_SECTIONS to load (see wants())
+        self.mrmLod = None; # None (all lods) or the index of the only CMeshMRMGeom lod to load (see read_CMeshMRMGeom_SingleLod)
+        self.stats = {};
+        self.stats['FileSize'] = len(data);
+        self.stats['ParseTime'] = 0.0;
+        self.stats['NumPtr'] = 0; # number of (Poly)Ptr objects read
+        self.stats['NumPtrShared'] = 0; # number of (Poly)Ptr references to an already read object
+        self.stats['ClassCounts'] = {}; # number of PolyPtr objects per class name
+
+    # True when the given section (one of NEL_SECTIONS) is to be loaded; the data of
+    # the other sections is skipped in the stream and stored as None
+    def wants(self, section):
+        return self.sections is None or section in self.sections;
+
+
+def r_uint64(f):
+    val = STRUCT_UINT64.unpack_from(f.buf, f.pos)[0];
+    f.pos += 8;
+    return val;
+
+def r_uint32(f):
+    val = STRUCT_UINT32.unpack_from(f.buf, f.pos)[0];
+    f.pos += 4;
+    return val;
+
+def r_uint16(f):
+    val = STRUCT_UINT16.unpack_from(f.buf, f.pos)[0];
+    f.pos += 2;
+    return val;
+
+def r_uint8(f):
+    val = f.buf[f.pos];
+    f.pos += 1;
+    return val;
+
+def r_int64(f):
+    val = STRUCT_INT64.unpack_from(f.buf, f.pos)[0];
+    f.pos += 8;
+    return val;
+
+def r_int32(f):
+    val = STRUCT_INT32.unpack_from(f.buf, f.pos)[0];
+    f.pos += 4;
+    return val;
+
+def r_int16(f):
+    val = STRUCT_INT16.unpack_from(f.buf, f.pos)[0];
+    f.pos += 2;
+    return val;
+
+def r_int8(f):
+    val = STRUCT_INT8.unpack_from(f.buf, f.pos)[0];
+    f.pos += 1;
+    return val;
+
+def r_double(f):
+    val = STRUCT_DOUBLE.unpack_from(f.buf, f.pos)[0];
+    f.pos += 8;
+    return val;
+
+def r_float(f):
+    val = STRUCT_FLOAT.unpack_from(f.buf, f.pos)[0];
+    f.pos += 4;
+    return val;
+
+def r_bool(f):
+    return r_uint8(f) != 0;
+
+def r_version(f):
+    ver = r_uint8(f);
+    if (ver == 0xFF):
+        return r_uint32(f);
+    else:
+        return ver;
+
+def r_lstring(f): # reading a length-encoded string
+    len = r_uint32(f);
+    val = f.read(len)
+    try:
+        val = val.decode();
+    except:
+        print("WARNING: could not decode string: " + str(val));
+        val = str(val);
+        #error("break");
+    return val;
+
+def r_Vec2f(f): 
+    return f.unpack(STRUCT_VEC2F);
+
+def r_Vec3f(f): 
+    return f.unpack(STRUCT_VEC3F);
+
+def r_Vec4f(f): 
+    return f.unpack(STRUCT_VEC4F);
+
+def r_RGBA(f):
+    return f.unpack(STRUCT_RGBA);
+
+# reads a versioned type of a (i.e. versioned(r_RGBA, f)) used for CTrackDefaultBlendable
+def versioned(a, f):
+    r_version(f);
+    return a(f);
+
+
+# byte size in the file of the array module type codes used with r_array
+ArrayTypeSize = {'b':1, 'B':1, 'h':2, 'H':2, 'i':4, 'I':4, 'f':4, 'd':8};
+
+# reads num values of the given array module typecode as one typed buffer without
+# parsing the single elements: a numpy array (or a memoryview when numpy is not
+# available) directly over the bytes of the stream
+def r_array(f, typecode, num):
+    pos = f.pos;
+    size = num * ArrayTypeSize[typecode];
+    if pos + size > len(f.buf):
+        error("r_array: array of %d bytes at offset %d is past the end of %r" % (size, pos, f.name));
+    f.pos = pos + size;
+
+    if numpy is not None:
+        return numpy.frombuffer(f.buf, '<' + typecode, num, pos);
+    if sys.byteorder == 'little':
+        return memoryview(f.buf)[pos:pos + size].cast(typecode);
+    # big endian hosts need a swapped copy
+    data = array.array(typecode, f.buf[pos:pos + size]);
+    data.byteswap();
+    return data;
+
+# like parse_cont(f, r_...) for a container of plain values but returns a typed buffer (see r_array)
+def parse_cont_array(f, typecode):
+    num = r_uint32(f);
+    return r_array(f, typecode, num);
+
+
+# returns the given rows (i.e. a vertex attribute from _VertexData) as one flat typed array
+# that can be passed directly to foreach_set; typecode is an array module type code
+def array_flatten(rows, typecode):
+    if numpy is not None:
+        return numpy.ascontiguousarray(rows, typecode).ravel();
+    return array.array(typecode, [c for row in rows for c in row]);
+
+# returns the rows at the given indices
+def array_gather(rows, idxs):
+    if numpy is not None:
+        return numpy.asarray(rows)[numpy.asarray(idxs, numpy.intp)];
+    return [rows[i] for i in idxs];
+
+
+enum_TCameraCollisionGenerate = ("AutoCameraCol", "NoCameraCol", "ForceCameraCol", );
+
+enum_TShader = ("Normal", "Bump", "UserColor", "LightMap", "Specular", "Caustics", "PerPixelLighting", "PerPixelLightingNoSpec", "Cloud", "Water",);
+enum_TBlend = ("one", "zero", "srcalpha", "invsrcalpha", "srccolor", "invsrccolor", "blendConstantColor", "blendConstantInvColor", "blendConstantAlpha", "blendConstantInvAlpha",);
+enum_ZFunc = ("always", "never", "equal", "notequal", "less", "lessequal", "greater", "greaterequal",);
+
+enum_TUploadFormat = ("Auto", "RGBA8888", "RGBA4444", "RGBA5551", "RGB888", "RGB565", "DXTC1", "DXTC1Alpha", "DXTC3", "DXTC5", "Luminance", "Alpha", "AlphaLuminance", "DsDt", );
+
+enum_TMinFilter = ("NearestMipMapOff", "NearestMipMapNearest", "NearestMipMapLinear", "LinearMipMapOff", "LinearMipMapNearest", "LinearMipMapLinear", );
+enum_TMagFilter = ("Nearest", "Linear", );
+enum_TWrapMode = ("Repeat", "Clamp", );
+
+enum_CPointLight_TType = ("PointLight", "SpotLight", "AmbientLight");
+
+IDRV_MAT_MAXTEXTURES = 4;
+
+IDRV_MAT_TEX_ADDR = 0x00000400;
+IDRV_MAT_USER_TEX_0_MAT = 0x00100000;
+
+NL3D_MESH_MRM_SKINNED_MAX_MATRIX = 4;
+
+NL3D_MESH_SKINNING_MAX_MATRIX = 4;
+
+NL3D_MESH_MRM_SKINNED_WEIGHT_FACTOR = 255.0;
+NL3D_MESH_MRM_SKINNED_UV_FACTOR	= 8192.0;
+NL3D_MESH_MRM_SKINNED_NORMAL_FACTOR = 32767.0;
+NL3D_MESH_MRM_SKINNED_DEFAULT_POS_SCALE = 8.0/32767.0;
+
+NL3D_OO32767 = 1.0/32767;
+
+
+# we use the 32bit float max here:
+FLT_MAX = 3.402823466e+38;
+
+def r_enum(enum, f):
+    return enum[r_int32(f)];
+
+
+def parse_CTrackDefaultVector(f):
+    return versioned(r_Vec3f, f);
+
+def parse_CTrackDefaultQuat(f):
+    return versioned(r_Vec4f, f);
+
+
+def parse_ITexture(f):
+    data = {};
+    ver = r_version(f);
+    data['_UploadFormat'] = r_enum(enum_TUploadFormat, f);
+    data['_WrapS'] = r_enum(enum_TWrapMode, f);
+    data['_WrapT'] = r_enum(enum_TWrapMode, f);
+    data['_MinFilter'] = r_enum(enum_TMinFilter, f);
+    data['_Magfilter'] = r_enum(enum_TMagFilter, f);
+    data['_LoadGraysacleAsAlpha'] = r_bool(f) if (ver >= 1) else False;
+
+    return data;
+    
+
+
+def parse_CTextureFile(f):
+    ver = r_version(f);
+    data = parse_ITexture(f);
+    data['_FileName'] = r_lstring(f);
+    data['_AllowDegradation'] = r_bool(f) if (ver >= 1) else True;
+
+    data['NelType'] = 'CTextureFile';
+    return data;
+
+def parse_TexEnv(f, ver):
+    data = {};
+    #!!TODO: currently only skipping the packed data here; see nel/include/nel/3d/material.h line 586
+    if (ver > 0):
+        f.skip(14);
+    else:
+        f.skip(10);
+    data['ConstantColor'] = r_RGBA(f);
+    return data;
+
+def parse_CTextureCube(f):
+    ver = r_version(f);
+    data = parse_ITexture(f);
+    data['_Textures'] = [parse_PolyPtr(f) for i in range(6)];
+    if (ver == 1): r_bool(f);
+        
+    data['NelType'] = 'CTextureCube';
+    return data;
+
+
+# State Bits
+MAT_TRANS = 1;
+MAT_ROT = 2;
+MAT_SCALEUNI = 4;
+MAT_SCALEANY = 8;
+MAT_PROJ = 16;
+
+def parse_CMatrix(f):
+    data = {};
+    ver = r_version(f);
+    mat = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]];
+    data['StateBit'] = r_uint32(f);
+    data['Scale33'] = r_float(f);
+
+    if (data['StateBit'] & (MAT_ROT|MAT_SCALEUNI|MAT_SCALEANY) !=0): #hasRot()
+        mat[0][0] = r_float(f);
+        mat[0][1] = r_float(f);
+        mat[0][2] = r_float(f);
+        mat[1][0] = r_float(f);
+        mat[1][1] = r_float(f);
+        mat[1][2] = r_float(f);
+        mat[2][0] = r_float(f);
+        mat[2][1] = r_float(f);
+        mat[2][2] = r_float(f);
+    if (data['StateBit'] & MAT_TRANS != 0): #hasTrans()
+        mat[0][3] = r_float(f);
+        mat[1][3] = r_float(f);
+        mat[2][3] = r_float(f);
+    if (data['StateBit'] & MAT_PROJ != 0):
+        mat[3][0] = r_float(f);
+        mat[3][1] = r_float(f);
+        mat[3][2] = r_float(f);
+        mat[3][3] = r_float(f);
+        
+    data['M'] = mat; # 4 rows of 4 floats; can be passed directly to mathutils.Matrix(...)
+
+    data['NelType'] = 'CMatrix';
+    return data;
+
+    
+    
+# implements the serial2 from CLightMap
+def parse_CLightMap_2(f):
+    data = {};
+    ver = r_version(f);
+    data['Factor'] = r_RGBA(f);
+    data['LMCDiffuse'] = r_RGBA(f);
+    data['LMCAmbient'] = r_RGBA(f) if (ver >= 1) else (0,0,0,0);
+    data['Texture'] = parse_PolyPtr(f);
+
+    data['NelType'] = 'CLightMap';
+    return data;
+
+def parse_CLightMap(f):
+    data = {};
+    data['Factor'] = r_RGBA(f);
+    data['Texture'] = parse_PolyPtr(f);
+
+    data['NelType'] = 'CLightMap';
+    return data;
+    
+
+def parse_CMaterial(f):
+    cMat = {}
+    ver = r_version(f);
+    cMat['_ShaderType'] = enum_TShader[r_int32(f)];
+    cMat['_Flags'] = r_uint32(f);
+    cMat['_SrcBlend'] = enum_TBlend[r_int32(f)];
+    cMat['_DstBlend'] = enum_TBlend[r_int32(f)];
+    cMat['_ZFunction'] = enum_ZFunc[r_int32(f)];
+    cMat['_ZBias'] = r_float(f);
+    cMat['_Color'] = r_RGBA(f);
+    cMat['_Emissive'] = r_RGBA(f);
+    cMat['_Ambient'] = r_RGBA(f);
+    cMat['_Diffuse'] = r_RGBA(f);
+    cMat['_Specular'] = r_RGBA(f);
+    cMat['_Shininess'] = r_float(f) if (ver >= 2) else 0.0;
+    cMat['_AlphaTestThreshold'] = r_float(f) if (ver >= 5) else 0.0;
+    cMat['_TexCoordGenMode'] = r_uint16(f) if (ver >= 8) else 0;
+
+    cMat['_Textures'] = [];
+    cMat['_TexEnvs'] = [];
+
+    # next we need to read the textures
+    for i in range(0, IDRV_MAT_MAXTEXTURES):
+        tex = parse_PolyPtr(f);
+        cMat['_Textures'].append(tex);
+        if (ver >= 1):
+            cMat['_TexEnvs'].append(parse_TexEnv(f, 1 if (ver >= 9) else 0));
+        else:
+            cMat['_TexEnvs'].append(None); # !!TODO: check if we need a default here
+
+    if (ver >= 3):
+        if (ver >= 7):
+            n = r_uint32(f);
+            #print('num LightMaps = %d' % n);
+            cMat['_LightMaps'] = [];
+            for i in range(0, n):
+                cMat['_LightMaps'].append(parse_CLightMap_2(f));
+            cMat['_LightMapsMulx2'] = r_bool(f);
+        else:
+            cMat['_LightMaps'] = parse_cont(f, parse_CLightMap);
+
+
+    cMat['_TexAddrMode'] = [];
+    if (ver >= 4):
+        if (cMat['_Flags'] & IDRV_MAT_TEX_ADDR != 0):
+            for i in range(0, IDRV_MAT_MAXTEXTURES):
+                cMat['_TexAddrMode'].append(r_uint8(f));
+    
+    cMat['_TexUserMat'] = [];
+    if (ver >= 6):
+        for i in range(0, IDRV_MAT_MAXTEXTURES):
+            # implements CMaterial::isUserTexMatEnabled(uint stage):
+            if (cMat['_Flags'] & (IDRV_MAT_USER_TEX_0_MAT << i) != 0):
+                cMat['_TexUserMat'].append(parse_CMatrix(f));
+            else:
+                cMat['_TexUserMat'].append(None);
+
+    #print("Finished reading CMaterial");
+        
+    cMat['NelType'] = 'CMaterial';
+    return cMat;
+
+
+
+def parse_CLightMapInfoList(f):
+    data = {};
+    ver = r_version(f);
+    data['LightGroup'] = r_uint32(f);
+    data['AnimatedLight'] = r_lstring(f);
+
+    data['StageList'] = [];
+    numCMatStage = r_uint32(f);
+    for i in range(0, numCMatStage):
+        matStage = {};
+        r_version(f);
+        matStage['MatId'] = r_uint8(f);
+        matStage['StageId'] = r_uint8(f);
+        data['StageList'].append(matStage);
+
+    data['NelType'] = 'CLightMapInfoList';
+    return data;
+
+
+# skips a CLightMapInfoList (see parse_CLightMapInfoList) by reading only the lengths
+def skip_CLightMapInfoList(f):
+    r_version(f);
+    f.skip(4); # LightGroup
+    f.skip(r_uint32(f)); # AnimatedLight
+    f.skip(r_uint32(f) * 3); # StageList: version byte, MatId, StageId
+
+def parse_CLodCharacterTexture(f):
+    data = {};
+    r_version(f);
+    data['_Width'] = r_uint32(f);
+    data['_Height'] = r_uint32(f);
+    num = r_uint32(f);
+    data['Texture'] = [];
+    for i in range (0, num):
+        data['Texture'].append( (r_uint8(f), r_uint8(f), r_uint8(f), r_uint8(f)) ); # T U V Q
+
+    data['NelType'] = 'CLodCharacterTexture';
+    return data;
+
+def skip_CLodCharacterTexture(f):
+    r_version(f);
+    f.skip(8); # _Width, _Height
+    f.skip(r_uint32(f) * 4);
+    return None;
+
+
+def parse_CAnimatedTexture(f):
+    data = {}
+    data['Texture'] = parse_PolyPtr(f);
+    data['NelType'] = 'CAnimatedTexture';
+    return data;
+
+def parse_CMaterialBase(f):
+    data = {};
+    ver = r_version(f);
+    data['Name'] = r_lstring(f);
+
+    data['DefaultAmbient'] = versioned(r_RGBA, f);
+    data['DefaultDiffuse'] = versioned(r_RGBA, f);
+    data['DefaultSpecular'] = versioned(r_RGBA, f);
+    data['DefaultShininess'] = versioned(r_float, f);
+    data['DefaultEmissive'] = versioned(r_RGBA, f);
+    data['DefaultOpacity'] = versioned(r_float, f);
+    data['DefaultTexture'] = versioned(r_int32, f);
+    data['_AnimatedTextures'] = parse_map(f, r_uint32, parse_CAnimatedTexture, 'TAnimatedTextureMap');
+
+    if (ver > 0):
+        data['DefaultTexAnimTracks'] = [parse_CTexAnimTracks(f) for i in range(IDRV_MAT_MAXTEXTURES)];
+    else:
+        print("WARNING: parse_CMaterialBase: setting default values of DefaultTexAnimTracks not yet supported!");
+
+    data['NelType'] = 'CMaterialBase';
+    return data;
+
+def parse_CMeshBase(f):
+    data = {};
+    ver = r_version(f);
+
+    # Vector of _AnimatedMorph not yet supported
+    if (ver >= 2):
+        if (r_int32(f) != 0):
+            error("Reading _AnimatedMorph not yet supported");
+    if (ver < 1):
+        error("Mesh with ver < 1 is too old");
+
+    data['_DefaultPos'] = versioned(r_Vec3f, f);
+    data['_DefaultPivot'] = versioned(r_Vec3f, f);
+    data['_DefaultRotEuler'] = versioned(r_Vec3f, f);
+    data['_DefaultRotQuat'] = versioned(r_Vec4f, f);
+    data['_DefaultScale'] = versioned(r_Vec3f, f);
+    data['_Materials'] = parse_cont(f, parse_CMaterial);
+    data['_AnimatedMaterials'] = parse_map(f, r_uint32, parse_CMaterialBase, 'TAnimatedMaterialMap');
+
+    if (ver >= 8):
+        data['_LightInfos'] = parse_cont(f, parse_CLightMapInfoList) if f.wants('LightInfos') else skip_cont(f, skip_CLightMapInfoList);
+    else:
+        data['_LightInfos'] = []
+        numLightInfosOld = r_int32(f);
+        if (numLightInfosOld > 0):
+            error("parse_CMeshBase loading of _LightInfosOld not yet supported");
+
+    data['_IsLightable'] = r_bool(f) if (ver >= 3) else False; # Note: in the orig. code vor ver < 3 this is computed by looking for light-maps in the materials
+    
+    data['_UseLightingLocalAttenuation'] = r_bool(f) if (ver >= 4) else False;
+    data['_AutoAnim'] = r_bool(f) if (ver >= 5) else False;
+    data['_DistMax'] = r_float(f) if (ver >= 6) else 0.0;
+    if (ver >= 7):
+        data['_LodCharacterTexture'] = parse_ptr(f, parse_CLodCharacterTexture if f.wants('LodCharacterTexture') else skip_CLodCharacterTexture);
+    
+    if (ver >= 9):
+        data['_CollisionMeshGeneration'] = r_enum(enum_TCameraCollisionGenerate, f);
+    else:
+        data['_CollisionMeshGeneration'] = enum_TCameraCollisionGenerate[0];
+
+    data['NelType'] = 'CMeshBase';
+    return data;
+
+
+def parse_CMeshMorpher(f):
+    data = {};
+    r_version(f);
+
+    data['BlendShapes'] = [];
+    numBlendShapes = r_uint32(f);
+    if (numBlendShapes > 0):
+        error("Reading of BlendShapes in parse_CMeshMorpher not yet implemented!");
+    
+    data['NelType'] = 'CMeshMorpher';
+    return data;
+
+
+  
+
+
+enum_CVertexBuffer_TValue = ("Position", "Normal", "TexCoord0", "TexCoord1", "TexCoord2", "TexCoord3", "TexCoord4", "TexCoord5", "TexCoord6", "TexCoord7", "PrimaryColor", "SecondaryColor", "Weight", "PaletteSkin", "Fog", "Empty",);
+enum_CVertexBuffer_TPreferredMemory = ("RAMPreferred", "AGPPreferred", "StaticPreferred", "RAMVolatile", "AGPVolatile",);
+
+# Float2 == 4; Float3 == 7; 12 == UChar4; Float4 == 10; Float1 = 1 (See vertex_buffer.cpp line 69)
+DefaultValueType = (7, 7, 4, 4, 4, 4, 4, 4, 4, 4, 12, 12, 10, 12, 1, 1);
+
+
+# struct format (one char per component) of each CVertexBuffer::TType; UChar4 is unsigned in NeL
+VertexValueTypeFormat = ('d', 'f', 'h', 'dd', 'ff', 'hh', 'ddd', 'fff', 'hhh', 'dddd', 'ffff', 'hhhh', 'BBBB',);
+
+gVertexLayoutCache = {}; # caches the layout computed by helper_getVertexLayout per (_Flags, _Type)
+
+# computes the interleaved layout of one vertex as given by the _Flags and _Type of a CVertexBuffer.
+# 'Fields' contains (valueName, firstComponent, numComponents) for each value that is present
+def helper_getVertexLayout(flags, types):
+    key = (flags, tuple(types));
+    if key in gVertexLayoutCache:
+        return gVertexLayoutCache[key];
+
+    fields = [];
+    fmt = '';
+    dtypeFields = [];
+    for value in range(len(enum_CVertexBuffer_TValue)):
+        if ((flags & (1 << value)) != 0):
+            if types[value] >= len(VertexValueTypeFormat):
+                error("helper_getVertexLayout with invalid SizeType " + str(types[value]));
+            valueFmt = VertexValueTypeFormat[types[value]];
+            fields.append((enum_CVertexBuffer_TValue[value], len(fmt), len(valueFmt)));
+            dtypeFields.append((enum_CVertexBuffer_TValue[value], '<' + valueFmt[0], (len(valueFmt),)));
+            fmt += valueFmt;
+
+    layout = {};
+    layout['Fields'] = fields;
+    layout['Struct'] = struct.Struct('<' + fmt);
+    layout['DType'] = numpy.dtype(dtypeFields) if numpy is not None else None;
+
+    gVertexLayoutCache[key] = layout;
+    return layout;
+
+# CVertexBuffer::serialHeader(...) '3d/vertex_buffer.cpp'
+def read_CVertexBuffer_Header(f, data):
+    flags = 0;
+    hver = r_version(f);
+    if (hver < 1):
+        oldFlags = r_uint32(f);
+        print("!!TODO: remapping of old flags in CVertexBuffer header ver < 1 not yet implemented! oldFlags = " + str(oldFlags));
+        flags = 12295; # !!TODO: hardcoded value for GNU
+        data['_Type'] = [DefaultValueType[i] for i in range(len(enum_CVertexBuffer_TValue))];
+    else:
+        flags = r_uint16(f);
+        data['_Type'] = [r_uint8(f) for i in range(len(enum_CVertexBuffer_TValue))];
+
+    data['_NbVerts'] = r_uint32(f);
+    data['_Flags'] = flags; # Note: in the orig. code this is set again using addValueEx (with some error checking)
+    data['_VertexColorFormat'] = r_uint8(f) if (hver >= 2) else 0; # 0 == TRGBA; 1 == TBGRA
+
+    if (hver >= 3):
+        data['_PreferredMemory'] = r_enum(enum_CVertexBuffer_TPreferredMemory, f);
+        data['_Name'] = r_lstring(f);
+    else:
+        data['_PreferredMemory'] = enum_CVertexBuffer_TPreferredMemory[0];
+        data['_Name'] = "";
+
+
+# CVertexBuffer::serialSubset(...) '3d/vertex_buffer.cpp'
+# The interleaved vertex block is decoded in one step: with numpy each value in
+# data['_VertexData'] is a (numVerts, numComponents) view into the file buffer; without
+# numpy it is a list of per vertex tuples decoded with a single struct.iter_unpack.
+# Subsets with vertexStart > 0 (CMeshMRMGeom lods) are appended to the already read vertices.
+def read_CVertexBuffer_Subset(f, vertexStart, vertexEnd, data):
+    layout = helper_getVertexLayout(data['_Flags'], data['_Type']);
+    sver = r_version(f);
+
+    numVerts = vertexEnd - vertexStart;
+    blockSize = numVerts * layout['Struct'].size;
+    subsetData = {};
+    if not f.wants('Geometry'):
+        subsetData = None;
+    elif (blockSize > 0):
+        if numpy is not None:
+            records = numpy.frombuffer(f.buf, layout['DType'], numVerts, f.pos);
+            for valueName, first, num in layout['Fields']:
+                subsetData[valueName] = records[valueName];
+        else:
+            records = list(layout['Struct'].iter_unpack(memoryview(f.buf)[f.pos:f.pos + blockSize]));
+            for valueName, first, num in layout['Fields']:
+                subsetData[valueName] = [rec[first:first + num] for rec in records];
+    f.skip(blockSize);
+
+    if vertexStart == 0 or data.get('_VertexData') is None:
+        data['_VertexData'] = subsetData;
+    elif subsetData is not None:
+        for valueName, values in subsetData.items():
+            if valueName not in data['_VertexData']:
+                data['_VertexData'][valueName] = values;
+            elif numpy is not None:
+                data['_VertexData'][valueName] = numpy.concatenate((data['_VertexData'][valueName], values));
+            else:
+                data['_VertexData'][valueName] = data['_VertexData'][valueName] + values;
+
+    if (sver >= 2):
+        data['_UVRouting'] = (r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f),r_uint8(f));
+    else:
+        data['_UVRouting'] = (0,1,2,3,4,5,6,7);
+    
+
+def parse_CVertexBuffer(f):
+    data = {};
+    bver = r_version(f);
+    if (bver < 2):
+        error("Parsing old CVertexBuffer (< 2) not yet implemented!");
+    #else
+    
+    # serialHeader()
+    read_CVertexBuffer_Header(f, data);
+
+    # serialSubset(): this reads in all the vertex data as specified by flags
+    read_CVertexBuffer_Subset(f, 0, data['_NbVerts'], data);
+
+    data['NelType'] = 'CVertexBuffer';
+    return data;
+        
+
+def parse_CIndexBuffer(f):
+    data = {};
+
+    ver = r_version(f);
+
+    if ver < 1:
+        # skip:
+        r_uint32(f); r_uint32(f);
+        parse_cont_array(f, 'I');
+        # read triangles
+        data['_NbIndexes'] = r_uint32(f)*3;
+        data['_Capacity'] = r_uint32(f)*3;
+        data['_NonResidentIndexes'] = parse_cont_array(f, 'I');
+        # skip:
+        r_uint32(f); r_uint32(f);
+        parse_cont_array(f, 'I');
+    else: # ver >= 1
+        data['_NbIndexes'] = r_uint32(f);
+        data['_Capacity'] = r_uint32(f);
+        data['_NonResidentIndexes'] = parse_cont_array(f, 'I') if f.wants('Geometry') else skip_cont(f, 4);
+        data['_PreferredMemory'] = r_enum(enum_CVertexBuffer_TPreferredMemory, f);
+        if ver == 1: 
+            for i in range(len(enum_CVertexBuffer_TPreferredMemory)): r_bool(f);
+
+    data['NelType'] = 'CIndexBuffer';
+    return data;
+
+
+def parse_CMeshVPWindTree(f):
+    data = {};
+    r_version(f);
+    for i in range(3):
+        data['Frequency_'+str(i)] = r_float(f);
+        data['FrequencyWindFactor_'+str(i)] = r_float(f);
+        data['PowerXY_'+str(i)] = r_float(f);
+        data['PowerZ_'+str(i)] = r_float(f);
+        data['Bias_'+str(i)] = r_float(f);
+    data['SpecularLighting'] = r_bool(f);
+
+    data['NelType'] = 'CMeshVPWindTree';
+    return data;
+
+#!!TODO: check which CRdrPass this was (there are several defined as subclasses!!
+def parse_CRdrPass(f):
+    data = {};
+    r_version(f);
+    data['MaterialId'] = r_uint32(f);
+    data['PBlock'] = parse_CIndexBuffer(f);
+
+    data['NelType'] = 'CRdrPass';
+    return data;
+
+
+def parse_CMatrixBlock(f):
+    data = {};
+    r_version(f);
+    data['MatrixId'] = [r_uint32(f) for i in range(16)];
+    data['NumMatrix'] = r_uint32(f);
+    data['RdrPass'] = parse_cont(f, parse_CRdrPass);
+
+    data['NelType'] = 'CMatrixBlock';
+    return data;
+
+
+def parse_CAABBox(f):
+    data = {};
+    r_version(f);
+    data['Center'] = r_Vec3f(f);
+    data['HalfSize'] = r_Vec3f(f);
+
+    data['NelType'] = 'CAABBox';
+    return data;
+
+# CMRMWedgeGeom::serial(...) (nel/3d/mrm_mesh.h)
+def parse_CMRMWedgeGeom(f):
+    data = {};
+
+    data['Start'] = r_uint32(f);
+    data['End'] = r_uint32(f);
+    
+    data['NelType'] = 'CMRMWedgeGeom';
+    return data;
+
+
+#CMeshMRMSkinnedGeom::CPackedVertexBuffer::CPackedVertex::serial
+# each packed vertex is a version byte followed by sint16 X, Y, Z, Nx, Ny, Nz, U, V and the
+# uint8 Matrices[4] and Weights[4] (stored interleaved)
+STRUCT_PACKEDVERTEX = struct.Struct('<B8h8B');
+PackedVertexDType = numpy.dtype([('Version', 'u1'), ('Position', '<i2', (3,)), ('Normal', '<i2', (3,)), ('UV', '<i2', (2,)),
+                                 ('Matrices_Weights', 'u1', (NL3D_MESH_MRM_SKINNED_MAX_MATRIX, 2))]) if numpy is not None else None;
+
+# reads num packed vertices in one step and returns them as rows (see read_CVertexBuffer_Subset)
+# of 'Position', 'Normal', 'UV' (int16) and 'Matrix', 'Weight' (uint8)
+def parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer_CPackedVertices(f, num):
+    data = {};
+    blockSize = num * STRUCT_PACKEDVERTEX.size;
+    if numpy is not None:
+        records = numpy.frombuffer(f.buf, PackedVertexDType, num, f.pos);
+        if (records['Version'] == 0xFF).any():
+            error("CPackedVertex with 32 bit version not supported");
+        data['Position'] = records['Position'];
+        data['Normal'] = records['Normal'];
+        data['UV'] = records['UV'];
+        data['Matrix'] = records['Matrices_Weights'][:, :, 0];
+        data['Weight'] = records['Matrices_Weights'][:, :, 1];
+    else:
+        records = list(STRUCT_PACKEDVERTEX.iter_unpack(memoryview(f.buf)[f.pos:f.pos + blockSize]));
+        if any(rec[0] == 0xFF for rec in records):
+            error("CPackedVertex with 32 bit version not supported");
+        data['Position'] = [rec[1:4] for rec in records];
+        data['Normal'] = [rec[4:7] for rec in records];
+        data['UV'] = [rec[7:9] for rec in records];
+        data['Matrix'] = [rec[9:17:2] for rec in records];
+        data['Weight'] = [rec[10:17:2] for rec in records];
+    f.skip(blockSize);
+
+    data['NelType'] = 'CMeshMRMSkinnedGeom::CPackedVertexBuffer::CPackedVertex';
+    return data;
+
+#CMeshMRMSkinnedGeom::CPackedVertexBuffer::serial(...)
+def parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer(f):
+    data = {};
+    r_version(f);
+
+    numVertices = r_uint32(f);
+    if f.wants('Geometry'):
+        data['_PackedBuffer'] = parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer_CPackedVertices(f, numVertices);
+    else:
+        data['_PackedBuffer'] = None;
+        f.skip(numVertices * STRUCT_PACKEDVERTEX.size);
+    data['_DecompactScale'] = r_float(f);
+    
+    data['NelType'] = 'CMeshMRMSkinnedGeom::CPackedVertexBuffer';
+    return data;
+
+
+#CMeshMRMSkinnedGeom::CRdrPass::serial(...) (mesh_mrm_skinned.h)
+def parse_CMeshMRMSkinnedGeom_CRdrPass(f):
+    data = {};
+    r_version(f);
+
+    data['MaterialId'] = r_uint32(f);
+    data['PBlock'] = parse_cont_array(f, 'H') if f.wants('Geometry') else skip_cont(f, 2);
+
+    data['NelType'] = 'CMeshMRMSkinnedGeom::CRdrPass';
+    return data;
+
+# reads the geomorphs and skinning data that CMeshMRMSkinnedGeom::CLod and CMeshMRMGeom::CLod
+# have in common into the given lod dict
+def read_CMeshMRMGeom_CLod_Skinning(f, data):
+    if not f.wants('Geometry'):
+        data['Geomorphs'] = skip_cont(f, 8); # CMRMWedgeGeom: Start, End
+        data['MatrixInfluences'] = skip_cont(f, 4);
+        data['InfluencedVertices'] = [skip_cont(f, 4) for i in range(NL3D_MESH_SKINNING_MAX_MATRIX)];
+        return;
+    data['Geomorphs'] = parse_cont(f, parse_CMRMWedgeGeom);
+    data['MatrixInfluences'] = parse_cont(f, r_uint32);
+    data['InfluencedVertices'] = [parse_cont(f, r_uint32) for i in range(NL3D_MESH_SKINNING_MAX_MATRIX)];
+
+#CMeshMRMSkinnedGeom::CLod::serial(...) (mesh_mrm_skinned.h)
+def parse_CMeshMRMSkinnedGeom_CLod(f):
+    data = {};
+    r_version(f);
+
+    data['NWedges'] = r_uint32(f);
+    data['RdrPass'] = parse_cont(f, parse_CMeshMRMSkinnedGeom_CRdrPass);
+    read_CMeshMRMGeom_CLod_Skinning(f, data);
+
+    data['NelType'] = 'CMeshMRMSkinnedGeom::CLod';
+    return data;
+
+#CShadowVertex::serial(...)  (shadow_skin.h)
+def parse_CShadowVertex(f):
+    data = {};
+    r_version(f);
+
+    data['Vertex'] = r_Vec3f(f);
+    data['MatrixId'] = r_uint32(f);
+
+    data['NelType'] = 'CShadowVertex';
+    return data;
+
+
+# reads the _ShadowSkin.Vertices and _ShadowSkin.Triangles (CShadowSkin) into the given dict
+def read_ShadowSkin(f, data):
+    if not f.wants('ShadowSkin'):
+        data['_ShadowSkin.Vertices'] = skip_cont(f, 17); # version byte, Vertex, MatrixId
+        data['_ShadowSkin.Triangles'] = skip_cont(f, 4);
+        return;
+    data['_ShadowSkin.Vertices'] = parse_cont(f, parse_CShadowVertex);
+    data['_ShadowSkin.Triangles'] = parse_cont(f, r_uint32);
+
+#CMeshMRMSkinnedGeom::serial
+def parse_CMeshMRMSkinnedGeom(f):
+    data = {};
+    r_version(f);
+
+    data['_BonesName'] = parse_cont(f, r_lstring);
+
+    data['_BBox'] = parse_CAABBox(f);
+    data['_LevelDetail.MaxFaceUsed'] = r_uint32(f);
+    data['_LevelDetail.MinFaceUsed'] = r_uint32(f);
+    data['_LevelDetail.DistanceFinest'] = r_float(f);
+    data['_LevelDetail.DistanceMiddle'] = r_float(f);
+    data['_LevelDetail.DistanceCoarsest'] = r_float(f);
+    data['_LevelDetail.OODistanceDelta'] = r_float(f);
+    data['_LevelDetail.DistancePow'] = r_float(f);
+
+    data['_VBufferFinal'] = parse_CMeshMRMSkinnedGeom_CPackedVertexBuffer(f);
+    read_ShadowSkin(f, data);
+
+    data['_Lods'] = parse_cont(f, parse_CMeshMRMSkinnedGeom_CLod);
+
+    data['NelType'] = 'CMeshMRMSSkinnedGeom';
+    return data;
+    
+
+# CMeshMRMGeom::CLodInfo::serial(...) from 'nel/3d/mesh_mrm.h'
+def parse_CMeshMRMGeom_CLodInfo(f):
+    data = {};
+    r_version(f);
+    data['StartAddWedge'] = r_uint32(f);
+    data['EndAddWedges'] = r_uint32(f);
+
+    data['NelType'] = 'CMeshMRMGeom::CLodInfo';
+    return data;
+
+# CMeshMRMGeom::CVertexBlock
+def parse_CMeshMRMGeom_CVertexBlock(f):
+    # (VertexStart, NVertices)
+    return (r_uint32(f), r_uint32(f));
+    
+
+def parse_CMeshMRMGeom_CRdrPass(f):
+    data = {};
+    r_version(f);
+
+    data['MaterialId'] = r_uint32(f);
+    data['PBlock'] = parse_CIndexBuffer(f);
+
+    data['NelType'] = 'CMeshMRMGeom::CRdrPass';
+    return data;
+
+
+# CMeshMRMGeom::CLod::serial(NLMISC::IStream &f) from '3d/mesh_mrm.cpp'
+def parse_CMeshMRMGeom_CLod(f):
+    data = {}
+    ver = r_version(f);
+    
+    data['NWedges'] = r_uint32(f);
+    data['RdrPass'] = parse_cont(f, parse_CMeshMRMGeom_CRdrPass);
+    read_CMeshMRMGeom_CLod_Skinning(f, data);
+
+    print(data['NWedges']);
+    
+    if (ver >= 1):
+        data['SkinVertexBlocks'] = parse_cont(f, parse_CMeshMRMGeom_CVertexBlock) if f.wants('Geometry') else skip_cont(f, 8);
+    else:
+        print("WARNING: building SkinVertexBlocks in parse_CMeshMRMGeom_CLod not yet implemented!");
+
+    data['NelType'] = 'CMeshMRMGeom::CLod';
+    return data;
+
+
+# skips a CMeshMRMGeom::CLod by reading it without its geometry
+def skip_CMeshMRMGeom_CLod(f):
+    sections = f.sections;
+    f.sections = set(NEL_SECTIONS if sections is None else sections) - set(['Geometry']);
+    try:
+        parse_CMeshMRMGeom_CLod(f);
+    finally:
+        f.sections = sections;
+
+
+# reads only the lod lodIdx (indexed like a list: 0 is the coarsest and -1 the finest lod)
+# of a CMeshMRMGeom by seeking to the LodOffset of the lods. The vertices used by a lod are
+# added by all lods up to it so the lods before are read for their vertex data only. The
+# other entries in data['_Lods'] are None. The stream is left after the read lod (the
+# CMeshMRMGeom is the last part of a CMeshMRM so nothing else has to be read after it).
+def read_CMeshMRMGeom_SingleLod(f, data, lodIdx):
+    lodInfos = data['_LodInfos'];
+    if not -len(lodInfos) <= lodIdx < len(lodInfos):
+        error("CMeshMRMGeom has no lod %d (it has %d lods)" % (lodIdx, len(lodInfos)));
+    lodIdx = lodIdx % len(lodInfos);
+
+    data['_Lods'] = [None] * len(lodInfos);
+    for i in range(lodIdx + 1):
+        f.seek(lodInfos[i]['LodOffset']);
+        if i == lodIdx:
+            data['_Lods'][i] = parse_CMeshMRMGeom_CLod(f);
+        else:
+            skip_CMeshMRMGeom_CLod(f);
+        read_CMeshMRMGeom_serialLodVertexData(f, lodInfos[i]['StartAddWedge'], lodInfos[i]['EndAddWedges'], data);
+
+
+# CMeshMRMGeom::serialLodVertexData(NLMISC::IStream &f, uint startWedge, uint endWedge) from '3d/mesh_mrm.cpp'
+def read_CMeshMRMGeom_serialLodVertexData(f, startWedge, endWedge, data):
+    ver = r_version(f);
+
+    read_CVertexBuffer_Subset(f, startWedge, endWedge, data['_VBufferFinal']);
+
+    if data['_Skinned'] and ver < 1:
+        error('Skinned CMeshMRMGeom not yet implemented');
+    
+
+# CMeshMRMGeom::load(...) '3d/mesh_mrm.cpp'
+def parse_CMeshMRMGeom(f):
+    data = {};
+
+    #CMeshMRMGeom::loadHeader(...)
+    hver = r_version(f);
+    data['_BonesName'] = parse_cont(f, r_lstring) if (hver >= 3) else [];
+    data['_MeshVertexProgram'] = parse_PolyPtr(f) if (hver >= 2) else None;
+    data['_MeshMorpher'] = parse_CMeshMorpher(f) if (hver >= 1) else None;
+    
+    data['_Skinned'] = r_bool(f);
+    data['_BBox'] = parse_CAABBox(f);
+    data['_LevelDetail.MaxFaceUsed'] = r_uint32(f);
+    data['_LevelDetail.MinFaceUsed'] = r_uint32(f);
+    data['_LevelDetail.DistanceFinest'] = r_float(f);
+    data['_LevelDetail.DistanceMiddle'] = r_float(f);
+    data['_LevelDetail.DistanceCoarsest'] = r_float(f);
+    data['_LevelDetail.OODistanceDelta'] = r_float(f);
+    data['_LevelDetail.DistancePow'] = r_float(f);
+
+    data['_LodInfos'] = parse_cont(f, parse_CMeshMRMGeom_CLodInfo);
+
+    nWedges = r_uint32(f);
+
+    data['_VBufferFinal'] = {'NelType':"CVertexBuffer"};
+    read_CVertexBuffer_Header(f, data['_VBufferFinal']);
+
+    if (hver >= 4):
+        data['_SkinWeights'] = parse_cont(f, parse_CMesh_CSkinWeight) if f.wants('Geometry') else skip_cont(f, 8 * NL3D_MESH_SKINNING_MAX_MATRIX);
+    else:
+        data['_SkinWeights'] = [];
+
+    if (hver >= 5):
+        read_ShadowSkin(f, data);
+
+    # this computes some absolute offset ?? directly taken from the code; not sure yet what this does
+    startPos = f.tell();
+    for lodInfo in data['_LodInfos']:
+        lodInfo['LodOffset'] = startPos + r_int32(f);
+
+    # finished CMeshMRMGeom::loadHeader(...)
+
+    # next we read all the Lod:
+    if f.mrmLod is not None:
+        read_CMeshMRMGeom_SingleLod(f, data, f.mrmLod);
+    else:
+        data['_Lods'] = [];
+        for lodInfo in data['_LodInfos']:
+            data['_Lods'].append(parse_CMeshMRMGeom_CLod(f));
+            read_CMeshMRMGeom_serialLodVertexData(f, lodInfo['StartAddWedge'], lodInfo['EndAddWedges'], data);
+
+    data['NelType'] = 'CMeshMRMGeom';
+    return data;
+
+def parse_CMeshGeom(f):
+    data = {}
+    ver = r_version(f);
+    #print(" CMeshGeom ver = %d" % ver);
+
+    data['_BonesName'] = []
+    if (ver >= 4):
+        numBoneNames = r_uint32(f);
+        for i in range(0, numBoneNames):
+            data['_BonesName'].append(r_lstring(f));
+            print("   read a BoneName: " + str(data['_BonesName'][-1]));
+
+    data['_MeshVertexProgram'] = parse_PolyPtr(f) if (ver >= 3) else None;
+    data['_MeshMorpher'] = parse_CMeshMorpher(f) if (ver >= 1) else None;
+    data['_VBuffer'] = parse_CVertexBuffer(f);
+    data['_MatrixBlocks'] = parse_cont(f, parse_CMatrixBlock);
+    data['_BBox'] = parse_CAABBox(f);
+    data['_Skinned'] = r_bool(f);
+    data['NelType'] = 'CMeshGeom';
+    return data;
+
+
+# CMesh::CSkinWeight::serial(...)
+def parse_CMesh_CSkinWeight(f):
+    data = {};
+
+    data['MatrixId_Weights'] = [(r_uint32(f), r_float(f)) for i in range(NL3D_MESH_SKINNING_MAX_MATRIX)];
+
+    data['NelType'] = 'CMesh::CSkinWeight';
+    return data;
+
+
+def parse_CMesh(f):
+    ver = r_version(f);
+    data = parse_CMeshBase(f);
+    data['_MeshGeom'] = parse_CMeshGeom(f);
+
+    data['NelType'] = 'CMesh';
+    return data;
+
+
+def parse_CMeshMRMSkinned(f):
+    r_version(f);
+    data = parse_CMeshBase(f);
+
+    data['_MeshMRMGeom'] = parse_CMeshMRMSkinnedGeom(f);
+    data['NelType'] = 'CMeshMRMSkinned';
+    return data;
+    
+
+# CMeshMRM::serial '3d/mesh_mrm.cpp'
+def parse_CMeshMRM(f):
+    ver = r_version(f);
+    data = parse_CMeshBase(f);
+    data['_MeshMRMGeom'] = parse_CMeshMRMGeom(f);
+
+    data['NelType'] = 'CMeshMRM';
+    return data;
+
+
+
+
+def parse_CTextureMultiFile(f):
+    r_version(f);
+    data = parse_ITexture(f);
+    data['_FileNames'] = parse_cont(f, r_lstring);
+    data['_CurrSelectedTexture'] = r_uint32(f);
+    
+    data['NelType'] = 'CTextureMultiFile';
+    return data;
+    
+
+def parse_CMeshSlot(f):
+    data = {};
+    r_version(f);
+
+    data['MeshGeom'] = parse_PolyPtr(f);
+    data['A'] = r_float(f);
+    data['B'] = r_float(f);
+    data['DistMax'] = r_float(f);
+    data['EndPolygonCount'] = r_float(f);
+    data['BlendLength'] = r_float(f);
+    data['Flags'] = r_uint8(f);
+
+    data['NelType'] = 'CMeshSlot';
+    return data;
+
+def parse_CMeshMultiLod(f):
+    r_version(f);
+    data = parse_CMeshBase(f);
+    data['_StaticLod'] = r_bool(f);
+    data['_MeshVector'] = parse_cont(f, parse_CMeshSlot);
+    
+    data['NelType'] = 'CMeshMultiLod';
+    return data;
+
+
+
+def parse_CBoneBase(f):
+    data = {};
+    ver = r_version(f);
+
+    data['Name'] = r_lstring(f);
+
+    data['InvBindPos'] = parse_CMatrix(f);
+    data['FatherId'] = r_int32(f);
+    data['UnheritScale'] = r_bool(f);
+    data['LodDisableDistance'] = r_float(f) if ver >= 1 else 0.0;
+    data['DefaultPos'] = versioned(r_Vec3f, f);
+    data['DefaultRotEuler'] = versioned(r_Vec3f, f);
+    data['DefaultRotQuat'] = versioned(r_Vec4f, f);
+    data['DefaultScale'] = versioned(r_Vec3f, f);
+    data['DefaultPivot'] = versioned(r_Vec3f, f);
+    data['SkinScale'] = r_Vec3f(f) if ver >= 2 else (1.0, 1.0, 1.0);
+
+    print("Loaded : "+ data['Name'] + "  DefaultRotQuat = " + str(data['DefaultRotQuat']) );
+    
+    data['NelType'] = 'CBoneBase';
+    return data;
+
+
+def parse_CSkeletonShapeCLod(f):
+    data = {};
+    r_version(f);
+    data['Distance'] = r_float(f);
+    data['ActiveBones'] = parse_cont(f, r_uint8);
+
+    data['NelType'] = 'CSkeletonShapeCLod';
+    return data;
+   
+
+def parse_CSkeletonShape(f):
+    data = {};
+    ver = r_version(f);
+
+    data['_Bones'] = parse_cont(f, parse_CBoneBase);
+    data['_BoneMap'] = parse_map(f, r_lstring, r_uint32, 'std::map<std::string, uint32>');
+    #print(data['_BoneMap']);
+
+    if (ver >= 1):
+        data['_Lods'] = parse_cont(f, parse_CSkeletonShapeCLod);
+    else:
+        print("WARNING: parse_CSkeletonShape for old version (< 1) not yet fully implemented!");
+        data['_Lods'] = [{}];
+        data['_Lods'][0]['Distance'] = 0;
+        #data['_Lods'][0]['ActiveBones'] = ?? !!TODO
+
+    data['NelType'] = 'CSkeletonShape';
+    return data;
+
+
+# implements 'template<class T> class CKey ::serial(...)' from nel/3d/key.h
+def parse_CKey(f, Type_ParseFunc):
+    r_version(f);
+    return Type_ParseFunc(f);
+
+# implements 'template<class T> class CKeyTCB : public CKey<T> ::serial(...)' from nel/3d/key.h
+def parse_CKeyTCB(f, Type_ParseFunc):
+    r_version(f);
+    data = {};
+    data['Value'] = Type_ParseFunc(f);
+    data['Tension'] = r_float(f);
+    data['Continuity'] = r_float(f);
+    data['Bias'] = r_float(f);
+    data['EaseTo'] = r_float(f);
+    data['EaseFrom'] = r_float(f);
+    return data;
+
+# implements 'template<class CKeyT> class ITrackKeyFramer::serial' from nel/3d/track_keyframer.h
+def parse_ITrackKeyFramer(f, nelCTrackKeyFramer_TypeName, nelKey_TypeName, fCKey_ParseFunc, fKeyType_ParseFunc):
+    #print("Called parse_ITrackKeyFramer");
+    data = {};
+
+    r_version(f);
+
+    # parse the map of CKey values (specified by Type_ParseFunc for internal data)
+    data['NelCKeyType'] = nelKey_TypeName; # this is stored to later identify the values stored in the key map
+    data['_MapKey'] = {};
+    numElements = r_uint32(f);
+    for i in range(numElements):
+        key = r_float(f);
+        mat = fCKey_ParseFunc(f, fKeyType_ParseFunc);
+        data['_MapKey'][key] = mat;
+
+    #print(data['NelCKeyType']);
+    #print(data['_MapKey']);
+
+    data['_RangeLock'] = r_bool(f);
+    data['_RangeBegin'] = r_float(f);
+    data['_RangeEnd'] = r_float(f);
+    data['_LoopMode'] = r_bool(f);
+
+    data['NelType'] = nelCTrackKeyFramer_TypeName;
+    return data;
+
+
+# CTrackSampledCommon::CTimeBlock 'nel/3d/track_sampled_common.h'
+def parse_CTrackSampledCommon_CTimeBlock(f):
+    data = {};
+    r_version(f);
+    data['TimeOffset'] = r_uint16(f);
+    data['KeyOffset'] = r_uint32(f);
+    data['Times'] = parse_cont_array(f, 'B');
+
+    data['NelType'] = 'CTrackSampledCommon::CTimeBlock';
+    return data;
+  
+# CQuatPack from 'nel/3d/track_sampled_quat.h'
+# Note: we unpack them here already
+def parse_CQuatPack(f):
+    # x y z w
+    x = r_int16(f);
+    y = r_int16(f);
+    z = r_int16(f);
+    w = r_int16(f);
+    return unpack_CQuatPack((x, y, z, w));
+
+# returns the normalized quaternion as (w, x, y, z) tuple (the order of mathutils.Quaternion(...))
+def unpack_CQuatPack(quatpack):
+    x = quatpack[0] * NL3D_OO32767;
+    y = quatpack[1] * NL3D_OO32767;
+    z = quatpack[2] * NL3D_OO32767;
+    w = quatpack[3] * NL3D_OO32767;
+
+    length = math.sqrt(x*x + y*y + z*z + w*w);
+    if length == 0.0:
+        return (1.0, 0.0, 0.0, 0.0);
+    return (w / length, x / length, y / length, z / length);
+
+# unpacks all keys of a CTrackSampledQuat at once from the flat int16 (x, y, z, w) values;
+# returns the normalized quaternions as (numKeys, 4) rows in (w, x, y, z) order (see unpack_CQuatPack)
+def unpack_CQuatPacks(packed):
+    if numpy is not None:
+        quats = numpy.asarray(packed, numpy.float64).reshape(-1, 4)[:, [3, 0, 1, 2]] * NL3D_OO32767;
+        lengths = numpy.sqrt((quats * quats).sum(axis=1));
+        zero = (lengths == 0.0);
+        lengths[zero] = 1.0;
+        quats /= lengths[:, numpy.newaxis];
+        quats[zero] = (1.0, 0.0, 0.0, 0.0);
+        return quats;
+    return [unpack_CQuatPack(quatpack) for quatpack in zip(packed[0::4], packed[1::4], packed[2::4], packed[3::4])];
+
+
+def _CTrackSampledCommon_serialCommon(f, data):
+    # Note: for compatibility with CTrackSampledQuat.serial the r_version is skipped here and expected to be done by the caller
+    data['_LoopMode'] = r_bool(f);
+    data['_BeginTime'] = r_float(f);
+    data['_EndTime'] = r_float(f);
+    data['_TotalRange'] = r_float(f);
+    data['_OOTotalRange'] = r_float(f);
+    data['_DeltaTime'] = r_float(f);
+    data['_OODeltaTime'] = r_float(f);
+    data['_TimeBlocks'] = parse_cont(f, parse_CTrackSampledCommon_CTimeBlock);
+
+# expands the _TimeBlocks into data['_KeyTimes'], the time (in seconds) of each of the numKeys keys:
+# the key KeyOffset + i of a time block is at _BeginTime + (TimeOffset + Times[i]) * _DeltaTime
+def read_CTrackSampledCommon_KeyTimes(data, numKeys):
+    if numpy is not None:
+        frames = numpy.zeros(numKeys, numpy.float64);
+        for timeBlock in data['_TimeBlocks']:
+            keyOffset = timeBlock['KeyOffset'];
+            frames[keyOffset:keyOffset + len(timeBlock['Times'])] = numpy.asarray(timeBlock['Times'], numpy.float64) + timeBlock['TimeOffset'];
+        data['_KeyTimes'] = data['_BeginTime'] + frames * data['_DeltaTime'];
+        return;
+
+    keyTimes = array.array('d', [0.0]) * numKeys;
+    beginTime = data['_BeginTime'];
+    deltaTime = data['_DeltaTime'];
+    for timeBlock in data['_TimeBlocks']:
+        keyOffset = timeBlock['KeyOffset'];
+        timeOffset = timeBlock['TimeOffset'];
+        keyTimes[keyOffset:keyOffset + len(timeBlock['Times'])] = array.array('d', [beginTime + (timeOffset + t) * deltaTime for t in timeBlock['Times']]);
+    data['_KeyTimes'] = keyTimes;
+
+    
+# CTrackSampledQuat from 'nel/3d/track_sampled_quat.h'
+def parse_CTrackSampledQuat(f):
+    data = {};
+    ver = r_version(f);
+    
+    if (ver >= 1): # the code then calls CTrackSampledCommon::serialCommon where the only difference is another serialVersion
+        r_version(f);
+
+    _CTrackSampledCommon_serialCommon(f, data);
+
+    # CQuatPack is a class {sint16 x,y,z,w;}; all keys are read as one int16 block and unpacked in bulk
+    numKeys = r_uint32(f);
+    data['_Keys'] = unpack_CQuatPacks(r_array(f, 'h', numKeys * 4));
+    read_CTrackSampledCommon_KeyTimes(data, numKeys);
+        
+    data['NelType'] = 'CTrackSampledQuat';
+    return data;
+    
+
+# CTrackSampledQuat from 'nel/3d/track_sampled_vector.h'
+def parse_CTrackSampledVector(f):
+    data = {};
+    ver = r_version(f);
+
+    r_version(f); # another r_version for the version stored in the 'serialCommon' part of this data
+    _CTrackSampledCommon_serialCommon(f, data);
+
+    data['_Keys'] = parse_cont(f, r_Vec3f); #this is an array of CVector
+    read_CTrackSampledCommon_KeyTimes(data, len(data['_Keys']));
+
+    data['NelType'] = 'CTrackSampledVector';
+    return data;
+
+# CSurfaceLightGrid::CCellCorner  'nel/3d/surface_light_grid.h'
+def parse_CSurfaceLightGrid_CCellCorner(f):
+    data = {};
+    ver = r_version(f);
+    
+    data['LocalAmbientId'] = r_uint8(f) if (ver >= 1) else 0xFF;
+    data['SunContribution'] = r_uint8(f);
+    data['Light'] = (r_uint8(f), r_uint8(f));
+
+    data['NelType'] = 'CSurfaceLightGrid::CCellCorner';
+    return data;
+
+# CSurfaceLightGrid::serial(...) from 'nel/3d/surface_light_grid.cpp'
+def parse_CSurfaceLightGrid(f):
+    data = {};
+    r_version(f);
+
+    data['Origin'] = r_Vec2f(f);
+    data['Width'] = r_uint32(f);
+    data['Height'] = r_uint32(f);
+    data['Cells'] = parse_cont(f, parse_CSurfaceLightGrid_CCellCorner);
+
+    data['NelType'] = 'CSurfaceLightGrid';
+    return data;
+
+# CIGSurfaceLight::CRetrieverLightGrid from 'nel/3d/ig_surface_light.h'
+def parse_CIGSurfaceLight_CRetrieverLightGrid(f):
+    data = {};
+    r_version(f);
+    
+    data['Grids'] = parse_cont(f, parse_CSurfaceLightGrid);
+
+    data['NelType'] = 'CRetrieverLightGrid';
+    return data;
+
+# skips a CSurfaceLightGrid (see parse_CSurfaceLightGrid) by reading only the versions and lengths
+def skip_CSurfaceLightGrid(f):
+    r_version(f);
+    f.skip(16); # Origin, Width, Height
+    numCells = r_uint32(f);
+    for i in range(numCells):
+        ver = r_version(f);
+        f.skip(4 if ver >= 1 else 3); # LocalAmbientId, SunContribution, Light
+
+# CIGSurfaceLight::serial(...) from 'nel/3d/ig_surface_light.cpp'
+def parse_CIGSurfaceLight(f):
+    data = {};
+    ver = r_version(f);
+
+    data['_CellSize'] = r_float(f);
+    data['_OOCellSize'] = r_float(f);
+
+    if (ver < 1):
+        data['_RetrieverGridMap'] = parse_map(f, r_lstring, parse_CIGSurfaceLight_CRetrieverLightGrid, 'TRetrieverGridMap'); 
+    else:
+        data['_RetrieverGridMap'] = parse_map(f, r_uint32, parse_CIGSurfaceLight_CRetrieverLightGrid, 'TRetrieverGridMap'); 
+
+    data['NelType'] = 'CIGSurfaceLight';
+    return data;
+
+def skip_CIGSurfaceLight(f):
+    ver = r_version(f);
+    f.skip(8); # _CellSize, _OOCellSize
+    numGrids = r_uint32(f);
+    for i in range(numGrids):
+        f.skip(r_uint32(f) if ver < 1 else 4); # key of the _RetrieverGridMap
+        r_version(f);
+        skip_cont(f, skip_CSurfaceLightGrid);
+    return None;
+
+# CPointLightNamedArray::CPointLightGroup(...) from 'nel/3d/point_light_named_array.h'
+def parse_CPointLightNamedArray_CPointLightGroup(f):
+    data = {};
+    r_version(f);
+    data['AnimationLight'] = r_lstring(f);
+    data['LightGroup'] = r_uint32(f);
+    data['StartId'] = r_uint32(f);
+    data['EndId'] = r_uint32(f);
+
+    data['NelType'] = 'CPointLightNamedArray::CPointLightGroup';
+    return data;
+    
+
+
+# reads the data from CPointLight into the given data dict (from 'src/3d/point_light.cpp')
+def read_CPointLight(f, data):
+    ver = r_version(f);
+
+    data['_AddAmbientWithSun'] = r_bool(f) if ver >= 2 else False;
+    data['_Type'] = r_enum(enum_CPointLight_TType, f) if ver >= 1 else enum_CPointLight_TType[0];
+    data['_SpotDirection'] = r_Vec3f(f) if ver >= 1 else (0,1,0);
+    data['_SpotAngleBegin'] = r_float(f) if ver >= 1 else math.pi/4;
+    data['_SpotAngleEnd'] = r_float(f) if ver >= 1 else math.pi/2;
+
+    data['_Position'] = r_Vec3f(f);
+    data['_Ambient'] = r_RGBA(f);
+    data['_Diffuse'] = r_RGBA(f);
+    data['_Specular'] = r_RGBA(f);
+    data['_AttenuationBegin'] = r_float(f);
+    data['_AttenuationEnd'] = r_float(f);
+
+
+# CPointLightNamed::serial(...) from 'src/3d/point_light_named.cpp'
+def parse_CPointLightNamed(f):
+    data = {};
+    ver = r_version(f);
+
+    read_CPointLight(f, data);
+
+    data['AnimatedLight'] = r_lstring(f);
+    data['_DefaultAmbient'] = r_RGBA(f);
+    data['_DefaultDiffuse'] = r_RGBA(f);
+    data['_DefaultSpecular'] = r_RGBA(f);
+
+    if (ver >= 1):
+        data['LightGroup'] = r_uint32(f);
+
+    data['NelType'] = 'CPointLightNamed';
+    return data;
+    
+
+# CPointLightNamedArray::serial(...) from 'nel/3d/point_light_named_array.h'
+def parse_CPointLightNamedArray(f):
+    data = {};
+    ver = r_version(f);
+
+    data['_PointLights'] = parse_cont(f, parse_CPointLightNamed);
+
+    if ver == 0:
+        error("Parsing old CPointLightNamedArray map not yet implemented");
+    else:
+        data['_PointLightGroupMap'] = parse_cont(f, parse_CPointLightNamedArray_CPointLightGroup);
+
+    data['NelType'] = 'CPointLightNamedArray';
+    return data;
+
+# skips a CPointLightNamed (see parse_CPointLightNamed and read_CPointLight)
+def skip_CPointLightNamed(f):
+    ver = r_version(f);
+    lightVer = r_version(f);
+    if (lightVer >= 2):
+        f.skip(1); # _AddAmbientWithSun
+    if (lightVer >= 1):
+        f.skip(24); # _Type, _SpotDirection, _SpotAngleBegin, _SpotAngleEnd
+    f.skip(32); # _Position, _Ambient, _Diffuse, _Specular, _AttenuationBegin, _AttenuationEnd
+    f.skip(r_uint32(f)); # AnimatedLight
+    f.skip(12); # _DefaultAmbient, _DefaultDiffuse, _DefaultSpecular
+    if (ver >= 1):
+        f.skip(4); # LightGroup
+
+def skip_CPointLightNamedArray_CPointLightGroup(f):
+    r_version(f);
+    f.skip(r_uint32(f)); # AnimationLight
+    f.skip(12); # LightGroup, StartId, EndId
+
+def skip_CPointLightNamedArray(f):
+    ver = r_version(f);
+    skip_cont(f, skip_CPointLightNamed);
+    if ver == 0:
+        error("Parsing old CPointLightNamedArray map not yet implemented");
+    skip_cont(f, skip_CPointLightNamedArray_CPointLightGroup);
+    return None;
+
+# CPortal::serial(...) from 'src/3d/portal.cpp'
+def parse_CPortal(f):
+    data = {};
+    version = r_version(f);
+
+    data['_LocalPoly'] = parse_cont(f, r_Vec3f);
+    data['_Name'] = r_lstring(f);
+
+    if (version >= 1):
+        data['_OcclusionModelId_str'] = r_lstring(f);
+        data['_OpenOcclusionModelId_str'] = r_lstring(f);
+
+    data['NelType'] = 'CPortal';
+    return data;
+
+def skip_CPortal(f):
+    version = r_version(f);
+    skip_cont(f, 12); # _LocalPoly
+    f.skip(r_uint32(f)); # _Name
+    if (version >= 1):
+        f.skip(r_uint32(f)); # _OcclusionModelId_str
+        f.skip(r_uint32(f)); # _OpenOcclusionModelId_str
+
+    
+# CCluster::serial(...) from 'nel/3d/cluster.cpp'
+def parse_CCluster(f):
+    data = {};
+
+    version = r_version(f);
+
+    data['Name'] = r_lstring(f) if (version >= 1) else "";
+    data['_LocalVolume'] = parse_cont(f, r_Vec4f); # CPlane type (plane.h) (as four floats)
+    data['_LocalBBox'] = parse_CAABBox(f);
+    data['FatherVisible'] = r_bool(f);
+    data['VisibleFromFather'] = r_bool(f);
+
+    if (version >= 2):
+        data['_SoundGroupId_str'] = r_lstring(f);
+        data['_EnvironmentFxId_str'] = r_lstring(f);
+
+    if (version >= 3):
+        data['AudibleFromFather'] = r_bool(f);
+        data['FatherAudible'] = r_bool(f);
+
+    data['NelType'] = 'CCluster';
+    return data;
+
+def skip_CCluster(f):
+    version = r_version(f);
+    if (version >= 1):
+        f.skip(r_uint32(f)); # Name
+    skip_cont(f, 16); # _LocalVolume
+    r_version(f);
+    f.skip(24); # _LocalBBox
+    f.skip(2); # FatherVisible, VisibleFromFather
+    if (version >= 2):
+        f.skip(r_uint32(f)); # _SoundGroupId_str
+        f.skip(r_uint32(f)); # _EnvironmentFxId_str
+    if (version >= 3):
+        f.skip(2); # AudibleFromFather, FatherAudible
+
+
+# CInstanceGroup::CInstance 'nel/3d/scene_group.h'
+def parse_CInstanceGroup_CInstance(f):
+    data = {};
+    version = r_version(f);
+
+    data['Visible'] = r_bool(f) if version >= 7 else True;
+    data['DontCastShadowForExterior'] = r_bool(f) if version >= 6 else False;
+    data['DontCastShadowForInterior'] = r_bool(f) if version >= 5 else False;
+    data['LocalAmbientId'] = r_uint8(f) if version >= 4 else 0xFF;
+    if (version >= 3):
+        data['AvoidStaticLightPreCompute'] = r_bool(f);
+        data['DontCastShadow'] = r_bool(f);
+        data['StaticLightEnabled'] = r_bool(f);
+        data['SunContribution'] = r_uint8(f);
+        data['Light'] = (r_uint8(f), r_uint8(f));
+    if (version >= 2):
+        data['InstanceName'] = r_lstring(f);
+        data['DontAddToScene'] = r_bool(f);
+    if (version >= 1):
+        data['Clusters'] = parse_cont(f, r_int32);
+
+    data['Name'] = r_lstring(f);
+    data['Pos'] = r_Vec3f(f);
+    data['Rot'] = r_Vec4f(f);
+    data['Scale'] = r_Vec3f(f);
+    data['nParent'] = r_int32(f);
+
+    data['NelType'] = 'CInstanceGroup::CInstance';
+    return data;
+
+
+# CInstanceGroup::serial(...) from 'nel/3d/scene_group.cpp'
+def parse_CInstanceGroup(f):
+    data = {};
+    ver = r_version(f);
+    
+    data['_RealTimeSunContribution'] = r_bool(f) if ver >= 5 else True;
+    if f.wants('IGLights'):
+        data['_IGSurfaceLight'] = parse_CIGSurfaceLight(f) if ver >= 4 else [];
+        data['_PointLightArray'] = parse_CPointLightNamedArray(f) if ver >= 3 else [];
+    else:
+        data['_IGSurfaceLight'] = skip_CIGSurfaceLight(f) if ver >= 4 else [];
+        data['_PointLightArray'] = skip_CPointLightNamedArray(f) if ver >= 3 else [];
+    data['_GlobalPos'] = r_Vec3f(f) if ver >= 2 else (0,0,0);
+
+    if (ver >= 1 and f.wants('IGClusters')):
+        data['_ClusterInfos'] = parse_cont(f, parse_CCluster);
+        data['_Portals'] = parse_cont(f, parse_CPortal);
+
+        for i in range(len(data['_ClusterInfos'])):
+            nNbPortals = r_uint32(f);
+            for j in range(nNbPortals):
+                nPortalNb = r_int32(f);
+                #!!TODO: actually set the data here (if it is needed); currently ignored
+    elif (ver >= 1):
+        numClusters = r_uint32(f);
+        for i in range(numClusters):
+            skip_CCluster(f);
+        skip_cont(f, skip_CPortal);
+        for i in range(numClusters):
+            skip_cont(f, 4); # the portal ids of the cluster
+        data['_ClusterInfos'] = None;
+        data['_Portals'] = None;
+
+
+    data['_InstancesInfos'] = parse_cont(f, parse_CInstanceGroup_CInstance);
+
+    data['NelType'] = 'CInstanceGroup';
+    return data;
+
+
+def parse_map(f, key_func, parse_func, typeName):
+    data = {};
+    numElements = r_uint32(f);
+
+    for i in range(numElements):
+        key = key_func(f);
+        mat = parse_func(f);
+        data[key] = mat;
+
+    data['NelType'] = typeName;
+    return data;
+
+
+def parse_cont(f, parse_func):
+    data = [];
+    num = r_uint32(f);
+    for i in range(0, num):
+        data.append(parse_func(f));
+    return data;
+
+
+# skips a container of fixed size elements (elementSize bytes each) or of elements
+# that are skipped by the given skip function; always returns None
+def skip_cont(f, elementSize):
+    num = r_uint32(f);
+    if callable(elementSize):
+        for i in range(0, num):
+            elementSize(f);
+    else:
+        f.skip(num * elementSize);
+    return None;
+
+
+def parse_ptr(f, parse_func):
+    node = r_uint64(f);
+    #print("Node in parse_ptr: " + str(node));
+    if (node == 0):
+        return None;
+    if (node in f.streamIDMap):
+        f.stats['NumPtrShared'] += 1;
+        return f.streamIDMap[node];
+
+    f.stats['NumPtr'] += 1;
+    f.streamIDMap[node] = parse_func(f);
+    return f.streamIDMap[node];
+    
+
+def parse_PolyPtr(f):
+    node = r_uint64(f);
+    #print('node = %d' % node);
+    if (node == 0):
+        return None;
+
+    if (node in f.streamIDMap):
+        f.stats['NumPtrShared'] += 1;
+        return f.streamIDMap[node];
+
+    className = r_lstring(f);
+    f.stats['NumPtr'] += 1;
+    f.stats['ClassCounts'][className] = f.stats['ClassCounts'].get(className, 0) + 1;
+
+    if className == 'CMesh':
+        f.streamIDMap[node] = parse_CMesh(f);
+    elif className == 'CMeshMultiLod':
+        f.streamIDMap[node] = parse_CMeshMultiLod(f);
+    elif className == 'CMeshMRM':
+        f.streamIDMap[node] = parse_CMeshMRM(f);
+    elif className == 'CMeshMRMSkinned':
+        f.streamIDMap[node] = parse_CMeshMRMSkinned(f);
+    elif className == 'CTextureFile':
+        f.streamIDMap[node] = parse_CTextureFile(f);
+    elif className == 'CTextureMultiFile':
+        f.streamIDMap[node] = parse_CTextureMultiFile(f);
+    elif className == 'CMeshGeom':
+        f.streamIDMap[node] = parse_CMeshGeom(f);
+    elif className == 'CMeshVPWindTree':
+        f.streamIDMap[node] = parse_CMeshVPWindTree(f);
+    elif className == 'CTextureCube':
+        f.streamIDMap[node] = parse_CTextureCube(f);
+    elif className == 'CSkeletonShape':
+        f.streamIDMap[node] = parse_CSkeletonShape(f);
+
+    elif className == 'CTrackSampledQuat':
+        f.streamIDMap[node] = parse_CTrackSampledQuat(f);
+    elif className == 'CTrackSampledVector':
+        f.streamIDMap[node] = parse_CTrackSampledVector(f);
+
+    # Animation Track Classes: see 'nel/3d/track_keyframer.h'
+    elif className == 'CTrackKeyFramerLinearQuat':
+        f.streamIDMap[node] = parse_ITrackKeyFramer(f, 'CTrackKeyFramerLinearQuat', 'CKeyQuat', parse_CKey, r_Vec4f); # reads quaternions as Vec4f
+    elif className == 'CTrackKeyFramerLinearVector':
+        f.streamIDMap[node] = parse_ITrackKeyFramer(f, 'CTrackKeyFramerLinearVector', 'CKeyVector', parse_CKey, r_Vec3f);
+    elif className == 'CTrackKeyFramerTCBQuat':
+        f.streamIDMap[node] = parse_ITrackKeyFramer(f, 'CTrackKeyFramerTCBQuat', 'CKeyTCBQuat', parse_CKeyTCB, r_Vec4f);
+
+    elif className == 'CTrackDefaultVector':
+        f.streamIDMap[node] = parse_CTrackDefaultVector(f);
+    elif className == 'CTrackDefaultQuat':
+        f.streamIDMap[node] = parse_CTrackDefaultQuat(f);
+
+    else:
+        error("Unsuported PolyPtr node = " + str(node) + " className = " + str(className));
+        return None;
+
+    return f.streamIDMap[node];
+
+# reading in a file where magic == b'NEL_ANIM' and returning a 'CAnimation' data object
+def parse_CAnimation(f):
+    data = {};
+
+    version = r_version(f);
+    data['_Name'] = r_lstring(f);
+    # NeL applies the AnimHeaderCompression only at runtime (when a CAnimationSet is built), so a
+    # serialized animation (also one inside an animation set) always stores its own _IdByName
+    data['_IdByName'] = parse_map(f, r_lstring, r_uint32, 'TMapStringUInt');
+    data['_TrackVector'] = parse_cont(f, parse_PolyPtr);
+
+    data['_MinEndTime'] = r_float(f) if version >= 1 else -FLT_MAX;
+
+    if (version >= 2):
+        data['_SSSShapes'] = parse_cont(f, r_lstring);
+
+    data['NelType'] = "CAnimation";
+    return data;
+
+# an animation in an animation set: like in a .anim file CAnimation::serial starts with the 'NEL_ANIM' magic
+def parse_CAnimationSet_CAnimation(f):
+    magic = bytes(f.read(8));
+    if magic != b'NEL_ANIM':
+        error("Invalid animation magic in animation set: " + str(magic));
+    return parse_CAnimation(f);
+
+def parse_CAnimationSet_CAnimationPtr(f):
+    return parse_ptr(f, parse_CAnimationSet_CAnimation);
+
+# CSkeletonWeight::CNode from 'nel/3d/skeleton_weight.h'
+def parse_CSkeletonWeight_CNode(f):
+    data = {};
+    r_version(f);
+    data['Name'] = r_lstring(f);
+    data['Weight'] = r_float(f);
+    data['NelType'] = 'CSkeletonWeight::CNode';
+    return data;
+
+# CSkeletonWeight from 'nel/3d/skeleton_weight.h'
+def parse_CSkeletonWeight(f):
+    data = {};
+    r_version(f);
+    data['_Elements'] = parse_cont(f, parse_CSkeletonWeight_CNode);
+    data['NelType'] = 'CSkeletonWeight';
+    return data;
+
+def parse_CSkeletonWeightPtr(f):
+    return parse_ptr(f, parse_CSkeletonWeight);
+
+# reading in a file where magic == b'NEL_ANIM_SET' and returning a 'CAnimationSet' data object
+# ('nel/3d/animation_set.h'); the NelName of each animation is its name in the set and
+# _ChannelName (version >= 1) holds the channel names indexed by the ids of _ChannelIdByName
+def parse_CAnimationSet(f):
+    data = {};
+
+    version = r_version(f);
+    data['_Animation'] = parse_cont(f, parse_CAnimationSet_CAnimationPtr);
+    data['_SkeletonWeight'] = parse_cont(f, parse_CSkeletonWeightPtr);
+    data['_AnimationName'] = parse_cont(f, r_lstring);
+    data['_SkeletonWeightName'] = parse_cont(f, r_lstring);
+    data['_ChannelIdByName'] = parse_map(f, r_lstring, r_uint32, 'TMapStringUInt');
+    data['_AnimationIdByName'] = parse_map(f, r_lstring, r_uint32, 'TMapStringUInt');
+    data['_SkeletonWeightIdByName'] = parse_map(f, r_lstring, r_uint32, 'TMapStringUInt');
+    if (version >= 1):
+        data['_ChannelName'] = parse_cont(f, r_lstring);
+
+    for animIdx, animdata in enumerate(data['_Animation']):
+        if animdata is not None and 'NelName' not in animdata:
+            animdata['NelName'] = data['_AnimationName'][animIdx] if animIdx < len(data['_AnimationName']) else animdata['_Name'];
+    helper_shareAnimationHeaders(data);
+
+    data['NelType'] = "CAnimationSet";
+    return data;
+
+# the animations of a set carry their own name -> track id table (_IdByName); all animations
+# with an identical table share one dict so the table only has to be resolved once for the
+# whole set (see convert_NelAnimationSet_to_BlenderActions in import_nel3d.py).
+# The set-wide _ChannelIdByName must not replace these tables: it maps to the channel ids
+# of the set, not to the track indices of an animation. NeL only rewrites the animations
+# to channel ids (AnimHeaderCompression) at runtime, so serialized animations always
+# store their own _IdByName.
+def helper_shareAnimationHeaders(animSet):
+    headers = {};
+    for animdata in animSet['_Animation']:
+        if animdata is None:
+            continue;
+        idByName = animdata['_IdByName'];
+        animdata['_IdByName'] = headers.setdefault(tuple(sorted(idByName.items())), idByName);
+
+
+
+# loads the given NeL file; when a cache (see nel3d_cache.NelParseCache) is given the
+# parsed data is taken from (or stored into) this cache; sections can be a set of
+# NEL_SECTIONS to load only these parts (see NelLoadContext.wants) and mrmLod the
+# index of the only CMeshMRMGeom lod to load (0: coarsest, -1: finest; see
+# read_CMeshMRMGeom_SingleLod); such partial loads are never cached
+def load_NEL_file(fullFilePath, cache = None, sections = None, mrmLod = None):
+    if not os.path.exists(fullFilePath):
+        error("Could not load file %r" % fullFilePath);
+    if cache is not None and sections is None and mrmLod is None:
+        return cache.load(fullFilePath);
+    f = NelLoadContext.fromFile(fullFilePath);
+    f.sections = sections;
+    f.mrmLod = mrmLod;
+    return load_NEL_stream(f);
+
+
+# parses the NeL file held by the given NelLoadContext; after loading f.stats contains
+# the statistics of this load
+def load_NEL_stream(f):
+    startTime = time.time();
+    try:
+        name = f.name;
+    
+        # read the first 3 'magic' 32 bits
+        magic0 = f.buf[0:4];
+        magic1 = f.buf[4:8];
+        magic2 = f.buf[8:12];
+
+        if magic0 == b'SHAP':
+            f.skip(4); # skip magic
+            meshdata = parse_PolyPtr(f);
+            meshdata['NelName'] = name;
+            return meshdata;
+        elif magic0 == b'NEL_' and magic1 == b'ANIM' and magic2 == b'_SET':
+            f.skip(12); # skip magic
+            animset = parse_CAnimationSet(f);
+            animset['NelName'] = name;
+            return animset;
+        elif magic0 == b'NEL_' and magic1 == b'ANIM':
+            f.skip(8); # skip magic
+            animdata = parse_CAnimation(f);
+            animdata['NelName'] = name;
+            return animdata;
+        elif magic0 == b'GRPT':
+            f.skip(4); # skip magic
+            igroup = parse_CInstanceGroup(f);
+            igroup['NelName'] = name;
+            return igroup;
+        else:
+            error("Unsupported NEL file format magic = " + str(magic0) + "; only 'SHAP' and 'NEL_ANIM' file are currently supported.");
+        
+
+        return None;
+    finally:
+        f.stats['ParseTime'] = time.time() - startTime;
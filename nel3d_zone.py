@@ -0,0 +1,128 @@
+#-------------------------------------------------------------------------------
+# NeL 3D Blender Importer - spatial index of instance groups
+#
+#-------------------------------------------------------------------------------
+#
+# ***** begin GPL LICENSE BLOCK *****
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ***** END GPL LICENCE BLOCK *****
+#
+#-------------------------------------------------------------------------------
+#
+# Collects the instances of many instance groups (*.ig files of a
+# Ryzom region) in a grid over their world positions (the '_GlobalPos'
+# of the group plus the 'Pos' of the instance) so that only the
+# instances inside an area of interest have to be imported. The .ig
+# files are only scanned: the lights, clusters and portals are skipped
+# in the stream and only the name and the placement of each instance
+# are kept in the index. Usage:
+#
+#   index = NelInstanceIndex();
+#   index.scanInstanceGroups(["path/to/region/igs"]);
+#   instances = index.queryRadius((x, y), 200.0);
+#
+# and convert_NelZone_to_Blender(...) in import_nel3d.py to import the
+# selected instances into blender. This file does not need blender.
+#
+#-------------------------------------------------------------------------------
+
+import os
+import math
+
+from nel3d_parse import *
+from nel3d_batch import find_NEL_files
+
+
+
+# the keys of a CInstanceGroup::CInstance that are kept in the index; enough for
+# convert_NelZone_to_Blender in import_nel3d.py
+NEL_INDEX_INSTANCE_KEYS = ('Name', 'Pos', 'Rot', 'Scale');
+
+
+class NelInstanceIndex:
+    def __init__(self, cellSize = 160.0):
+        self.cellSize = cellSize; # size of a grid cell in x and y; 160 is the size of a ryzom zone
+        self.igs = []; # (fileName, globalPos, instances) of each scanned instance group
+        self.grid = {}; # (cellX, cellY) -> list of (igIdx, instanceIdx)
+        self.errors = []; # (fileName, message) of the instance groups that could not be loaded
+
+    def cellOf(self, x, y):
+        return (int(math.floor(x / self.cellSize)), int(math.floor(y / self.cellSize)));
+
+    # returns the world position of an instance
+    def worldPos(self, igIdx, instanceIdx):
+        fileName, globalPos, instances = self.igs[igIdx];
+        pos = instances[instanceIdx]['Pos'];
+        return (globalPos[0] + pos[0], globalPos[1] + pos[1], globalPos[2] + pos[2]);
+
+    # adds the instances of a parsed CInstanceGroup; only the global position and
+    # the NEL_INDEX_INSTANCE_KEYS of each instance are kept
+    def addInstanceGroup(self, fileName, nelIG):
+        igIdx = len(self.igs);
+        instances = [dict((key, nelInstance[key]) for key in NEL_INDEX_INSTANCE_KEYS) for nelInstance in nelIG['_InstancesInfos']];
+        self.igs.append((fileName, nelIG['_GlobalPos'], instances));
+        for instanceIdx in range(len(instances)):
+            x, y, z = self.worldPos(igIdx, instanceIdx);
+            self.grid.setdefault(self.cellOf(x, y), []).append((igIdx, instanceIdx));
+
+    # scans all .ig files in the given files and directories (see find_NEL_files)
+    # and adds them to the index; files that fail to load are recorded in errors
+    def scanInstanceGroups(self, paths):
+        for fileName in find_NEL_files(paths, ('.ig',)):
+            try:
+                nelIG = load_NEL_file(fileName, sections = set()); # only the header and the instances
+                if nelIG['NelType'] != 'CInstanceGroup':
+                    error("not an instance group");
+                self.addInstanceGroup(fileName, nelIG);
+            except Exception as e:
+                self.errors.append((fileName, str(e)));
+
+    # returns (igFileName, globalPos, nelInstance) of all instances whose world
+    # position is inside the given box; bmin/bmax are (x, y) or (x, y, z)
+    def queryBox(self, bmin, bmax):
+        found = [];
+        cmin = self.cellOf(bmin[0], bmin[1]);
+        cmax = self.cellOf(bmax[0], bmax[1]);
+        numCells = (cmax[0] - cmin[0] + 1) * (cmax[1] - cmin[1] + 1);
+        if numCells <= len(self.grid):
+            cells = [(cellX, cellY) for cellX in range(cmin[0], cmax[0] + 1) for cellY in range(cmin[1], cmax[1] + 1)];
+        else: # a box larger than the indexed area: only visit the used cells
+            cells = [cell for cell in self.grid if cmin[0] <= cell[0] <= cmax[0] and cmin[1] <= cell[1] <= cmax[1]];
+
+        for cell in cells:
+            for igIdx, instanceIdx in self.grid.get(cell, ()):
+                pos = self.worldPos(igIdx, instanceIdx);
+                if any(pos[i] < bmin[i] or pos[i] > bmax[i] for i in range(len(bmin))):
+                    continue;
+                found.append((igIdx, instanceIdx));
+
+        result = [];
+        for igIdx, instanceIdx in sorted(found): # in file order independent of the grid
+            fileName, globalPos, instances = self.igs[igIdx];
+            result.append((fileName, globalPos, instances[instanceIdx]));
+        return result;
+
+    # returns the instances (see queryBox) with a distance in x and y of at most radius to center
+    def queryRadius(self, center, radius):
+        result = [];
+        bmin = (center[0] - radius, center[1] - radius);
+        bmax = (center[0] + radius, center[1] + radius);
+        for fileName, globalPos, nelInstance in self.queryBox(bmin, bmax):
+            dx = globalPos[0] + nelInstance['Pos'][0] - center[0];
+            dy = globalPos[1] + nelInstance['Pos'][1] - center[1];
+            if dx*dx + dy*dy <= radius*radius:
+                result.append((fileName, globalPos, nelInstance));
+        return result;
@@ -31,10 +31,17 @@ gFileRootPath = "d:/programming/data/ryzom/flat_unpacked_data/"
 gSkeletonFileName = "tr_mo_clapclap.skel"
 
 
+#gCacheDir = "d:/programming/data/ryzom/nel3d_cache/"
+
 #===============================================================================
 # calling the importer functions...
 #===============================================================================
 
+# to keep the parsed files in an on-disk cache between runs
+#import import_nel3d
+#from nel3d_cache import NelParseCache
+#import_nel3d.gParseCache = NelParseCache(gCacheDir);
+
 nelSkeleton = load_NEL_file(gFileRootPath+gSkeletonFileName);
 bSkeletonObj = convert_NelSkeleton_to_BlenderArmature(nelSkeleton);
 
@@ -47,9 +54,25 @@ bSkeletonObj = convert_NelSkeleton_to_BlenderArmature(nelSkeleton);
 #animation = load_NEL_file(gFileRootPath + gAnimFileName);
 #convert_NelAnimation_to_BlenderAction(animation, nelSkeleton, bSkeletonObj);
 
+# to drop the sampled keys that are within 0.5 degree / 1mm of the interpolated track first
+#from nel3d_anim import reduce_NelAnimation
+#animation, report = reduce_NelAnimation(load_NEL_file(gFileRootPath + gAnimFileName));
+#print(report);
+#convert_NelAnimation_to_BlenderAction(animation, nelSkeleton, bSkeletonObj);
+
+# all animations of an animation set (one action each)
+#animationSet = load_NEL_file(gFileRootPath + gAnimSetFileName);
+#convert_NelAnimationSet_to_BlenderActions(animationSet, nelSkeleton, bSkeletonObj);
+
 #print(getBindTrafo_Recursive("Bip01 Tail", nelSkeleton));
 #print(rotation_quaterniongetBindTrafo_Recursive("Bip01 Tail", nelSkeleton).inverted());
 
 #nelIG = load_NEL_file(gFileRootPath + gIGFileName);
 #convert_NelInstanceGroup_to_Blender(nelIG, gFileRootPath);
 
+# importing all instances of the .ig files of a region within 300m of a position
+#from nel3d_zone import NelInstanceIndex
+#igIndex = NelInstanceIndex();
+#igIndex.scanInstanceGroups([gFileRootPath]);
+#convert_NelZone_to_Blender(igIndex.queryRadius((8000.0, -11000.0), 300.0), gFileRootPath);
+